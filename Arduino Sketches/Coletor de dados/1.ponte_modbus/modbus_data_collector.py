@@ -1,10 +1,16 @@
+import os
+import sys
 import time
-import csv
 from datetime import datetime
 from pymodbus.client import ModbusTcpClient
 from pymodbus.constants import Endian
 from pymodbus.payload import BinaryPayloadDecoder
 
+# LogSink (arquivo aberto uma vez, fsync periódico, rotação) fica junto das ferramentas TCP
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'Comunicação Modbus', 'py4.ModbusTCP'))
+from log_sink import LogSink
+
 # --- Configurações de Conexão ---
 # O IP deve ser o mesmo configurado no ESP07 (esp07_modbus_bridge.ino)
 HOST = '192.168.1.100' 
@@ -24,13 +30,15 @@ REGISTERS_TO_READ = [
 # --- Configurações de Arquivo ---
 CSV_FILE = 'weg_inverter_data.csv'
 COLLECTION_INTERVAL_SECONDS = 5 # Coleta a cada 5 segundos
+ROTATE = 'daily'   # um arquivo por dia (weg_inverter_data_AAAA-MM-DD.csv); None = arquivo único
+COLUMNAR = None    # 'npz' ou 'parquet': cópia colunar em lotes
+FIELDNAMES = ['Timestamp'] + [reg['name'] for reg in REGISTERS_TO_READ]
 
 def setup_csv():
-    """Cria o arquivo CSV e escreve o cabeçalho."""
-    fieldnames = ['Timestamp'] + [reg['name'] for reg in REGISTERS_TO_READ]
-    with open(CSV_FILE, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
+    """Abre o log CSV (o cabeçalho é escrito em cada arquivo novo)."""
+    # mesmo formato do csv.DictWriter: separador ',' e floats sem arredondar
+    return LogSink(CSV_FILE, FIELDNAMES, sep=',', decimal='.', float_fmt=None,
+                   rotate=ROTATE, columnar=COLUMNAR)
 
 def read_modbus_data(client):
     """Lê os dados do inversor via Modbus TCP."""
@@ -67,16 +75,13 @@ def read_modbus_data(client):
         
     return data
 
-def save_to_csv(data):
+def save_to_csv(sink, data):
     """Salva os dados coletados no arquivo CSV."""
-    fieldnames = ['Timestamp'] + [reg['name'] for reg in REGISTERS_TO_READ]
-    with open(CSV_FILE, 'a', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writerow(data)
+    sink.write([data.get(name, '') for name in FIELDNAMES])
 
 def main():
     print(f"Iniciando coletor de dados Modbus TCP em {HOST}:{PORT}")
-    setup_csv()
+    sink = setup_csv()
     
     client = ModbusTcpClient(HOST, port=PORT)
     
@@ -89,7 +94,7 @@ def main():
         
         while True:
             data = read_modbus_data(client)
-            save_to_csv(data)
+            save_to_csv(sink, data)
             print(f"Dados coletados e salvos: {data}")
             time.sleep(COLLECTION_INTERVAL_SECONDS)
 
@@ -98,6 +103,7 @@ def main():
     except Exception as e:
         print(f"Ocorreu um erro: {e}")
     finally:
+        sink.close()
         if client.is_socket_open():
             client.close()
 
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+dump_diff.py
+
+Compara N dumps da mesma memória (ex.: EEPROM do datalogger, bytes.txt / bytes1.txt)
+tirados em momentos diferentes, para achar os campos "vivos" de um layout não documentado.
+
+ - carrega os dumps com load_dump() (interpretador.py), em qualquer dialeto ou .bin
+ - alinha: compara até o tamanho do menor dump; com --max-shift procura também um
+   deslocamento global de cada dump em relação ao primeiro
+ - hash por bloco (--block bytes): blocos idênticos em todos os dumps são pulados
+ - nos blocos restantes: máscara de mudança por byte entre dumps consecutivos e a
+   frequência de mudança de cada offset (NumPy)
+ - agrupa os bytes que mudam em campos de 16/32 bits e classifica cada um pela série de
+   valores ao longo dos dumps:
+     timestamp  uint32 sempre dentro da faixa de data unix plausível e crescente a cada
+                dump; descartado se uma leitura de 16 bits já explica a mudança como contador
+     contador   inteiro que só avança (com volta pelo zero), ex.: energia, nº de registros;
+                vence a leitura (endian/largura) com o menor passo
+     medida     valor que sobe e desce; endian e sinal (u16/i16/u32/i32) escolhidos pelo
+                menor passo e, no empate, pela menor magnitude
+   com 2 dumps toda mudança para cima parece contador: use o máximo de dumps possível
+
+Os dumps são comparados na ordem dada (ou --sort mtime/nome).
+
+Uso:
+  py dump_diff.py bytes.txt bytes1.txt
+  py dump_diff.py dumps/*.txt --sort mtime --block 256 --csv campos.csv
+"""
+import argparse
+import csv
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from interpretador import TS_MIN, TS_MAX, load_dump
+
+BLOCK_SIZE = 256
+CLASS_ORDER = {'timestamp': 0, 'contador': 1, 'medida': 2}
+
+def load_dumps(paths, sort=None):
+    """Carrega os dumps. Retorna (nomes, [arrays uint8])."""
+    paths = [Path(p) for p in paths]
+    if sort == 'mtime':
+        paths.sort(key=lambda p: p.stat().st_mtime)
+    elif sort == 'nome':
+        paths.sort(key=lambda p: p.name)
+    names, arrays = [], []
+    for p in paths:
+        data, info = load_dump(p)
+        for off, n in info['gaps'][:5]:
+            print(f"  Aviso: {p.name}: lacuna de {n} bytes no offset {off}")
+        names.append(p.name)
+        arrays.append(np.frombuffer(data, dtype=np.uint8))
+    return names, arrays
+
+def estimate_shift(ref, other, max_shift):
+    """
+    Deslocamento s (|s| <= max_shift) que maximiza os bytes iguais entre ref[i] e
+    other[i + s]. Retorna (s, fração de bytes iguais).
+    """
+    best, best_score = 0, -1.0
+    for s in range(-max_shift, max_shift + 1):
+        a = ref[max(0, -s):len(ref) - max(0, s)]
+        b = other[max(0, s):max(0, s) + len(a)]
+        n = min(len(a), len(b))
+        if n == 0:
+            continue
+        score = float(np.count_nonzero(a[:n] == b[:n])) / n
+        if score > best_score:
+            best, best_score = s, score
+    return best, best_score
+
+def align_dumps(arrays, max_shift=0):
+    """Empilha os dumps numa matriz (N, L) alinhada ao primeiro. Retorna (matriz, deslocamentos)."""
+    ref = arrays[0]
+    shifts = [0]
+    for a in arrays[1:]:
+        shifts.append(estimate_shift(ref, a, max_shift)[0] if max_shift else 0)
+    # offsets válidos (no referencial do primeiro dump) presentes em todos os dumps
+    start = max(max(0, -s) for s in shifts)
+    end = min(len(a) - s for a, s in zip(arrays, shifts))
+    end = min(end, len(ref))
+    if end <= start:
+        raise ValueError("dumps sem região em comum")
+    stack = np.stack([a[start + s:end + s] for a, s in zip(arrays, shifts)])
+    return stack, shifts, start
+
+def changed_blocks(stack, block=BLOCK_SIZE):
+    """Hash (blake2b) de cada bloco de cada dump; True onde algum dump difere do primeiro."""
+    n, length = stack.shape
+    nblocks = (length + block - 1) // block
+    changed = np.zeros(nblocks, dtype=bool)
+    rows = [row.tobytes() for row in stack]
+    for b in range(nblocks):
+        lo = b * block
+        ref = hashlib.blake2b(rows[0][lo:lo + block], digest_size=8).digest()
+        for row in rows[1:]:
+            if hashlib.blake2b(row[lo:lo + block], digest_size=8).digest() != ref:
+                changed[b] = True
+                break
+    return changed
+
+def change_stats(stack, changed, block=BLOCK_SIZE):
+    """
+    Só nos blocos marcados: máscara (N-1, L) de mudança entre dumps consecutivos e a
+    frequência de mudança por offset (0..1). Blocos idênticos ficam zerados.
+    """
+    n, length = stack.shape
+    mask = np.zeros((max(n - 1, 0), length), dtype=bool)
+    idx = (np.nonzero(changed)[0][:, None] * block + np.arange(block)).ravel()
+    idx = idx[idx < length]
+    if n > 1 and len(idx):
+        sub = stack[:, idx]
+        mask[:, idx] = sub[1:] != sub[:-1]
+    freq = mask.mean(axis=0) if n > 1 else np.zeros(length)
+    return mask, freq
+
+def changed_runs(freq):
+    """Sequências contíguas [início, fim) de offsets que mudaram em algum dump."""
+    live = np.concatenate(([False], freq > 0, [False]))
+    edges = np.flatnonzero(live[1:] != live[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+def field_values(stack, off, width, endian, signed=False):
+    """Série de valores (um por dump) do inteiro em stack[:, off:off+width]."""
+    cols = stack[:, off:off + width].astype(np.uint64)
+    if endian == 'le':
+        cols = cols[:, ::-1]
+    v = np.zeros(len(stack), dtype=np.uint64)
+    for k in range(width):
+        v = (v << np.uint64(8)) | cols[:, k]
+    if signed:
+        v = v.astype(np.int64)
+        v = np.where(v >= 1 << (8 * width - 1), v - (1 << (8 * width)), v)
+    return v
+
+def classify(values, width):
+    """'timestamp' | 'contador' | 'medida' para a série de valores (sem sinal) de um campo."""
+    v = values.astype(np.int64)
+    steps = np.diff(v) % (1 << (8 * width))          # avanço com volta pelo zero
+    forward = bool(np.all(steps < (1 << (8 * width - 1))))
+    # timestamp: dentro da faixa e avançando a cada dump (dumps tirados em momentos diferentes)
+    if width == 4 and forward and np.all(steps >= 1) and np.all((v >= TS_MIN) & (v <= TS_MAX)):
+        return 'timestamp'
+    if forward:
+        return 'contador'
+    return 'medida'
+
+def candidate_fields(run, length):
+    """Campos (off, largura, endian) que cobrem uma sequência de bytes que mudam."""
+    a, b = int(run[0]), int(run[1])
+    if b - a > 4:
+        # região longa (texto, tabela): palavras de 32 bits a partir do início
+        return [[(off, min(4, length - off), 'le')] for off in range(a, b, 4)]
+    fields = []
+    for width in (2, 4):
+        if b - a > width:
+            continue
+        # LE: byte menos significativo (o que mais muda) no início; BE: no fim
+        le = (a, width, 'le') if a + width <= length else None
+        be = (b - width, width, 'be') if b - width >= 0 else None
+        fields.extend(f for f in (le, be) if f)
+    return [fields]
+
+def _readings(stack, options):
+    """Todas as leituras (off, largura, endian, sinal, classe, valores, chave) de um grupo."""
+    out = []
+    for off, width, endian in options:
+        values = field_values(stack, off, width, endian)
+        kind = classify(values, width)
+        if kind != 'medida':
+            # contador/timestamp: menor passo (com volta pelo zero); empate: LE (o datalogger
+            # é little-endian) e 32 bits
+            step = int((np.diff(values.astype(np.int64)) % (1 << (8 * width))).max())
+            out.append((off, width, endian, False, kind, values,
+                        (CLASS_ORDER[kind], step, 0, endian != 'le', -width, False)))
+            continue
+        for signed in (False, True):
+            v = field_values(stack, off, width, endian, signed).astype(np.int64)
+            # medida: menor passo, depois menor magnitude; empate: LE, 16 bits, sem sinal
+            step = int(np.abs(np.diff(v)).max()) if len(v) > 1 else 0
+            out.append((off, width, endian, signed, kind, v,
+                        (CLASS_ORDER[kind], step, int(np.abs(v).max()), endian != 'le', width, signed)))
+    return out
+
+def find_fields(stack, freq, base=0):
+    """Classifica cada grupo de bytes que mudam. Retorna lista de dicts ordenada por offset."""
+    length = stack.shape[1]
+    out = []
+    for run in changed_runs(freq):
+        for options in candidate_fields(run, length):
+            readings = _readings(stack, options)
+            # um contador de 16 bits que já explica a mudança vence um timestamp de 32 bits
+            # (os bytes vizinhos podem formar uma data plausível por acaso)
+            if any(r[4] == 'contador' and r[1] == 2 for r in readings):
+                readings = [r for r in readings if r[4] != 'timestamp']
+            off, width, endian, signed, kind, values, _ = min(readings, key=lambda r: r[6])
+            out.append({
+                'offset': base + off,
+                'width': width,
+                'endian': endian,
+                'signed': signed,
+                'class': kind,
+                'freq': float(freq[off:off + width].max()),
+                'values': [int(x) for x in values],
+            })
+    return out
+
+def field_type(fd):
+    """Tipo do campo no formato u16/i16/u32/i32."""
+    return f"{'i' if fd['signed'] else 'u'}{8 * fd['width']}"
+
+def write_fields_csv(path, fields, names):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['offset', 'offset_hex', 'width', 'endian', 'type', 'class', 'change_freq'] + names)
+        for fd in fields:
+            w.writerow([fd['offset'], f"0x{fd['offset']:05X}", fd['width'], fd['endian'], field_type(fd),
+                        fd['class'], f"{fd['freq']:.3f}"] + fd['values'])
+
+def main():
+    ap = argparse.ArgumentParser(description="Diferença entre vários dumps da mesma memória: acha contadores, timestamps e medidas.")
+    ap.add_argument('dumps', nargs='+', help='Arquivos de dump (2 ou mais), do mais antigo ao mais novo')
+    ap.add_argument('--sort', choices=['mtime', 'nome'], default=None, help='Ordena os dumps por data de modificação ou nome')
+    ap.add_argument('--block', type=int, default=BLOCK_SIZE, help=f'Tamanho do bloco para hash (padrão {BLOCK_SIZE})')
+    ap.add_argument('--max-shift', type=int, default=0, help='Procura deslocamento de até N bytes entre os dumps')
+    ap.add_argument('--min-freq', type=float, default=0.0, help='Só lista campos com frequência de mudança >= F')
+    ap.add_argument('--show', type=int, default=50, help='Campos listados na tela')
+    ap.add_argument('--csv', default=None, help='Salva todos os campos em CSV')
+    args = ap.parse_args()
+
+    if len(args.dumps) < 2:
+        ap.error("informe pelo menos 2 dumps")
+    for p in args.dumps:
+        if not os.path.exists(p):
+            print("Arquivo não encontrado:", p)
+            sys.exit(1)
+
+    names, arrays = load_dumps(args.dumps, args.sort)
+    stack, shifts, base = align_dumps(arrays, args.max_shift)
+    for name, a, s in zip(names, arrays, shifts):
+        print(f"  {name}: {len(a)} bytes" + (f", deslocamento {s:+d}" if s else ""))
+    if len({len(a) for a in arrays}) > 1:
+        print(f"Aviso: tamanhos diferentes; comparando {stack.shape[1]} bytes a partir do offset {base}")
+
+    changed = changed_blocks(stack, args.block)
+    print(f"Blocos de {args.block} bytes: {len(changed)}, com mudança: {int(changed.sum())} "
+          f"(idênticos pulados: {int(len(changed) - changed.sum())})")
+    mask, freq = change_stats(stack, changed, args.block)
+    print(f"Bytes que mudaram: {int(np.count_nonzero(freq))}")
+    for k in range(len(mask)):
+        print(f"  {names[k]} -> {names[k + 1]}: {int(mask[k].sum())} bytes diferentes")
+
+    fields = [f for f in find_fields(stack, freq, base) if f['freq'] >= args.min_freq]
+    if not fields:
+        print("Nenhum campo mudou entre os dumps.")
+        return
+    counts = {}
+    for f in fields:
+        counts[f['class']] = counts.get(f['class'], 0) + 1
+    print("Campos: " + ", ".join(f"{k}: {counts[k]}" for k in CLASS_ORDER if k in counts))
+
+    shown = sorted(fields, key=lambda f: (CLASS_ORDER[f['class']], -f['freq'], f['offset']))[:args.show]
+    print(f"\n{'offset':>8} {'tipo':>4} {'end':>3} {'classe':<10} {'freq':>5}  valores")
+    for f in sorted(shown, key=lambda f: f['offset']):
+        vals = f['values']
+        series = " ".join(str(v) for v in vals) if len(vals) <= 6 else \
+            " ".join(str(v) for v in vals[:3]) + " ... " + " ".join(str(v) for v in vals[-2:])
+        print(f"0x{f['offset']:06X} {field_type(f):>4} {f['endian']:>3} {f['class']:<10} {f['freq']:5.2f}  {series}")
+    if len(fields) > len(shown):
+        print(f"... {len(fields) - len(shown)} campos não listados (use --csv)")
+    if args.csv:
+        write_fields_csv(args.csv, fields, names)
+        print(f"CSV: {args.csv}")
+
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,13 @@
 parse_eeprom.py
 
 Analisa um dump em formato hexdump (como o memory_dump.txt que você enviou),
-reconstrói os bytes e divide em blocos de 70 bytes (conforme informado).
+reconstrói os bytes e divide em blocos de 70 bytes (conforme informado, ou
+--blocksize auto: tamanho e offset do registro estimados por autocorrelação).
 Para cada bloco:
  - extrai strings ASCII (>= minstr)
  - procura padrões de serial (hex/alfanum)
- - tenta interpretar palavras 32-bit little-endian e floats
+ - tenta interpretar palavras 32-bit little-endian e floats (vetorizado com numpy,
+   quando disponível; --numeric salva também big-endian e 16 bits de todos os offsets)
  - marca offsets com 00 e FF
 Gera um CSV resumido e um relatório TXT detalhado.
 
@@ -20,9 +22,111 @@ import csv
 import struct
 from pathlib import Path
 
+try:
+    import numpy as np
+except ImportError:  # sem numpy: varredura numérica byte a byte (scan_block_numeric_candidates)
+    np = None
+
 HEX_LINE_RE = re.compile(r'^[0-9A-Fa-f]+:\s*((?:[0-9A-Fa-f]{2}\s+)+)')
 
+# Dialetos de dump reconhecidos por load_dump():
+#  offset  "00000: 55 00 00 ..." (offset hex, bytes com 2 dígitos; 0x50.txt ...)
+#          "0: 55 0 0 0 8 0 ..."  (offset decimal, bytes sem zero à esquerda; bytes.txt)
+#  rawhex  "5500000008000000..."  (hex contínuo, sem offsets; bytes.hex)
+OFFSET_LINE_RE = re.compile(r'^\s*([0-9A-Fa-f]+)\s*:\s*((?:[0-9A-Fa-f]{1,2}(?:\s+|$))+)\s*$')
+RAW_HEX_LINE_RE = re.compile(r'^\s*([0-9A-Fa-f]{2})+\s*$')
+SINGLE_DIGIT_RE = re.compile(r'(?<![0-9A-Fa-f])([0-9A-Fa-f])(?![0-9A-Fa-f])')
+
+def _offset_base(entries):
+    """Decide se os offsets são decimais ou hex: a base em que cada offset = anterior + nº de bytes."""
+    best, best_hits = 16, -1
+    for base in (16, 10):
+        try:
+            offs = [int(o, base) for o, _ in entries]
+        except ValueError:
+            continue
+        hits = sum(1 for k in range(1, len(entries)) if offs[k] == offs[k - 1] + len(entries[k - 1][1].split()))
+        if hits > best_hits:
+            best, best_hits = base, hits
+    return best
+
+def detect_dump_dialect(lines):
+    """Retorna {'kind': 'offset'|'rawhex'|'unknown', 'base': 10|16|None, 'padded': bool}."""
+    sample = [ln for ln in lines[:2000] if ln.strip()]
+    offset_lines = [m.groups() for m in map(OFFSET_LINE_RE.match, sample) if m]
+    raw_lines = sum(1 for ln in sample if RAW_HEX_LINE_RE.match(ln))
+    if offset_lines and len(offset_lines) >= raw_lines:
+        padded = all(len(tok) == 2 for _, rest in offset_lines for tok in rest.split())
+        return {'kind': 'offset', 'base': _offset_base(offset_lines), 'padded': padded}
+    if raw_lines:
+        return {'kind': 'rawhex', 'base': None, 'padded': True}
+    return {'kind': 'unknown', 'base': None, 'padded': True}
+
+def load_dump_lines(lines, fill=0xFF):
+    """
+    Reconstrói os bytes de um dump em qualquer dialeto reconhecido, com conversão em lote
+    (bytes.fromhex sobre o texto inteiro). Nos dumps com offset, valida a continuidade:
+    lacunas são preenchidas com `fill` e listadas em info['gaps'] como (offset, tamanho);
+    sobreposições em info['overlaps'].
+    Retorna (bytes, info).
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    dialect = detect_dump_dialect(lines)
+    info = {'dialect': dialect, 'lines': 0, 'gaps': [], 'overlaps': []}
+
+    if dialect['kind'] == 'rawhex':
+        hex_lines = [ln.strip() for ln in lines if RAW_HEX_LINE_RE.match(ln)]
+        info['lines'] = len(hex_lines)
+        return bytes.fromhex(''.join(hex_lines)), info
+
+    if dialect['kind'] == 'unknown':
+        # sem formato conhecido: mesmo comportamento de antes (pares hex soltos)
+        return parse_hexdump_lines(lines), info
+
+    entries = [m.groups() for m in map(OFFSET_LINE_RE.match, lines) if m]
+    info['lines'] = len(entries)
+    base = dialect['base']
+    offsets = [int(o, base) for o, _ in entries]
+    text = ' '.join(rest for _, rest in entries)
+    if not dialect['padded']:
+        text = SINGLE_DIGIT_RE.sub(r'0\1', text)
+    data = bytes.fromhex(text)
+
+    # continuidade dos offsets: caso comum (sem lacunas) não copia nada
+    counts = [len(rest.split()) for _, rest in entries]
+    contiguous = True
+    for k in range(1, len(entries)):
+        if offsets[k] != offsets[k - 1] + counts[k - 1]:
+            contiguous = False
+            break
+    if contiguous and (not offsets or offsets[0] == 0):
+        return data, info
+
+    out = bytearray()
+    pos = 0
+    for off, n in zip(offsets, counts):
+        chunk = data[pos:pos + n]
+        pos += n
+        if off > len(out):
+            info['gaps'].append((len(out), off - len(out)))
+            out.extend(bytes([fill]) * (off - len(out)))
+        elif off < len(out):
+            info['overlaps'].append((off, len(out) - off))
+        out[off:off + n] = chunk
+    return bytes(out), info
+
+def load_dump(path, fill=0xFF):
+    """Lê um arquivo de dump (texto em qualquer dialeto, ou binário .bin). Retorna (bytes, info)."""
+    p = Path(path)
+    if p.suffix.lower() == '.bin':
+        data = p.read_bytes()
+        return data, {'dialect': {'kind': 'binary', 'base': None, 'padded': True}, 'lines': 0, 'gaps': [], 'overlaps': []}
+    with p.open('r', encoding='utf-8', errors='ignore') as f:
+        return load_dump_lines(f.read().splitlines(), fill=fill)
+
 def parse_hexdump_lines(lines):
+    """Formato antigo: pares hex por linha (ver load_dump_lines para os demais dialetos)."""
     ba = bytearray()
     for ln in lines:
         ln = ln.rstrip('\n')
@@ -70,7 +174,83 @@ def find_serial_candidates(s):
             found.add(m.group(0))
     return sorted(found)
 
+# Varredura numérica vetorizada: um registro por offset candidato
+TS_MIN, TS_MAX = 1_500_000_000, 2_200_000_000  # timestamps unix plausíveis (2017..2040)
+FLOAT_MAX = 1e8
+FLAG_TS_LE, FLAG_UINT_LE, FLAG_FLOAT_LE = 0x01, 0x02, 0x04
+FLAG_TS_BE, FLAG_UINT_BE, FLAG_FLOAT_BE = 0x10, 0x20, 0x40
+FLAGS_LE = FLAG_TS_LE | FLAG_UINT_LE | FLAG_FLOAT_LE
+
+if np is not None:
+    NUMERIC_DTYPE = np.dtype([
+        ('off', '<u4'),
+        ('u32_le', '<u4'), ('u32_be', '<u4'),
+        ('f32_le', '<f4'), ('f32_be', '<f4'),
+        ('u16_le', '<u2'), ('i16_le', '<i2'),
+        ('u16_be', '<u2'), ('i16_be', '<i2'),
+        ('flags', 'u1'),
+    ])
+
+def scan_numeric_candidates(data, block_size=None, flags=FLAGS_LE | FLAG_TS_BE | FLAG_UINT_BE | FLAG_FLOAT_BE):
+    """
+    Interpreta todos os offsets do dump de uma vez (NumPy) como uint32/float32 LE e BE e
+    uint16/int16 LE e BE. Mesmos critérios de scan_block_numeric_candidates, por endian:
+      TS    timestamp unix plausível
+      UINT  uint32 diferente de 0 e de 0xFFFFFFFF
+      FLOAT float32 finito com |f| <= 1e8
+    Retorna um array estruturado (NUMERIC_DTYPE) só com os offsets que têm algum dos
+    `flags`. Com block_size, só palavras inteiras dentro de um bloco.
+    """
+    buf = np.frombuffer(bytes(data), dtype=np.uint8)
+    n = len(buf) - 3
+    if n <= 0:
+        return np.zeros(0, dtype=NUMERIC_DTYPE)
+    b0, b1, b2, b3 = (buf[k:k + n].astype(np.uint32) for k in range(4))
+    u32_le = b0 | (b1 << 8) | (b2 << 16) | (b3 << 24)
+    u32_be = b3 | (b2 << 8) | (b1 << 16) | (b0 << 24)
+    f32_le = u32_le.view(np.float32)
+    f32_be = u32_be.view(np.float32)
+
+    fl = np.zeros(n, dtype=np.uint8)
+    with np.errstate(invalid='ignore'):
+        for u, f, ts_bit, uint_bit, float_bit in ((u32_le, f32_le, FLAG_TS_LE, FLAG_UINT_LE, FLAG_FLOAT_LE),
+                                                  (u32_be, f32_be, FLAG_TS_BE, FLAG_UINT_BE, FLAG_FLOAT_BE)):
+            fl |= np.where((u >= TS_MIN) & (u <= TS_MAX), ts_bit, 0).astype(np.uint8)
+            fl |= np.where((u != 0) & (u != 0xFFFFFFFF), uint_bit, 0).astype(np.uint8)
+            fl |= np.where(np.isfinite(f) & (np.abs(f) <= FLOAT_MAX), float_bit, 0).astype(np.uint8)
+
+    keep = (fl & flags) != 0
+    off = np.arange(n, dtype=np.uint32)
+    if block_size:
+        keep &= (off % block_size) <= block_size - 4
+    idx = np.nonzero(keep)[0]
+
+    out = np.empty(len(idx), dtype=NUMERIC_DTYPE)
+    out['off'] = off[idx]
+    out['u32_le'] = u32_le[idx]
+    out['u32_be'] = u32_be[idx]
+    out['f32_le'] = f32_le[idx]
+    out['f32_be'] = f32_be[idx]
+    lo, hi = b0[idx], b1[idx]
+    out['u16_le'] = lo | (hi << 8)
+    out['u16_be'] = hi | (lo << 8)
+    out['i16_le'] = out['u16_le'].view(np.int16)
+    out['i16_be'] = out['u16_be'].view(np.int16)
+    out['flags'] = fl[idx]
+    return out
+
+def candidates_to_dicts(table, base=0):
+    """Registros do array estruturado no formato de scan_block_numeric_candidates (offset relativo a base)."""
+    return [{
+        'off': int(r['off']) - base,
+        'uint32_le': int(r['u32_le']),
+        'float32_le': float(r['f32_le']),
+        'is_ts': bool(r['flags'] & FLAG_TS_LE),
+    } for r in table]
+
 def scan_block_numeric_candidates(block_bytes):
+    if np is not None:
+        return candidates_to_dicts(scan_numeric_candidates(block_bytes, flags=FLAGS_LE))
     candidates = []
     L = len(block_bytes)
     for off in range(0, L - 3):
@@ -91,12 +271,79 @@ def scan_block_numeric_candidates(block_bytes):
             })
     return candidates
 
-def analyze_blocks(all_bytes, block_size=70, minstr=4, out_csv=None, out_txt=None):
-    nblocks = (len(all_bytes) + block_size - 1) // block_size
+# Detecção do tamanho de registro (autocorrelação via FFT)
+RECORD_MIN, RECORD_MAX = 4, 512
+
+def _autocorr(x, max_lag):
+    """Autocorrelação normalizada (lag 0 = 1) de x para lags 0..max_lag, via FFT."""
+    x = x - x.mean()
+    n = len(x)
+    size = 1 << (2 * n - 1).bit_length()
+    spec = np.fft.rfft(x, size)
+    r = np.fft.irfft(spec * np.conj(spec), size)[:max_lag + 1]
+    r /= np.maximum(n - np.arange(max_lag + 1), 1)   # normaliza pelo nº de pares em cada lag
+    return r / r[0] if r[0] > 0 else np.zeros(max_lag + 1)
+
+def detect_record_size(all_bytes, min_size=RECORD_MIN, max_size=RECORD_MAX, top=5):
+    """
+    Estima o tamanho dos registros do dump pela autocorrelação dos bytes e das máscaras
+    de 0x00 e 0xFF (média das três). Múltiplos do período também correlacionam: cada
+    candidato é reduzido ao menor divisor com pelo menos 90% do seu score.
+    Retorna [(tamanho, base, confiança), ...] do melhor para o pior; base é o offset
+    onde começa a região periódica (cabeçalho antes dela não entra nos blocos).
+    """
+    d = np.frombuffer(bytes(all_bytes), dtype=np.uint8)
+    max_size = min(max_size, len(d) // 2)
+    if max_size < min_size:
+        return []
+    score = np.mean([_autocorr(m.astype(np.float64), max_size)
+                     for m in (d, d == 0x00, d == 0xFF)], axis=0)
+
+    found = {}
+    for lag in np.argsort(-score[min_size:])[:4 * top] + min_size:
+        lag = int(lag)
+        if score[lag] <= 0:
+            break
+        fund = next(k for k in range(min_size, lag + 1)
+                    if lag % k == 0 and score[k] >= 0.9 * score[lag])
+        found.setdefault(fund, float(score[fund]))
+        if len(found) >= top:
+            break
+
+    out = []
+    for size, conf in sorted(found.items(), key=lambda kv: -kv[1]):
+        out.append((size, _record_base(d, size), conf))
+    return out
+
+def _record_base(d, size, records=8):
+    """
+    Início da região periódica (em [0, size)): o ponto de troca entre bytes que não se
+    repetem um registro adiante (cabeçalho) e bytes que se repetem (registros), pelo
+    custo mínimo nos primeiros `records` registros. Fica com o menor offset até 1 acima
+    do mínimo, para um byte variável no início do registro não deslocar a base.
+    """
+    n = min(len(d) - size, records * size)
+    same = np.concatenate(([0], np.cumsum(d[:n] == d[size:size + n])))
+    starts = np.arange(min(size, n + 1))
+    cost = same[starts] + (n - starts) - (same[n] - same[starts])
+    return int(np.flatnonzero(cost <= cost.min() + 1)[0])
+
+def analyze_blocks(all_bytes, block_size=70, minstr=4, out_csv=None, out_txt=None, base_offset=0):
+    # blocos a partir de base_offset (offsets no relatório continuam absolutos)
+    region = all_bytes[base_offset:]
+    nblocks = (len(region) + block_size - 1) // block_size
     rows = []
     txt_lines = []
+    if base_offset:
+        txt_lines.append(f"(primeiros {base_offset} bytes antes do primeiro registro não analisados)")
+    table = None
+    if np is not None:
+        # uma varredura vetorizada do dump inteiro; cada bloco pega a sua fatia
+        table = scan_numeric_candidates(region, block_size=block_size, flags=FLAGS_LE)
+        bounds = np.searchsorted(table['off'], np.arange(nblocks + 1) * block_size)
     for i in range(nblocks):
-        start = i * block_size
+        rel = i * block_size
+        start = base_offset + rel
         block = all_bytes[start:start+block_size]
         txt_lines.append(f"=== Bloco {i} (offset {start}, tamanho {len(block)}) ===")
         # ascii strings
@@ -121,8 +368,14 @@ def analyze_blocks(all_bytes, block_size=70, minstr=4, out_csv=None, out_txt=Non
         else:
             txt_lines.append("  - (nenhum detectado)")
         # numeric candidates
-        nums = scan_block_numeric_candidates(block)
-        txt_lines.append(f"Candidatos numéricos (mostrar até 10): {len(nums)} encontrados")
+        if table is not None:
+            block_table = table[bounds[i]:bounds[i + 1]]
+            n_nums = len(block_table)
+            nums = candidates_to_dicts(block_table[:10], base=rel)
+        else:
+            nums = scan_block_numeric_candidates(block)
+            n_nums = len(nums)
+        txt_lines.append(f"Candidatos numéricos (mostrar até 10): {n_nums} encontrados")
         for c in nums[:10]:
             ts_tag = " (timestamp?)" if c['is_ts'] else ""
             txt_lines.append(f"  - off +{c['off']:02d}: uint32={c['uint32_le']} float32={c['float32_le']}{ts_tag}")
@@ -139,7 +392,7 @@ def analyze_blocks(all_bytes, block_size=70, minstr=4, out_csv=None, out_txt=Non
             'serial_candidates': ";".join(serials) if serials else "",
             'zero_count': zeros,
             'ff_count': ffs,
-            'numeric_candidates_count': len(nums)
+            'numeric_candidates_count': n_nums
         })
     # escreve CSV
     if out_csv:
@@ -158,11 +411,15 @@ def analyze_blocks(all_bytes, block_size=70, minstr=4, out_csv=None, out_txt=Non
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('dumpfile', help='Arquivo hexdump (texto) a analisar')
-    ap.add_argument('--blocksize', type=int, default=70, help='Tamanho do bloco em bytes (padrão 70)')
+    ap.add_argument('dumpfile', help='Arquivo de dump a analisar (hexdump com offset, hex contínuo ou .bin)')
+    ap.add_argument('--blocksize', default='70',
+                    help="Tamanho do bloco em bytes (padrão 70) ou 'auto' para detectar pelo dump")
+    ap.add_argument('--base', type=int, default=None, help='Offset do primeiro registro (padrão 0; com auto, o detectado)')
     ap.add_argument('--minstr', type=int, default=4, help='Min tamanho de string ASCII para extrair')
     ap.add_argument('--out', default='report.csv', help='CSV de saída resumido')
     ap.add_argument('--detail', default='report_detail.txt', help='Relatório detalhado TXT')
+    ap.add_argument('--numeric', default=None, metavar='ARQ.npy',
+                    help='Salva todos os candidatos numéricos (LE/BE, u32/f32/u16/i16) num .npy (requer numpy)')
     args = ap.parse_args()
 
     p = Path(args.dumpfile)
@@ -170,14 +427,43 @@ def main():
         print("Arquivo não encontrado:", args.dumpfile)
         return
 
-    with p.open('r', encoding='utf-8', errors='ignore') as f:
-        lines = f.readlines()
-
-    all_bytes = parse_hexdump_lines(lines)
+    all_bytes, info = load_dump(p)
+    d = info['dialect']
+    desc = d['kind'] + (f", offsets base {d['base']}, bytes {'com' if d['padded'] else 'sem'} zero à esquerda" if d['kind'] == 'offset' else "")
+    print(f"Formato detectado: {desc}")
     print(f"Total de bytes reconstruídos: {len(all_bytes)}")
-    rows, txt_lines = analyze_blocks(all_bytes, block_size=args.blocksize, minstr=args.minstr,
-                                     out_csv=args.out, out_txt=args.detail)
+    for off, n in info['gaps'][:10]:
+        print(f"  Aviso: lacuna de {n} bytes no offset {off} (preenchida com 0xFF)")
+    for off, n in info['overlaps'][:10]:
+        print(f"  Aviso: {n} bytes sobrepostos no offset {off}")
+    if args.blocksize == 'auto':
+        if np is None:
+            print("Erro: --blocksize auto requer numpy (pip install numpy)")
+            return
+        candidates = detect_record_size(all_bytes)
+        if not candidates:
+            print("Nenhuma periodicidade encontrada; use --blocksize N")
+            return
+        print("Tamanhos de registro candidatos (tamanho, base, confiança):")
+        for size, base, conf in candidates:
+            print(f"  {size:4d}  base {base:5d}  {conf:.3f}")
+        block_size, base = candidates[0][0], candidates[0][1]
+        print(f"Usando blocos de {block_size} bytes a partir do offset {base}")
+    else:
+        block_size, base = int(args.blocksize), 0
+    if args.base is not None:
+        base = args.base
+    rows, txt_lines = analyze_blocks(all_bytes, block_size=block_size, minstr=args.minstr,
+                                     out_csv=args.out, out_txt=args.detail, base_offset=base)
     print(f"Análise completa. CSV: {args.out}, Relatório: {args.detail}")
+    if args.numeric:
+        if np is None:
+            print("Aviso: --numeric requer numpy (pip install numpy); ignorado.")
+        else:
+            table = scan_numeric_candidates(all_bytes)
+            np.save(args.numeric, table)
+            ts = int(((table['flags'] & (FLAG_TS_LE | FLAG_TS_BE)) != 0).sum())
+            print(f"Candidatos numéricos: {len(table)} offsets ({ts} com timestamp plausível) em {args.numeric}")
     # mostra resumo inicial
     print("Resumo por bloco (primeiras 10 linhas):")
     for r in rows[:10]:
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+multi_capture.py
+
+Captura simultânea de várias portas seriais (ex.: lado mestre e lado escravo de um
+gateway RS485, ou dois barramentos) num único fluxo ordenado no tempo.
+
+ - uma SerialReader (serial_saver.py) por porta, todas com o mesmo relógio
+   (time.monotonic é único para o processo), cada bloco marcado com o canal
+ - uma thread de junção reordena os blocos numa janela (--hold-ms), porque cada thread
+   entrega seus blocos só depois do silêncio final, e grava o fluxo mesclado. O padrão é o
+   tempo da maior trama (256 bytes) no canal mais lento + silêncio + latência de leitura
+   (~320 ms a 9600 bps): um bloco é marcado no primeiro byte, mas só chega ao fim da trama
+ - --latency A,B (A = lado do mestre, B = lado do escravo) casa cada requisição do canal A
+   com a mesma PDU repetida no canal B e cada resposta de B com a cópia em A, e mostra a
+   latência e as tramas perdidas de cada sentido
+
+Formato do arquivo (RAWCAP2, lido por read_merged_capture()):
+  linha 1: b"RAWCAP2\\n"
+  linha 2: cabeçalho JSON (canais, data/hora de início)
+  registros: <double t> <uint8 canal> <uint32 n> <n bytes>   (little-endian)
+Com --text grava também um log legível: "12.345 [CH0 mestre] 01 03 00 00 00 0A C5 CD".
+
+Uso:
+  py multi_capture.py COM5:9600 COM6:9600 --names mestre,escravo --out gateway.bin
+  py multi_capture.py /dev/ttyUSB0 /dev/ttyUSB1:19200 --duration 60 --latency 0,1
+  py multi_capture.py --analyze gateway.bin --latency 0,1
+"""
+
+import argparse
+import heapq
+import json
+import queue
+import statistics
+import struct
+import sys
+import threading
+import time
+import datetime
+from collections import deque
+
+import serial
+
+from serial_saver import RawCaptureBuffer, SerialReader, char_time, frame_gap, timestamp_filename
+
+MERGED_MAGIC = b"RAWCAP2\n"
+MERGED_RECORD_HDR = "<dBI"
+MAX_FRAME_BYTES = 256    # maior trama Modbus RTU
+READ_LATENCY_S = 0.02    # latência do adaptador USB-RS485 / agendamento da thread
+TAIL_SIZE = 16 * 1024    # cauda por canal em memória
+LATENCY_WINDOW = 1.0     # tempo máximo entre a trama no canal A e a cópia no canal B
+RECORD = struct.Struct(MERGED_RECORD_HDR)
+
+def default_hold(bauds):
+    """Janela de reordenação (s): maior trama no canal mais lento + silêncio final + latência."""
+    baud = min(bauds)
+    return MAX_FRAME_BYTES * char_time(baud) + frame_gap(baud) + READ_LATENCY_S
+
+class ChannelTap:
+    """Faz o papel do SegmentWriter para uma SerialReader: repassa os blocos marcados com o canal."""
+
+    def __init__(self, channel, out_queue):
+        self.channel = channel
+        self.out_queue = out_queue
+
+    def put(self, data, t):
+        self.out_queue.put((t, self.channel, data))
+
+class Merger(threading.Thread):
+    """Junta os blocos de todos os canais em ordem de tempo e grava o fluxo mesclado."""
+
+    def __init__(self, path, channels, text_path=None, hold_s=None):
+        super().__init__(daemon=True)
+        self.queue = queue.Queue()
+        self.channels = channels
+        self.hold_s = hold_s if hold_s is not None else default_hold([ch["baud"] for ch in channels])
+        self.heap = []
+        self.seq = 0                      # desempate estável no heap
+        self.t0 = time.monotonic()
+        self.wall0 = datetime.datetime.now()
+        self.counts = [[0, 0] for _ in channels]   # [blocos, bytes] por canal
+        self.last_t = None
+        self.out_of_order = 0
+        self.stop_event = threading.Event()
+        self.f = open(path, "wb")
+        self.f.write(MERGED_MAGIC)
+        header = {"channels": channels, "start": self.wall0.isoformat(timespec="milliseconds")}
+        self.f.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.text = open(text_path, "w", encoding="utf-8") if text_path else None
+
+    def _emit(self, t, ch, data):
+        if self.last_t is not None and t < self.last_t:
+            self.out_of_order += 1  # chegou depois da janela de reordenação
+        self.last_t = t if self.last_t is None else max(self.last_t, t)
+        rel = t - self.t0
+        self.f.write(RECORD.pack(rel, ch, len(data)))
+        self.f.write(data)
+        if self.text:
+            self.text.write(f"{rel:.4f} [CH{ch} {self.channels[ch]['name']}] "
+                            + " ".join(f"{b:02X}" for b in data) + "\n")
+        self.counts[ch][0] += 1
+        self.counts[ch][1] += len(data)
+
+    def _drain(self, until):
+        while self.heap and self.heap[0][0] <= until:
+            t, _, ch, data = heapq.heappop(self.heap)
+            self._emit(t, ch, data)
+
+    def run(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try:
+                t, ch, data = self.queue.get(timeout=self.hold_s)
+                heapq.heappush(self.heap, (t, self.seq, ch, data))
+                self.seq += 1
+            except queue.Empty:
+                pass
+            self._drain(time.monotonic() - self.hold_s)
+        self._drain(float("inf"))
+        self.f.close()
+        if self.text:
+            self.text.close()
+
+    def close(self):
+        self.stop_event.set()
+        self.join(5.0)
+
+def read_merged_capture(path):
+    """Lê um arquivo RAWCAP2. Retorna (meta, [(t, canal, bytes), ...])."""
+    with open(path, "rb") as f:
+        if f.readline() != MERGED_MAGIC:
+            raise ValueError(f"{path}: não é um arquivo RAWCAP2")
+        meta = json.loads(f.readline().decode("utf-8"))
+        records = []
+        while True:
+            hdr = f.read(RECORD.size)
+            if len(hdr) < RECORD.size:
+                break
+            t, ch, n = RECORD.unpack(hdr)
+            data = f.read(n)
+            if len(data) < n:
+                break
+            records.append((t, ch, data))
+    return meta, records
+
+def pdu_key(frame):
+    """Trama RTU sem endereço e CRC: o gateway pode trocar o endereço do escravo."""
+    return bytes(frame[1:-2]) if len(frame) >= 4 else bytes(frame)
+
+def match_forwarded(records, src, dst, window=LATENCY_WINDOW):
+    """
+    Casa as tramas repassadas entre os canais src (lado do mestre) e dst (lado do escravo).
+    Uma trama que não é cópia de uma trama pendente do outro canal é original e fica
+    pendente no seu canal: em src são as requisições (src -> dst), em dst as respostas
+    (dst -> src). Cada cópia casa com a primeira pendente de mesma PDU do outro canal
+    até `window` segundos antes.
+    Retorna {src: (latências s, perdidas), dst: (latências s, perdidas)} por canal de origem.
+    """
+    pending = {src: deque(), dst: deque()}   # (t, key) de tramas originais aguardando cópia
+    latencies = {src: [], dst: []}
+    lost = {src: 0, dst: 0}
+    for t, ch, data in records:
+        if ch not in pending:
+            continue
+        for c, waiting in pending.items():
+            while waiting and t - waiting[0][0] > window:
+                waiting.popleft()
+                lost[c] += 1
+        other = dst if ch == src else src
+        key = pdu_key(data)
+        for k, (ts, pk) in enumerate(pending[other]):
+            if pk == key:
+                latencies[other].append(t - ts)
+                # tramas do outro canal anteriores a esta que não foram repassadas
+                for _ in range(k):
+                    pending[other].popleft()
+                    lost[other] += 1
+                pending[other].popleft()
+                break
+        else:
+            pending[ch].append((t, key))
+    return {c: (latencies[c], lost[c] + len(pending[c])) for c in pending}
+
+def parse_port_spec(spec, default_baud):
+    """'COM5:9600' -> ('COM5', 9600); sem baud usa o padrão."""
+    port, sep, baud = spec.rpartition(":")
+    if sep and baud.isdigit():
+        return port, int(baud)
+    return spec, default_baud
+
+def print_latency(records, src, dst, channels):
+    matched = match_forwarded(records, src, dst)
+    for a, b, kind in ((src, dst, "requisições"), (dst, src, "respostas")):
+        lat, lost = matched[a]
+        name = f"CH{a} {channels[a]['name']} -> CH{b} {channels[b]['name']} ({kind})"
+        if not lat:
+            print(f"{name}: nenhuma trama repassada encontrada ({lost} sem correspondência)")
+            continue
+        ms = sorted(x * 1000 for x in lat)
+        p95 = ms[min(len(ms) - 1, int(0.95 * len(ms)))]
+        print(f"{name}: {len(ms)} repassadas, {lost} perdidas | latência ms: "
+              f"mín {ms[0]:.2f}  mediana {statistics.median(ms):.2f}  p95 {p95:.2f}  máx {ms[-1]:.2f}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Captura sincronizada de várias portas seriais num fluxo único.")
+    ap.add_argument("ports", nargs="*", help="Portas (ex: COM5:9600 /dev/ttyUSB1)")
+    ap.add_argument("--baud", type=int, default=9600, help="Baud rate padrão (quando não informado na porta)")
+    ap.add_argument("--names", default=None, help="Nomes dos canais separados por vírgula")
+    ap.add_argument("--out", default=None, help="Arquivo RAWCAP2 de saída (padrão multi_<data>.bin)")
+    ap.add_argument("--text", action="store_true", help="Grava também um log de texto (.txt) ao lado")
+    ap.add_argument("--duration", type=float, default=None, help="Encerra após N segundos")
+    ap.add_argument("--hold-ms", type=float, default=None,
+                    help="Janela de reordenação entre canais (ms; padrão: maior trama no canal mais lento + latência)")
+    ap.add_argument("--latency", default=None, help="Canais A,B para medir latência de repasse (ex: 0,1)")
+    ap.add_argument("--analyze", metavar="ARQ", default=None, help="Só analisa um arquivo RAWCAP2 já gravado")
+    args = ap.parse_args()
+
+    if args.analyze:
+        meta, records = read_merged_capture(args.analyze)
+        channels = meta["channels"]
+        for k, ch in enumerate(channels):
+            own = [r for r in records if r[1] == k]
+            print(f"CH{k} {ch['name']}: {len(own)} blocos, {sum(len(r[2]) for r in own)} bytes")
+        if args.latency:
+            src, dst = (int(x) for x in args.latency.split(","))
+            print_latency(records, src, dst, channels)
+        return
+    if not args.ports:
+        ap.error("informe ao menos uma porta (ou --analyze)")
+
+    specs = [parse_port_spec(p, args.baud) for p in args.ports]
+    names = args.names.split(",") if args.names else [f"p{k}" for k in range(len(specs))]
+    if len(names) != len(specs):
+        print("Quantidade de nomes diferente da quantidade de portas.")
+        sys.exit(1)
+    latency = None
+    if args.latency:
+        latency = tuple(int(x) for x in args.latency.split(","))
+        if len(latency) != 2 or max(latency) >= len(specs):
+            print("--latency espera dois índices de canal válidos (ex: 0,1)")
+            sys.exit(1)
+
+    channels = [{"name": n, "port": p, "baud": b} for n, (p, b) in zip(names, specs)]
+    out = args.out or timestamp_filename("multi", "bin")
+    text_path = out.rsplit(".", 1)[0] + ".txt" if args.text else None
+
+    sers = []
+    for ch in channels:
+        try:
+            gap = frame_gap(ch["baud"])
+            sers.append(serial.Serial(port=ch["port"], baudrate=ch["baud"], timeout=0.1, inter_byte_timeout=gap))
+        except serial.SerialException as e:
+            print(f"Não foi possível abrir a porta {ch['port']}: {e}")
+            for s in sers:
+                s.close()
+            sys.exit(1)
+
+    hold_s = args.hold_ms / 1000.0 if args.hold_ms is not None else None
+    merger = Merger(out, channels, text_path=text_path, hold_s=hold_s)
+    merger.start()
+    stop_event = threading.Event()
+    readers = []
+    for k, ser in enumerate(sers):
+        reader = SerialReader(ser, RawCaptureBuffer(TAIL_SIZE), stop_event, writer=ChannelTap(k, merger.queue))
+        reader.start()
+        readers.append(reader)
+
+    for k, ch in enumerate(channels):
+        print(f"CH{k} {ch['name']}: {ch['port']} @ {ch['baud']} bps")
+    print(f"Janela de reordenação: {merger.hold_s * 1000:.0f} ms")
+    print(f"Gravando em '{out}'" + (f" e '{text_path}'" if text_path else "") + ". Ctrl+C para encerrar.")
+
+    t_end = time.monotonic() + args.duration if args.duration else None
+    try:
+        while not stop_event.is_set():
+            time.sleep(1.0)
+            if t_end and time.monotonic() >= t_end:
+                break
+    except KeyboardInterrupt:
+        print("\nRecebido Ctrl+C. Encerrando...")
+    stop_event.set()
+    for reader in readers:
+        reader.join(timeout=2.0)
+    merger.close()
+
+    for k, ch in enumerate(channels):
+        blocks, nbytes = merger.counts[k]
+        print(f"CH{k} {ch['name']}: {blocks} blocos, {nbytes} bytes | {readers[k].stats.summary()}")
+    if merger.out_of_order:
+        print(f"Aviso: {merger.out_of_order} blocos chegaram fora da janela de reordenação (aumente --hold-ms).")
+    if latency:
+        # lê de volta do disco: a captura não fica inteira na memória
+        print_latency(read_merged_capture(out)[1], latency[0], latency[1], channels)
+
+if __name__ == "__main__":
+    main()
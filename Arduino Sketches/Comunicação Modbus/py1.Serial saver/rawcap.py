@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+rawcap.py
+
+Formato RAWCAP das capturas binárias do serial_saver.py (--raw / --stream), sem depender
+do pyserial: os decodificadores offline (py2.Modbus decoder) importam daqui.
+
+  linha 1: b"RAWCAP1\\n"
+  linha 2: cabeçalho JSON (porta, baud, data/hora de início, bytes descartados)
+  registros: <double t (s desde o início)> <uint32 n> <n bytes>   (little-endian)
+
+Os segmentos do --stream podem ser .bin.gz e o segmento aberto tem sufixo ".part"; num
+.part o último registro (ou o fim do stream gzip) pode estar incompleto e é ignorado.
+"""
+
+import gzip
+import json
+import os
+import struct
+
+RAWCAP_MAGIC = b"RAWCAP1\n"
+RAWCAP_RECORD = struct.Struct("<dI")  # t (s desde o início), tamanho do bloco
+
+def write_raw_capture(path, data, chunks, meta):
+    """Grava (data, chunks) de RawCaptureBuffer.snapshot() no formato RAWCAP."""
+    with open(path, "wb") as f:
+        f.write(RAWCAP_MAGIC)
+        f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8") + b"\n")
+        for k, (off, t) in enumerate(chunks):
+            end = chunks[k + 1][0] if k + 1 < len(chunks) else len(data)
+            f.write(RAWCAP_RECORD.pack(t, end - off))
+            f.write(data[off:end])
+
+def _iter_records(f):
+    with f:
+        try:
+            while True:
+                hdr = f.read(RAWCAP_RECORD.size)
+                if len(hdr) < RAWCAP_RECORD.size:
+                    break
+                t, n = RAWCAP_RECORD.unpack(hdr)
+                data = f.read(n)
+                if len(data) < n:
+                    break
+                yield t, data
+        except EOFError:
+            pass  # gzip sem o fim do stream (segmento .part)
+
+def open_raw_capture(path):
+    """
+    Abre um arquivo RAWCAP (ou segmento .gz / .part) e lê o cabeçalho.
+    Retorna (meta, gerador de (t, bytes)), que lê um registro por vez.
+    Levanta ValueError se o arquivo não for RAWCAP.
+    """
+    opener = gzip.open if ".gz" in os.path.basename(path) else open
+    f = opener(path, "rb")
+    try:
+        if f.read(len(RAWCAP_MAGIC)) != RAWCAP_MAGIC:
+            raise ValueError(f"{path}: não é um arquivo RAWCAP")
+        meta = json.loads(f.readline().decode("utf-8"))
+    except BaseException:
+        f.close()
+        raise
+    return meta, _iter_records(f)
+
+def read_raw_capture(path):
+    """Lê um arquivo RAWCAP inteiro. Retorna (meta, [(t, bytes), ...])."""
+    meta, records = open_raw_capture(path)
+    return meta, list(records)
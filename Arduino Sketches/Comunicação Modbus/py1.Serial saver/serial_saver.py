@@ -10,6 +10,19 @@ No terminal, digite:
   exit | quit | q    -> encerra o programa
 
 Após salvar, o buffer é limpo e a leitura continua para um novo ciclo.
+
+Modo --raw (RS485/Modbus binário): os bytes são guardados sem decodificação num buffer
+circular pré-alocado, com o instante (time.monotonic) de chegada de cada bloco lido.
+O "save" grava o formato RAWCAP (raw_AAAAMMDD_HHMMSS.bin), lido por rawcap.read_raw_capture():
+  linha 1: b"RAWCAP1\n"
+  linha 2: cabeçalho JSON (porta, baud, data/hora de início, bytes descartados)
+  registros: <double t (s desde o início)> <uint32 n> <n bytes>   (little-endian)
+
+Modo --stream DIR (capturas longas, sem supervisão): tudo o que chega é gravado por uma
+thread de escrita em segmentos rotativos (--segment-mb / --segment-min), opcionalmente
+comprimidos (--compress, gzip). O segmento aberto tem sufixo ".part" e recebe flush+fsync
+a cada --flush-s segundos; ao fechar, é renomeado. Na memória fica só uma cauda curta para
+o "show"; o "save" fecha o segmento atual e abre outro.
 """
 
 import sys
@@ -17,6 +30,12 @@ import threading
 import time
 import datetime
 import argparse
+import gzip
+import json
+import queue
+import os
+import select
+from array import array
 from collections import deque
 
 try:
@@ -26,8 +45,16 @@ except Exception as e:
     print("Erro: biblioteca 'pyserial' não encontrada. Instale com: pip install pyserial")
     raise
 
+from rawcap import RAWCAP_MAGIC, RAWCAP_RECORD, read_raw_capture, write_raw_capture
+
 # Configurações default
-READ_SLEEP = 0.05  # intervalo de leitura principal (s)
+READ_CHUNK = 4096  # máximo de bytes por leitura
+RAW_BUFFER_SIZE = 16 * 1024 * 1024  # capacidade do buffer circular no modo --raw (bytes)
+
+# Modo --stream
+TAIL_SIZE = 64 * 1024    # cauda em memória para o "show" (bytes no modo raw)
+TAIL_CHUNKS = 256        # cauda em memória para o "show" (blocos de texto)
+WRITE_QUEUE = 10000      # blocos aguardando a thread de escrita
 
 def list_ports():
     ports = list(serial.tools.list_ports.comports())
@@ -49,44 +76,347 @@ def choose_port_interactive():
             return ports[int(sel)].device
         print("Seleção inválida.")
 
+class RawCaptureBuffer:
+    """
+    Buffer circular de bytes brutos pré-alocado, com um índice paralelo de blocos
+    (offset absoluto no fluxo, instante monotônico de chegada).
+    Quando cheio, sobrescreve os bytes mais antigos (contados em `dropped`).
+    """
+
+    def __init__(self, capacity=RAW_BUFFER_SIZE):
+        self.capacity = capacity
+        self.data = bytearray(capacity)
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.total = 0                  # bytes escritos desde o último clear
+            self.offsets = array('Q')       # offset absoluto do início de cada bloco
+            self.times = array('d')         # time.monotonic() de chegada de cada bloco
+            self.first = 0                  # primeiro bloco ainda (parcialmente) no buffer
+            self.t0 = time.monotonic()
+            self.wall0 = datetime.datetime.now()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def dropped(self):
+        return max(0, self.total - self.capacity)
+
+    def append(self, chunk, t=None):
+        if not chunk:
+            return
+        t = time.monotonic() if t is None else t
+        with self.lock:
+            start = self.total
+            self.offsets.append(start)
+            self.times.append(t)
+            self.total += len(chunk)
+            if len(chunk) > self.capacity:
+                chunk = chunk[-self.capacity:]
+                start = self.total - self.capacity
+            pos = start % self.capacity
+            n1 = min(len(chunk), self.capacity - pos)
+            self.data[pos:pos + n1] = chunk[:n1]
+            if n1 < len(chunk):
+                self.data[:len(chunk) - n1] = chunk[n1:]
+            # descarta do índice os blocos totalmente sobrescritos
+            window_start = self.total - self.capacity
+            while self.first + 1 < len(self.offsets) and self.offsets[self.first + 1] <= window_start:
+                self.first += 1
+            if self.first > 4096 and self.first > len(self.offsets) // 2:
+                del self.offsets[:self.first]
+                del self.times[:self.first]
+                self.first = 0
+
+    def _window(self):
+        if self.total <= self.capacity:
+            return bytes(self.data[:self.total])
+        pos = self.total % self.capacity
+        return bytes(self.data[pos:]) + bytes(self.data[:pos])
+
+    def snapshot(self):
+        """Retorna (bytes no buffer em ordem, [(offset relativo, t relativo ao início)])."""
+        with self.lock:
+            data = self._window()
+            base = self.total - len(data)
+            chunks = [
+                (max(0, self.offsets[k] - base), self.times[k] - self.t0)
+                for k in range(self.first, len(self.offsets))
+            ]
+        return data, chunks
+
+    def tail(self, n):
+        with self.lock:
+            return self._window()[-n:]
+
+class SegmentWriter(threading.Thread):
+    """
+    Thread de escrita em disco para capturas contínuas: recebe blocos via put() e grava em
+    segmentos rotativos (RAWCAP no modo raw, texto caso contrário), por tamanho e/ou tempo.
+    O segmento aberto tem sufixo ".part"; flush + fsync a cada flush_s segundos.
+    """
+
+    def __init__(self, out_dir, meta, raw=True, max_bytes=64 * 1024 * 1024, max_seconds=3600,
+                 compress=False, flush_s=1.0, prefix=None):
+        super().__init__(daemon=True)
+        self.out_dir = out_dir
+        self.meta = dict(meta)
+        self.raw = raw
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compress = compress
+        self.flush_s = flush_s
+        self.prefix = prefix or ("raw" if raw else "data")
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE)
+        self.t0 = time.monotonic()
+        self.wall0 = datetime.datetime.now()
+        self.rotate_request = threading.Event()
+        self.f = None
+        self.path = None
+        self.seq = 0
+        self.seg_bytes = 0
+        self.seg_t0 = None
+        self.closed_segments = []
+        self.bytes_written = 0
+        self.dropped_chunks = 0
+        self.error = None
+
+    def put(self, data, t):
+        try:
+            self.queue.put_nowait((data, t))
+        except queue.Full:
+            self.dropped_chunks += 1
+
+    def rotate(self):
+        """Pede o fechamento do segmento atual (o próximo bloco abre um novo)."""
+        self.rotate_request.set()
+
+    def close(self, timeout=5.0):
+        """Pede o fim da thread e espera até timeout s (não trava se ela morreu com a fila cheia)."""
+        if not self.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("\nAviso: fila de gravação cheia; a thread de escrita não respondeu ao fechamento")
+        self.join(max(0.0, deadline - time.monotonic()))
+
+    def _open_segment(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.seq += 1
+        ext = ("bin" if self.raw else "txt") + (".gz" if self.compress else "")
+        name = f"{self.prefix}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.seq:04d}.{ext}"
+        self.path = os.path.join(self.out_dir, name)
+        part = self.path + ".part"
+        mode = "wb" if self.raw else "w"
+        if self.compress:
+            self.f = gzip.open(part, mode + ("" if self.raw else "t"), encoding=None if self.raw else "utf-8")
+        else:
+            self.f = open(part, mode, **({} if self.raw else {"encoding": "utf-8"}))
+        if self.raw:
+            meta = dict(self.meta, start=self.wall0.isoformat(timespec="milliseconds"), segment=self.seq)
+            self.f.write(RAWCAP_MAGIC)
+            self.f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.seg_bytes = 0
+        self.seg_t0 = time.monotonic()
+
+    def _sync(self):
+        self.f.flush()
+        raw_file = getattr(self.f, "fileobj", None) or self.f  # GzipFile -> arquivo real
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+
+    def _close_segment(self):
+        if self.f is None:
+            return
+        self.f.close()
+        os.replace(self.path + ".part", self.path)
+        self.closed_segments.append(self.path)
+        self.f = None
+
+    def _write(self, data, t):
+        if self.f is None:
+            self._open_segment()
+        if self.raw:
+            self.f.write(RAWCAP_RECORD.pack(t - self.t0, len(data)))
+            self.f.write(data)
+        else:
+            self.f.write(data)
+        self.seg_bytes += len(data)
+        self.bytes_written += len(data)
+
+    def _segment_full(self):
+        if self.f is None:
+            return False
+        if self.max_bytes and self.seg_bytes >= self.max_bytes:
+            return True
+        return bool(self.max_seconds) and time.monotonic() - self.seg_t0 >= self.max_seconds
+
+    def run(self):
+        next_sync = time.monotonic() + self.flush_s
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=self.flush_s)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    self._write(*item)
+                if self.rotate_request.is_set() or self._segment_full():
+                    self.rotate_request.clear()
+                    self._close_segment()
+                    next_sync = time.monotonic() + self.flush_s
+                elif self.f is not None and time.monotonic() >= next_sync:
+                    self._sync()
+                    next_sync = time.monotonic() + self.flush_s
+        except Exception as e:
+            self.error = e
+            print(f"\nErro na thread de escrita: {e}")
+        finally:
+            try:
+                self._close_segment()
+            except Exception:
+                pass
+
+    def summary(self):
+        current = os.path.basename(self.path) + ".part" if self.f is not None else "-"
+        return (f"Gravação: {self.bytes_written} bytes em {self.seq} segmento(s) | atual: {current} | "
+                f"fila: {self.queue.qsize()} | blocos perdidos: {self.dropped_chunks}")
+
+def char_time(baud):
+    """Duração de um caractere serial (11 bits: start + 8 dados + paridade/stop) em segundos."""
+    return 11.0 / baud
+
+def frame_gap(baud):
+    """Silêncio entre tramas Modbus RTU (3,5 caracteres; fixo em 1,75 ms acima de 19200 bps)."""
+    return 3.5 * char_time(baud) if baud <= 19200 else 0.00175
+
+class ReaderStats:
+    """Contadores da thread de leitura (vazão, blocos, sinais de sobrecarga do buffer do SO)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.t_start = time.monotonic()
+        self.bytes = 0
+        self.chunks = 0
+        self.full_reads = 0     # leituras que encheram READ_CHUNK (dados acumulados no SO)
+        self.max_backlog = 0    # maior in_waiting logo após uma leitura
+        self.errors = 0
+        self._rate_t = self.t_start
+        self._rate_bytes = 0
+
+    def update(self, n, backlog, full):
+        with self.lock:
+            self.bytes += n
+            self.chunks += 1
+            if full:
+                self.full_reads += 1
+            if backlog > self.max_backlog:
+                self.max_backlog = backlog
+
+    def summary(self):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.t_start
+            dt = now - self._rate_t
+            rate = (self.bytes - self._rate_bytes) / dt if dt > 0 else 0.0
+            self._rate_t, self._rate_bytes = now, self.bytes
+            avg = self.bytes / elapsed if elapsed > 0 else 0.0
+            return (f"{self.bytes} bytes em {self.chunks} blocos | {rate:.0f} B/s (média {avg:.0f} B/s) | "
+                    f"leituras cheias: {self.full_reads} | maior fila no SO: {self.max_backlog} bytes | "
+                    f"erros: {self.errors}")
+
 class SerialReader(threading.Thread):
-    def __init__(self, ser, buffer, stop_event):
+    """
+    Thread de leitura orientada a eventos: bloqueia até chegar um byte e fecha o bloco
+    quando a linha fica em silêncio por inter_byte_timeout (normalmente o intervalo entre
+    tramas), então cada bloco corresponde, em geral, a uma trama do barramento.
+    No Linux/macOS o silêncio é medido com select() no descritor da porta; no Windows o
+    próprio driver aplica o inter_byte_timeout (ReadIntervalTimeout).
+    O instante gravado é a chegada estimada do primeiro byte do bloco.
+    """
+
+    def __init__(self, ser, buffer, stop_event, stats=None, writer=None):
         super().__init__(daemon=True)
         self.ser = ser
-        self.buffer = buffer  # deque para evitar realocação excessiva
+        self.buffer = buffer  # deque de strings, ou RawCaptureBuffer no modo --raw
+        self.raw = isinstance(buffer, RawCaptureBuffer)
+        self.writer = writer  # SegmentWriter no modo --stream
         self.stop_event = stop_event
+        self.stats = stats if stats is not None else ReaderStats()
+        baud = getattr(ser, 'baudrate', None) or 9600
+        self.char_s = char_time(baud)
+        self.gap_s = getattr(ser, 'inter_byte_timeout', None) or 0.0
+        try:
+            self.fd = ser.fileno() if os.name == 'posix' else None
+        except Exception:
+            self.fd = None
+
+    def read_block(self):
+        """Lê um bloco delimitado por silêncio. Retorna (bytes, instante do 1º byte) ou (b'', None)."""
+        if self.fd is None:
+            data = self.ser.read(READ_CHUNK)
+            if not data:
+                return data, None
+            # o read retornou após o silêncio final: desconta-o e o tempo de transmissão
+            t_first = time.monotonic() - self.gap_s - len(data) * self.char_s
+            return data, t_first
+
+        first = self.ser.read(1)  # bloqueia até o timeout da porta
+        if not first:
+            return first, None
+        t_first = time.monotonic() - self.char_s
+        data = bytearray(first)
+        while len(data) < READ_CHUNK:
+            n = self.ser.in_waiting
+            if n:
+                data += self.ser.read(min(n, READ_CHUNK - len(data)))
+                continue
+            ready, _, _ = select.select([self.fd], [], [], self.gap_s)
+            if not ready:
+                break
+            data += self.ser.read(max(1, min(self.ser.in_waiting, READ_CHUNK - len(data))))
+        return bytes(data), t_first
+
+    def store(self, data, t):
+        if self.raw:
+            self.buffer.append(data, t)
+            if self.writer is not None:
+                self.writer.put(data, t)
+            return
+        try:
+            text = data.decode('utf-8', errors='replace')
+        except Exception:
+            # fallback: representar bytes hex
+            text = data.hex()
+        # append ao buffer (deque de strings)
+        self.buffer.append(text)
+        if self.writer is not None:
+            self.writer.put(text, t)
 
     def run(self):
-        # Lê em loop até stop_event ser setado
+        # Lê em loop até stop_event ser setado (o timeout da porta limita a espera)
         while not self.stop_event.is_set():
             try:
-                # lê bytes disponíveis
-                waiting = self.ser.in_waiting if hasattr(self.ser, 'in_waiting') else 0
-                if waiting:
-                    data = self.ser.read(waiting)
-                    try:
-                        text = data.decode('utf-8', errors='replace')
-                    except Exception:
-                        # fallback: representar bytes hex
-                        text = data.hex()
-                    # append ao buffer (deque de strings)
-                    self.buffer.append(text)
-                else:
-                    # tenta ler um byte para não travar em algumas portas
-                    b = self.ser.read(1)
-                    if b:
-                        try:
-                            t = b.decode('utf-8', errors='replace')
-                        except Exception:
-                            t = b.hex()
-                        self.buffer.append(t)
-                time.sleep(READ_SLEEP)
+                data, t_first = self.read_block()
+                if not data:
+                    continue
+                backlog = self.ser.in_waiting
+                self.stats.update(len(data), backlog, len(data) >= READ_CHUNK)
+                self.store(data, t_first)
             except serial.SerialException as e:
                 print(f"\nErro de comunicação serial: {e}")
                 self.stop_event.set()
                 break
             except Exception as e:
                 # Erro inesperado, mas não mata o programa imediatamente
+                self.stats.errors += 1
                 print(f"\nErro na thread de leitura: {e}")
                 time.sleep(0.5)
         # fim do loop
@@ -115,6 +445,14 @@ def main():
     parser.add_argument("port", nargs="?", help="Porta serial (ex: COM6 ou /dev/ttyUSB0). Se omitido, será listado.")
     parser.add_argument("baud", nargs="?", type=int, default=115200, help="Baud rate (padrão 9600).")
     parser.add_argument("--timeout", type=float, default=0.1, help="Timeout de leitura (segundos).")
+    parser.add_argument("--gap", type=float, default=None, help="Silêncio entre blocos em ms (padrão: 3,5 caracteres no baud rate).")
+    parser.add_argument("--raw", action="store_true", help="Captura binária (bytes brutos + instante de chegada, formato RAWCAP).")
+    parser.add_argument("--raw-size", type=int, default=RAW_BUFFER_SIZE, help="Capacidade do buffer circular no modo --raw (bytes).")
+    parser.add_argument("--stream", metavar="DIR", default=None, help="Grava continuamente em segmentos rotativos nesta pasta.")
+    parser.add_argument("--segment-mb", type=float, default=64, help="Tamanho máximo de cada segmento (MB, 0 = sem limite).")
+    parser.add_argument("--segment-min", type=float, default=60, help="Duração máxima de cada segmento (min, 0 = sem limite).")
+    parser.add_argument("--compress", action="store_true", help="Comprime os segmentos com gzip.")
+    parser.add_argument("--flush-s", type=float, default=1.0, help="Intervalo de flush+fsync do segmento aberto (s).")
     args = parser.parse_args()
 
     port = args.port
@@ -127,31 +465,65 @@ def main():
             return
 
     try:
-        ser = serial.Serial(port=port, baudrate=baud, timeout=args.timeout)
+        gap = args.gap / 1000.0 if args.gap is not None else frame_gap(baud)
+        ser = serial.Serial(port=port, baudrate=baud, timeout=args.timeout, inter_byte_timeout=gap)
     except serial.SerialException as e:
         print(f"Não foi possível abrir a porta {port}: {e}")
         return
 
-    print(f"Abrindo {port} @ {baud} bps. Aguarde... (Ctrl+C para sair)\n")
+    print(f"Abrindo {port} @ {baud} bps (silêncio entre blocos {gap * 1000:.2f} ms). Aguarde... (Ctrl+C para sair)\n")
     stop_event = threading.Event()
-    buffer = deque()  # armazenamento em memória (lista de strings)
+    writer = None
+    if args.stream:
+        # em disco: na memória fica só a cauda para o "show"
+        buffer = RawCaptureBuffer(TAIL_SIZE) if args.raw else deque(maxlen=TAIL_CHUNKS)
+        writer = SegmentWriter(args.stream, {"port": port, "baud": baud}, raw=args.raw,
+                               max_bytes=int(args.segment_mb * 1024 * 1024), max_seconds=args.segment_min * 60,
+                               compress=args.compress, flush_s=args.flush_s)
+        writer.start()
+        print(f"Gravando continuamente em '{args.stream}' (segmentos de {args.segment_mb:g} MB / {args.segment_min:g} min"
+              + (", gzip" if args.compress else "") + ")")
+    elif args.raw:
+        buffer = RawCaptureBuffer(args.raw_size)  # bytes brutos, sem decodificar
+    else:
+        buffer = deque()  # armazenamento em memória (lista de strings)
 
-    reader = SerialReader(ser, buffer, stop_event)
+    reader = SerialReader(ser, buffer, stop_event, writer=writer)
     reader.start()
 
     try:
         while not stop_event.is_set():
-            cmd = input("Comando (save [nome], show, clear, exit): ").strip()
+            cmd = input("Comando (save [nome], show, stats, clear, exit): ").strip()
             if not cmd:
                 continue
             parts = cmd.split()
             c = parts[0].lower()
 
-            if c == "save":
+            if c == "save" and writer is not None:
+                writer.rotate()
+                print(f"Segmento atual será fechado; gravados até agora: {len(writer.closed_segments)} fechados.")
+
+            elif c == "save":
                 if len(parts) >= 2:
                     fname = " ".join(parts[1:])
                 else:
-                    fname = timestamp_filename("data", "txt")
+                    fname = timestamp_filename("raw", "bin") if args.raw else timestamp_filename("data", "txt")
+                if args.raw:
+                    data, chunks = buffer.snapshot()
+                    meta = {
+                        "port": port,
+                        "baud": baud,
+                        "start": buffer.wall0.isoformat(timespec="milliseconds"),
+                        "dropped": buffer.dropped,
+                    }
+                    try:
+                        write_raw_capture(fname, data, chunks, meta)
+                        print(f"Salvo {len(data)} bytes ({len(chunks)} blocos) em '{fname}'."
+                              + (f" {buffer.dropped} bytes antigos foram sobrescritos." if buffer.dropped else ""))
+                        buffer.clear()
+                    except Exception as e:
+                        print(f"Erro ao salvar arquivo: {e}")
+                    continue
                 content = buffer_to_string(buffer)
                 try:
                     with open(fname, "w", encoding="utf-8") as f:
@@ -161,6 +533,16 @@ def main():
                 except Exception as e:
                     print(f"Erro ao salvar arquivo: {e}")
 
+            elif c in ("show", "dump") and args.raw:
+                tail = buffer.tail(256)
+                if not tail:
+                    print("[buffer vazio]")
+                else:
+                    print("---- últimos 256 bytes (hex) ----")
+                    for i in range(0, len(tail), 32):
+                        print(" ".join(f"{b:02X}" for b in tail[i:i + 32]))
+                    print(f"Tamanho em memória: {len(buffer)} bytes ({buffer.dropped} sobrescritos)")
+
             elif c in ("show", "dump"):
                 # mostra um resumo do buffer (últimos 1000 chars)
                 content = buffer_to_string(buffer)
@@ -173,6 +555,11 @@ def main():
                     print("---- fim do preview ----")
                     print(f"Tamanho total em memória: {len(content)} bytes")
 
+            elif c == "stats":
+                print(reader.stats.summary())
+                if writer is not None:
+                    print(writer.summary())
+
             elif c == "clear":
                 clear_buffer(buffer)
                 print("Buffer limpo.")
@@ -183,7 +570,7 @@ def main():
                 break
 
             else:
-                print("Comando não reconhecido. Use: save [nome], show, clear, exit")
+                print("Comando não reconhecido. Use: save [nome], show, stats, clear, exit")
 
     except KeyboardInterrupt:
         print("\nRecebido Ctrl+C. Encerrando...")
@@ -191,6 +578,12 @@ def main():
 
     # Aguarda thread terminar
     reader.join(timeout=2.0)
+    print(reader.stats.summary())
+    if writer is not None:
+        writer.close()
+        print(writer.summary())
+        for path in writer.closed_segments[-5:]:
+            print(f"  {path}")
     print("Feito. Porta fechada e programa finalizado.")
 
 if __name__ == "__main__":
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+bench_decoder.py
+
+Benchmark suite for the Modbus decoding pipeline.
+
+Generates reproducible synthetic RS485 streams (FC03/FC23 traffic from several slaves,
+with configurable garbage bytes between frames and truncated frames) and measures the
+throughput (MB/s and frames/s) of each stage:
+
+  crc_bitwise      crc16_modbus from modbus_signed_decoder_v2.py over every valid frame
+  crc_table        table-driven crc16_modbus from modbus_timeline.py
+  crc_bulk         crc_numpy.crc16_windows over all frames at once
+  framing_v2       find_modbus_frames from modbus_signed_decoder_v2.py (FC23 / slave 0x02)
+  framing_v2_plain same, without the NumPy CRC pre-filter
+  framing_bulk     crc_numpy.scan_stream_frames (all function codes)
+  framing_scanner  RtuFrameScanner from modbus_timeline.py (all function codes)
+  parsing          request/response pairing (iter_register_events)
+  output           decode_modbus_log text report of modbus_signed_decoder_v2.py (from log text)
+  output_jsonl     iter_log_records of modbus_signed_decoder_v2.py streamed to a JSONL sink
+
+With --out the results are saved as JSON (with the git commit) so runs can be compared
+across commits; --out DIR writes bench_<commit>_<date>.json inside DIR. Without --out
+nothing is written.
+
+Usage:
+  python bench_decoder.py --sizes 64K,1M
+  python bench_decoder.py --sizes 100M --stages crc_table,framing_scanner
+  python bench_decoder.py --out /tmp/bench --compare bench_old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import decoder_sinks
+import modbus_signed_decoder_v2 as v2
+import modbus_timeline as mt
+
+try:
+    import numpy as np
+    import crc_numpy as cn
+except ImportError:
+    cn = None
+
+# --- Synthetic stream ---
+
+def _crc_bytes(adu):
+    return struct.pack('<H', mt.crc16_modbus(adu))
+
+def _fc03_pair(rng, slave):
+    start = rng.choice((0x0000, 0x1510, 0x2000, 0x9C40))
+    qty = rng.randint(1, 40)
+    req = struct.pack('>BBHH', slave, 0x03, start, qty)
+    regs = [rng.randint(0, 0xFFFF) for _ in range(qty)]
+    res = struct.pack('>BBB', slave, 0x03, qty * 2) + struct.pack(f'>{qty}H', *regs)
+    return [req + _crc_bytes(req), res + _crc_bytes(res)]
+
+def _fc23_pair(rng, slave):
+    read_qty = rng.randint(1, 12)
+    write_vals = [rng.randint(0, 0xFFFF) for _ in range(rng.randint(1, 10))]
+    req = struct.pack('>BBHHHHB', slave, 0x17, 0xC34F, read_qty, 0xC34F, len(write_vals), len(write_vals) * 2)
+    req += struct.pack(f'>{len(write_vals)}H', *write_vals)
+    regs = [rng.randint(0, 0xFFFF) for _ in range(read_qty)]
+    res = struct.pack('>BBB', slave, 0x17, read_qty * 2) + struct.pack(f'>{read_qty}H', *regs)
+    return [req + _crc_bytes(req), res + _crc_bytes(res)]
+
+def generate_stream(size, seed=1234, slaves=(0x01, 0x02, 0x07), fc23_ratio=0.5,
+                    noise_rate=0.05, trunc_rate=0.01):
+    """
+    Returns (stream bytes, list of (offset, frame bytes) for the intact frames).
+    noise_rate: probability of 1..8 garbage bytes before a frame.
+    trunc_rate: probability of a frame being cut short (its tail never sent).
+    """
+    rng = random.Random(seed)
+    out = bytearray()
+    frames = []
+    while len(out) < size:
+        slave = rng.choice(slaves)
+        pair = _fc23_pair(rng, slave) if rng.random() < fc23_ratio else _fc03_pair(rng, slave)
+        for frame in pair:
+            if rng.random() < noise_rate:
+                out += bytes(rng.getrandbits(8) for _ in range(rng.randint(1, 8)))
+            if rng.random() < trunc_rate:
+                out += frame[:rng.randint(1, len(frame) - 1)]
+                continue
+            frames.append((len(out), frame))
+            out += frame
+    return bytes(out), frames
+
+def stream_to_log(stream, frames, t0=100.0, dt=0.03):
+    """
+    Renders the stream as sniffer log text, one line per intact frame (garbage on its own line).
+    t0=None leaves out the timestamps.
+    """
+    lines = []
+    pos = 0
+    t = t0
+    for off, frame in frames:
+        prefix = f"{t:.3f} [RX] " if t is not None else "[RX] "
+        if off > pos:
+            lines.append(prefix + " ".join(f"{b:02X}" for b in stream[pos:off]))
+        lines.append(prefix + " ".join(f"{b:02X}" for b in frame))
+        pos = off + len(frame)
+        if t is not None:
+            t += dt
+    return "\n".join(lines)
+
+# --- Stages ---
+# Each stage receives the context dict and returns the number of frames it produced/handled.
+# Inputs a stage needs from a previous stage are prepared by its setup, outside the timing.
+
+def setup_scanned(ctx):
+    if 'scanned' not in ctx:
+        stage_framing_scanner(ctx)
+
+def setup_log_text(ctx):
+    if 'log_text' not in ctx:
+        ctx['log_text'] = stream_to_log(ctx['stream'], ctx['frames'])
+
+def stage_crc_bitwise(ctx):
+    for _, frame in ctx['frames']:
+        v2.crc16_modbus(frame[:-2])
+    return len(ctx['frames'])
+
+def stage_crc_table(ctx):
+    for _, frame in ctx['frames']:
+        mt.crc16_modbus(frame[:-2])
+    return len(ctx['frames'])
+
+def stage_crc_bulk(ctx):
+    buf = cn.as_u8(ctx['stream'])
+    offsets = np.fromiter((off for off, _ in ctx['frames']), dtype=np.int64)
+    lengths = np.fromiter((len(f) - 2 for _, f in ctx['frames']), dtype=np.int64)
+    cn.crc16_windows(buf, offsets, lengths)
+    return len(ctx['frames'])
+
+def stage_framing_v2(ctx):
+    return len(v2.find_modbus_frames(ctx['stream']))
+
+def stage_framing_v2_plain(ctx):
+    prefilter = v2.confirmed_windows
+    v2.confirmed_windows = None
+    try:
+        return len(v2.find_modbus_frames(ctx['stream']))
+    finally:
+        v2.confirmed_windows = prefilter
+
+def stage_framing_bulk(ctx):
+    return len(cn.scan_stream_frames(ctx['stream']))
+
+def stage_framing_scanner(ctx):
+    scanner = mt.RtuFrameScanner()
+    frames = scanner.feed(ctx['stream'])
+    frames += scanner.flush()
+    ctx['scanned'] = frames
+    return len(frames)
+
+def stage_parsing(ctx):
+    return sum(1 for _ in mt.iter_register_events(ctx['scanned']))
+
+def stage_output(ctx):
+    report = v2.decode_modbus_log(ctx['log_text'])
+    return report.count('### Trama')
+
+def stage_output_jsonl(ctx):
+    with open(os.devnull, 'w', encoding='utf-8') as out:
+        records = v2.iter_log_records(ctx['log_text'])
+        return decoder_sinks.write_records(records, decoder_sinks.JsonlSink(out))
+
+STAGES = {
+    'crc_bitwise': stage_crc_bitwise,
+    'crc_table': stage_crc_table,
+    'crc_bulk': stage_crc_bulk,
+    'framing_v2': stage_framing_v2,
+    'framing_v2_plain': stage_framing_v2_plain,
+    'framing_bulk': stage_framing_bulk,
+    'framing_scanner': stage_framing_scanner,
+    'parsing': stage_parsing,
+    'output': stage_output,
+    'output_jsonl': stage_output_jsonl,
+}
+
+NUMPY_STAGES = ('crc_bulk', 'framing_bulk')
+
+STAGE_SETUP = {
+    'parsing': setup_scanned,
+    'output': setup_log_text,
+    'output_jsonl': setup_log_text,
+}
+
+# --- Runner ---
+
+def parse_size(s):
+    s = s.strip().upper()
+    mult = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}.get(s[-1:], 1)
+    return int(float(s.rstrip('KMG')) * mult)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+def run_stage(name, ctx, repeat):
+    fn = STAGES[name]
+    if name in STAGE_SETUP:
+        STAGE_SETUP[name](ctx)
+    best = None
+    count = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = fn(ctx)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, count
+
+def run_benchmark(sizes, stages, repeat=3, seed=1234, noise_rate=0.05, trunc_rate=0.01):
+    results = []
+    for size in sizes:
+        stream, frames = generate_stream(size, seed=seed, noise_rate=noise_rate, trunc_rate=trunc_rate)
+        ctx = {'stream': stream, 'frames': frames}
+        mb = len(stream) / 1e6
+        for name in stages:
+            dt, count = run_stage(name, ctx, repeat)
+            results.append({
+                'stage': name,
+                'size_bytes': len(stream),
+                'frames_in_stream': len(frames),
+                'frames_out': count,
+                'seconds': dt,
+                'mb_per_s': mb / dt if dt > 0 else None,
+                'frames_per_s': count / dt if dt > 0 else None,
+            })
+            print(f"  {name:<16} {len(stream):>11} B  {dt:9.4f} s  "
+                  f"{results[-1]['mb_per_s'] or 0:9.2f} MB/s  {results[-1]['frames_per_s'] or 0:12.0f} tramas/s")
+    return results
+
+def compare(current, previous_path):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        prev = {(r['stage'], r['size_bytes']): r for r in json.load(f)['results']}
+    print(f"\n--- Comparação com {previous_path} ---")
+    for r in current:
+        old = prev.get((r['stage'], r['size_bytes']))
+        if old and old['seconds'] and r['seconds']:
+            print(f"  {r['stage']:<16} {r['size_bytes']:>11} B  x{old['seconds'] / r['seconds']:.2f}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark do pipeline de decodificação Modbus.")
+    ap.add_argument('--sizes', default='64K,1M', help='Tamanhos dos fluxos sintéticos (ex: 64K,1M,100M)')
+    ap.add_argument('--stages', default=','.join(STAGES), help='Estágios a medir (separados por vírgula)')
+    ap.add_argument('--repeat', type=int, default=3, help='Repetições por estágio (usa o melhor tempo)')
+    ap.add_argument('--seed', type=int, default=1234, help='Semente do gerador sintético')
+    ap.add_argument('--noise', type=float, default=0.05, help='Probabilidade de lixo antes de cada trama')
+    ap.add_argument('--trunc', type=float, default=0.01, help='Probabilidade de trama truncada')
+    ap.add_argument('--out', default=None,
+                    help='Salva os resultados neste JSON (ou em DIR/bench_<commit>_<data>.json se for uma pasta)')
+    ap.add_argument('--compare', default=None, help='JSON de uma execução anterior para comparar')
+    args = ap.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    if cn is None:
+        skipped = [s for s in stages if s in NUMPY_STAGES]
+        if skipped:
+            print("numpy não instalado, ignorando:", ", ".join(skipped))
+        stages = [s for s in stages if s not in NUMPY_STAGES]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        print("Estágios desconhecidos:", ", ".join(unknown), "| disponíveis:", ", ".join(STAGES))
+        sys.exit(1)
+
+    commit = git_commit()
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    print(f"Commit {commit} | Python {platform.python_version()} | seed {args.seed}")
+    results = run_benchmark(sizes, stages, repeat=args.repeat, seed=args.seed,
+                            noise_rate=args.noise, trunc_rate=args.trunc)
+
+    if args.out:
+        out = args.out
+        if os.path.isdir(out):
+            out = os.path.join(out, f"bench_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(out, 'w', encoding='utf-8') as f:
+            json.dump({
+                'commit': commit,
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'params': {'seed': args.seed, 'noise_rate': args.noise, 'trunc_rate': args.trunc, 'repeat': args.repeat},
+                'results': results,
+            }, f, indent=2)
+        print(f"Resultados salvos em {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
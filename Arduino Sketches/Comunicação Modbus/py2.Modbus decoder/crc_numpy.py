@@ -0,0 +1,154 @@
+"""
+crc_numpy.py
+
+Vectorised Modbus CRC-16 for offline capture analysis.
+
+Brute-force framing checks the CRC of every candidate (offset, length) window of a capture,
+one Python loop per byte. Here all candidate windows are computed at once with NumPy: the
+table-driven CRC is advanced one byte position per step for every window still active, so
+the Python loop runs at most MAX_RTU_FRAME times regardless of the capture size.
+
+The decoders use confirmed_windows() as a pre-filter: their byte-by-byte parsing only runs
+on the (offset, length) windows whose CRC is already known to be valid.
+"""
+
+import numpy as np
+
+from modbus_timeline import CRC16_TABLE, MAX_RTU_FRAME, parse_frame
+
+CRC_TABLE = np.asarray(CRC16_TABLE, dtype=np.uint16)
+
+# frame types per candidate kind (see modbus_timeline.candidate_lengths)
+KIND_TYPES = ('REQUEST', 'RESPONSE', 'EXCEPTION')
+KIND_REQUEST, KIND_RESPONSE, KIND_EXCEPTION = range(3)
+
+def as_u8(stream):
+    """uint8 view of a bytes/bytearray/memoryview capture (no copy)."""
+    return np.frombuffer(stream, dtype=np.uint8)
+
+def crc16_windows(buf, offsets, lengths):
+    """
+    CRC-16 of buf[off:off + length] for every window, as uint16[n].
+    buf: uint8 array; offsets/lengths: integer arrays (windows must lie inside buf).
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n = len(offsets)
+    crc = np.full(n, 0xFFFF, dtype=np.uint16)
+    if n == 0:
+        return crc
+    # longest windows first so that the active set is always a prefix
+    order = np.argsort(-lengths, kind='stable')
+    off = offsets[order]
+    neg_len = -lengths[order]
+    c = crc  # in sorted order
+    for k in range(int(lengths.max())):
+        active = np.searchsorted(neg_len, -k, side='left')  # windows with length > k
+        if active == 0:
+            break
+        ca = c[:active]
+        idx = (ca ^ buf[off[:active] + k]) & 0xFF
+        c[:active] = (ca >> 8) ^ CRC_TABLE[idx]
+    out = np.empty_like(c)
+    out[order] = c
+    return out
+
+def crc_mask(buf, offsets, lengths):
+    """True for every window whose last two bytes (Low, High) are the CRC of the rest."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ok = (lengths >= 4) & (offsets + lengths <= len(buf))
+    mask = np.zeros(len(offsets), dtype=bool)
+    if not ok.any():
+        return mask
+    off, ln = offsets[ok], lengths[ok]
+    end = off + ln
+    received = buf[end - 2].astype(np.uint16) | (buf[end - 1].astype(np.uint16) << 8)
+    mask[ok] = crc16_windows(buf, off, ln - 2) == received
+    return mask
+
+def rtu_candidates(buf, slaves=None, functions=None):
+    """
+    Candidate (offset, length, kind) windows for every position of the capture, following
+    the same length rules as modbus_timeline.candidate_lengths, filtered by slave address
+    and function code when given.
+    """
+    n = len(buf)
+    if n < 4:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    pos = np.arange(n - 3, dtype=np.int64)
+    slave = buf[:n - 3]
+    fc = buf[1:n - 2]
+    keep = np.ones(len(pos), dtype=bool)
+    if slaves is not None:
+        keep &= np.isin(slave, np.asarray(list(slaves), dtype=np.uint8))
+    if functions is not None:
+        fn = np.asarray(list(functions), dtype=np.uint8)
+        keep &= np.isin(fc, fn) | (np.isin(fc & 0x7F, fn) & (fc >= 0x80))
+    pos, fc = pos[keep], fc[keep]
+
+    def byte_at(p, k):
+        q = np.minimum(p + k, n - 1)
+        return buf[q].astype(np.int64)
+
+    groups = []
+    read_fc = np.isin(fc, (0x01, 0x02, 0x03, 0x04))
+    p = pos[read_fc]
+    groups.append((p, np.full(len(p), 8), KIND_REQUEST))
+    groups.append((p, 5 + byte_at(p, 2), KIND_RESPONSE))
+    p = pos[np.isin(fc, (0x05, 0x06))]
+    groups.append((p, np.full(len(p), 8), KIND_REQUEST))
+    p = pos[np.isin(fc, (0x0F, 0x10))]
+    groups.append((p, np.full(len(p), 8), KIND_RESPONSE))
+    groups.append((p, 9 + byte_at(p, 6), KIND_REQUEST))
+    p = pos[fc == 0x17]
+    groups.append((p, 5 + byte_at(p, 2), KIND_RESPONSE))
+    groups.append((p, 13 + byte_at(p, 10), KIND_REQUEST))
+    p = pos[fc >= 0x80]
+    groups.append((p, np.full(len(p), 5), KIND_EXCEPTION))
+
+    offsets = np.concatenate([g[0] for g in groups])
+    lengths = np.concatenate([np.asarray(g[1], dtype=np.int64) for g in groups])
+    kinds = np.concatenate([np.full(len(g[0]), g[2], dtype=np.int64) for g in groups])
+    inside = (offsets + lengths <= n) & (lengths <= MAX_RTU_FRAME)
+    return offsets[inside], lengths[inside], kinds[inside]
+
+def valid_windows(stream, slaves=None, functions=None):
+    """(offsets, lengths, kinds) of the CRC-valid candidate windows, sorted by offset."""
+    buf = as_u8(stream)
+    offsets, lengths, kinds = rtu_candidates(buf, slaves, functions)
+    mask = crc_mask(buf, offsets, lengths)
+    offsets, lengths, kinds = offsets[mask], lengths[mask], kinds[mask]
+    order = np.lexsort((lengths, offsets))
+    return offsets[order], lengths[order], kinds[order]
+
+def confirmed_windows(stream, slaves=None, functions=None):
+    """{offset: set of frame lengths with a valid CRC at that offset}."""
+    offsets, lengths, _ = valid_windows(stream, slaves, functions)
+    confirmed = {}
+    for off, length in zip(offsets.tolist(), lengths.tolist()):
+        confirmed.setdefault(off, set()).add(length)
+    return confirmed
+
+def scan_stream_frames(stream, slaves=None, functions=None):
+    """
+    Offline equivalent of modbus_timeline.RtuFrameScanner over a whole capture: greedy,
+    non-overlapping, CRC-confirmed frames parsed with modbus_timeline.parse_frame.
+    """
+    offsets, lengths, kinds = valid_windows(stream, slaves, functions)
+    frames = []
+    next_free = 0
+    for off, length, kind in zip(offsets.tolist(), lengths.tolist(), kinds.tolist()):
+        if off < next_free:
+            continue
+        frame_bytes = bytes(stream[off:off + length])
+        parsed = parse_frame(frame_bytes, KIND_TYPES[kind])
+        if parsed is None:
+            continue
+        parsed['t'] = None
+        parsed['offset'] = off
+        parsed['bytes'] = frame_bytes
+        frames.append(parsed)
+        next_free = off + length
+    return frames
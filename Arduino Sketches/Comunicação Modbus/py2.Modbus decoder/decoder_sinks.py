@@ -0,0 +1,128 @@
+"""
+decoder_sinks.py
+
+Output sinks for the structured frame records yielded by the decoders
+(modbus_signed_decoder_v2.iter_frame_records).
+
+Records carry plain values only; each sink formats just what it writes, one record at a
+time, so the memory needed does not grow with the size of the capture:
+
+  text   the console report of decode_modbus_log (unsigned/signed/float16 per register)
+  jsonl  one JSON object per frame (NDJSON)
+  csv    one row per register value (frame index, type, slave, address, value, signed)
+"""
+
+import csv
+import json
+
+def decode_signed_16bit(value: int) -> int:
+    """Converts a 16-bit unsigned integer to a signed integer using Two's Complement."""
+    if value & 0x8000:
+        return value - 0x10000
+    return value
+
+def decode_float_16bit(value: int, scale: int = 100) -> float:
+    """Interprets a 16-bit integer as a signed value divided by `scale`."""
+    return decode_signed_16bit(value) / scale
+
+def _value_lines(values):
+    for val in values:
+        yield (f"      - 0x{val:04X}: Unsigned={val}, Signed={decode_signed_16bit(val)}, "
+               f"Float16bit={decode_float_16bit(val):.2f}")
+
+def format_record(record):
+    """Yields the console report lines of one frame record."""
+    frame_bytes = record['bytes']
+    yield f"### Trama #{record['index']} - {record['type']}"
+    yield f"  Bytes: {' '.join(f'{b:02X}' for b in frame_bytes)}"
+    yield f"  CRC Válido: {record['crc']:04X} (Recebido: {(frame_bytes[-1] << 8) | frame_bytes[-2]:04X})"
+
+    if record['type'] == 'REQUEST':
+        yield f"  🔵 MESTRE -> ESCRAVO 0x{record['slave_addr']:02X}"
+        yield f"    Função: 0x{record['function_code']:02X} (Read/Write Multiple Registers)"
+        yield f"    Leitura: Endereço 0x{record['read_start']:04X} ({record['read_start']} decimal), Qtd. {record['read_qty']}"
+        yield f"    Escrita: Endereço 0x{record['write_start']:04X} ({record['write_start']} decimal), Qtd. {record['write_qty']}"
+        yield f"    Valores de Escrita ({len(record['write_values'])}):"
+        yield from _value_lines(record['write_values'])
+
+    elif record['type'] == 'RESPONSE':
+        yield f"  🟢 ESCRAVO 0x{record['slave_addr']:02X} -> MESTRE"
+        yield f"    Função: 0x{record['function_code']:02X} (Read/Write Multiple Registers)"
+        yield f"    Contagem de Bytes: {record['byte_count']}"
+        yield f"    Registros Lidos ({len(record['registers'])}):"
+        yield from _value_lines(record['registers'])
+
+    yield "-" * 50
+
+def format_report(records):
+    """Yields the console report lines of every record."""
+    for record in records:
+        yield from format_record(record)
+
+# --- Sinks ---
+# A sink has write(record) and close(); close() does not close the underlying file.
+
+class ConsoleSink:
+    def __init__(self, out):
+        self.out = out
+        self.started = False
+
+    def write(self, record):
+        if not self.started:
+            self.out.write("\n--- Análise da Comunicação Modbus RTU (FC 23) ---\n\n")
+            self.started = True
+        for line in format_record(record):
+            self.out.write(line + "\n")
+
+    def close(self):
+        self.out.flush()
+
+class JsonlSink:
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, record):
+        obj = dict(record)
+        obj['bytes'] = record['bytes'].hex().upper()
+        self.out.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.out.flush()
+
+class CsvSink:
+    FIELDS = ['frame', 'type', 'slave_addr', 'function_code', 'kind', 'address', 'value', 'signed']
+
+    def __init__(self, out):
+        self.out = out
+        self.writer = csv.writer(out)
+        self.writer.writerow(self.FIELDS)
+
+    def write(self, record):
+        if record['type'] == 'REQUEST':
+            kind, start, values = 'write', record['write_start'], record['write_values']
+        else:
+            kind, start, values = 'read', record.get('start_address'), record['registers']
+        for k, val in enumerate(values):
+            address = '' if start is None else start + k
+            self.writer.writerow([record['index'], record['type'], record['slave_addr'],
+                                  record['function_code'], kind, address, val, decode_signed_16bit(val)])
+
+    def close(self):
+        self.out.flush()
+
+SINKS = {
+    'text': ConsoleSink,
+    'jsonl': JsonlSink,
+    'csv': CsvSink,
+}
+
+def write_records(records, sink):
+    """Streams records into a sink; returns the number of records written."""
+    n = 0
+    try:
+        for record in records:
+            sink.write(record)
+            n += 1
+    finally:
+        sink.close()
+    return n
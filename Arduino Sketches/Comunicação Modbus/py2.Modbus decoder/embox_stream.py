@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+embox_stream.py
+
+Streaming parser for the EMBOX proprietary "7F 7F" bus protocol.
+
+Frame layout (confirmed against py1.Serial saver/ch4_i13_riodas.txt, 74/74 frames valid):
+
+  7F 7F | ID | STAMP (4, BE) | LEN (2, BE) | PAYLOAD (LEN) | CRC (2) | F7 F7
+
+ - ID: device address (0x09 = EMBOX master in the captures, inverters answer with their own ID)
+ - STAMP: small sequence number in master requests, unix time in device responses
+ - CRC: Modbus CRC-16 over ID..PAYLOAD (byte order learned from the first valid frame)
+ - master requests carry a 2 byte payload: FUNCTION, TARGET ID
+
+Unlike embox_protocol_analyzer.py (one 15 byte frame per line), the parser frames by the
+length field over an arbitrary byte stream, so long bus captures can be processed directly:
+sniffer logs (any line split) or raw binary captures.
+
+Usage:
+  python embox_stream.py "../py1.Serial saver/ch4_i13_riodas.txt"
+  python embox_stream.py capture.bin --raw --jsonl > frames.jsonl
+  python embox_stream.py raw_20251029_143900.bin --raw     (serial_saver.py --raw capture)
+"""
+
+import argparse
+import json
+import sys
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from modbus_timeline import crc16_modbus, iter_log_lines, open_raw_capture
+
+HEADER = b'\x7f\x7f'
+TRAILER = b'\xf7\xf7'
+HEADER_LEN = 9          # 7F 7F + ID + STAMP(4) + LEN(2)
+OVERHEAD = HEADER_LEN + 4
+MAX_PAYLOAD = 4096
+MASTER_ID = 0x09
+
+class EmboxStreamParser:
+    """
+    Incremental "7F 7F" frame parser.
+    feed() accepts arbitrary chunks (optionally with the chunk timestamp) and returns the
+    records completed so far. Frames are also indexed by (device_id, function).
+    """
+
+    def __init__(self, master_id=MASTER_ID, crc_order=None):
+        self.master_id = master_id
+        self.crc_order = crc_order      # 'little' | 'big' | None (learn)
+        self.buf = bytearray()
+        self.base = 0                   # stream offset of buf[0]
+        self.marks = []                 # (stream offset, t) of each fed chunk
+        self.pending = {}               # target id -> function of last master request
+        self.index = defaultdict(list)  # (device_id, function) -> stream offsets
+        self.frames = 0
+        self.crc_errors = 0
+        self.skipped = 0
+
+    def feed(self, data, t=None):
+        if t is not None:
+            self.marks.append((self.base + len(self.buf), t))
+        self.buf += data
+        return self._scan()
+
+    def _time_at(self, offset):
+        k = bisect_right(self.marks, (offset, float('inf'))) - 1
+        return self.marks[k][1] if k >= 0 else None
+
+    def _check_crc(self, body, crc_bytes):
+        crc = crc16_modbus(body)
+        if self.crc_order is not None:
+            return crc == int.from_bytes(crc_bytes, self.crc_order)
+        for order in ('little', 'big'):
+            if crc == int.from_bytes(crc_bytes, order):
+                self.crc_order = order
+                return True
+        return False
+
+    def _scan(self):
+        out = []
+        buf = self.buf
+        i = 0
+        while True:
+            j = buf.find(HEADER, i)
+            if j < 0:
+                # keep a trailing 7F that may be the first half of the next header
+                keep = 1 if buf.endswith(HEADER[:1]) else 0
+                self.skipped += len(buf) - i - keep
+                i = len(buf) - keep
+                break
+            self.skipped += j - i
+            i = j
+            if len(buf) - i < HEADER_LEN:
+                break
+            length = (buf[i + 7] << 8) | buf[i + 8]
+            total = OVERHEAD + length
+            if length > MAX_PAYLOAD:
+                i += 1
+                self.skipped += 1
+                continue
+            if len(buf) - i < total:
+                break
+            frame = bytes(buf[i:i + total])
+            if frame[-2:] != TRAILER or not self._check_crc(frame[2:-4], frame[-4:-2]):
+                if frame[-2:] == TRAILER:
+                    self.crc_errors += 1
+                i += 1
+                self.skipped += 1
+                continue
+            out.append(self._record(frame, self.base + i))
+            i += total
+
+        del buf[:i]
+        self.base += i
+        k = bisect_right(self.marks, (self.base, float('inf'))) - 1
+        if k > 0:
+            del self.marks[:k]
+        return out
+
+    def _record(self, frame, offset):
+        device_id = frame[2]
+        payload = frame[HEADER_LEN:-4]
+        if device_id == self.master_id and len(payload) == 2:
+            kind = 'REQUEST'
+            function, target = payload[0], payload[1]
+            self.pending[target] = function
+        else:
+            kind = 'RESPONSE'
+            target = None
+            function = self.pending.pop(device_id, None)
+        stamp = int.from_bytes(frame[3:7], 'big')
+        self.frames += 1
+        self.index[(device_id, function)].append(offset)
+        return {
+            't': self._time_at(offset),
+            'offset': offset,
+            'type': kind,
+            'device_id': device_id,
+            'function': function,
+            'target': target,
+            'stamp': stamp,
+            'length': len(payload),
+            'payload': payload,
+        }
+
+def iter_capture_chunks(path, raw=False, chunk_size=65536):
+    """Yields (t, bytes) from a sniffer log (one chunk per line) or a raw binary capture."""
+    if raw:
+        try:
+            # serial_saver.py --raw capture (also .gz/.part segments), with the arrival time of every chunk
+            _, chunks = open_raw_capture(path)
+        except ValueError:
+            chunks = None  # plain binary dump
+        if chunks is not None:
+            yield from chunks
+            return
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield None, chunk
+    else:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            yield from iter_log_lines(f)
+
+def record_to_json(rec):
+    out = dict(rec)
+    out['payload'] = rec['payload'].hex().upper()
+    if rec['type'] == 'RESPONSE' and rec['stamp'] > 1_500_000_000:
+        out['stamp_utc'] = datetime.fromtimestamp(rec['stamp'], tz=timezone.utc).isoformat()
+    return json.dumps(out, ensure_ascii=False)
+
+def format_record(rec):
+    t = f"{rec['t']:.3f}" if rec['t'] is not None else "-"
+    fn = f"0x{rec['function']:02X}" if rec['function'] is not None else "--"
+    if rec['type'] == 'REQUEST':
+        return f"{t} 🔵 MESTRE 0x{rec['device_id']:02X} -> 0x{rec['target']:02X} função {fn} (seq {rec['stamp']})"
+    ascii_id = rec['payload'][:16].split(b'\x00')[0].decode('ascii', errors='replace')
+    return f"{t} 🟢 DISP. 0x{rec['device_id']:02X} função {fn} {rec['length']} bytes stamp={rec['stamp']} {ascii_id}"
+
+def main():
+    ap = argparse.ArgumentParser(description="Decodificador em fluxo do protocolo EMBOX 7F 7F.")
+    ap.add_argument('capture', help='Log do sniffer ou captura binária')
+    ap.add_argument('--raw', action='store_true', help='Arquivo é uma captura binária bruta')
+    ap.add_argument('--jsonl', action='store_true', help='Saída em JSON Lines (um registro por linha)')
+    ap.add_argument('--master', type=lambda s: int(s, 0), default=MASTER_ID, help='ID do mestre EMBOX (padrão 0x09)')
+    args = ap.parse_args()
+
+    if not Path(args.capture).exists():
+        print("Arquivo não encontrado:", args.capture)
+        sys.exit(1)
+
+    parser = EmboxStreamParser(master_id=args.master)
+    for t, chunk in iter_capture_chunks(args.capture, raw=args.raw):
+        for rec in parser.feed(chunk, t):
+            print(record_to_json(rec) if args.jsonl else format_record(rec))
+
+    summary = sys.stderr if args.jsonl else sys.stdout
+    print(f"\n{parser.frames} tramas, {parser.crc_errors} erros de CRC, {parser.skipped} bytes descartados, "
+          f"CRC {parser.crc_order or '?'}-endian", file=summary)
+    for (dev, fn), offsets in sorted(parser.index.items(), key=lambda kv: (kv[0][0], kv[0][1] if kv[0][1] is not None else -1)):
+        fn_txt = f"0x{fn:02X}" if fn is not None else "--"
+        print(f"  ID 0x{dev:02X} função {fn_txt}: {len(offsets)} tramas", file=summary)
+
+if __name__ == '__main__':
+    main()
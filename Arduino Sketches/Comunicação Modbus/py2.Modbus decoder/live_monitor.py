@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+live_monitor.py
+
+Live sniff-to-dashboard pipeline, replacing the serial_saver.py "save" -> paste into
+log_data -> run decoder round trip:
+
+  serial port -> RtuFrameScanner -> TransactionPairer -> RegisterDiff -> dashboard
+
+ - frames are parsed as bytes arrive; the partial frame is flushed only after the bus has
+   been idle for --idle-ms (monotonic clock), never less than t3.5 at the configured baud
+   rate. USB-RS485 adapters deliver bytes in bursts (16 ms latency timer on FTDI), so a
+   t3.5-sized pause inside a frame is normal there
+ - register values are named with the SIW400G map from anotacoes.txt (write block of the
+   master, read block of the slave); unknown registers are shown by address
+ - only the current value per (slave, address) and the last --history changes are kept,
+   so memory stays bounded no matter how long the monitor runs
+ - the terminal dashboard is redrawn at most every --refresh seconds; --http PORT also
+   serves it as an auto-refreshing page (and /state.json)
+
+Usage:
+  python live_monitor.py COM5 9600
+  python live_monitor.py /dev/ttyUSB0 9600 --slave 2 --http 8080
+  python live_monitor.py --replay sniffer_parallel_10percent.txt
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from modbus_timeline import RtuFrameScanner, TransactionPairer, iter_log_lines
+from register_diff import RegisterDiff, decode_signed_16bit
+
+# SIW400G block (anotacoes.txt): (name, signed)
+WRITE_MAP = {
+    0xC34F: ("Controle Pot. Ativa", True),
+    0xC350: ("Modo de Funcionamento", False),
+    0xC351: ("Fator de Potência", True),
+    0xC352: ("% Pot. Reativa", True),
+    0xC355: ("Potência Nominal", False),
+}
+READ_MAP = {
+    0xC34F: ("Status", False),
+    0xC350: ("Potência Ativa [kW]", True),
+    0xC351: ("Potência Reativa [kVAr]", True),
+    0xC352: ("Potência FV [kW]", True),
+    0xC353: ("Potência Aparente [kVA]", True),
+    0xC355: ("Potência do Inversor [kW]", False),
+    0xC356: ("Energia Acumulada (H) [kWh]", False),
+    0xC357: ("Energia Acumulada (L) [kWh]", False),
+}
+
+def char_time(baud):
+    """Duration of one RTU character (11 bits) in seconds."""
+    return 11.0 / baud
+
+IDLE_FLUSH_MS = 20.0   # idle time that ends a partial frame; above the USB adapter latency
+
+def frame_gap(baud):
+    """Modbus RTU inter-frame silence (t3.5); fixed at 1.75 ms above 19200 bps."""
+    return 3.5 * char_time(baud) if baud <= 19200 else 0.00175
+
+class LiveMonitor:
+    """Bytes in, current register state and recent changes out. Thread-safe snapshot()."""
+
+    def __init__(self, slave=None, history=200, window=2.0):
+        self.slave = slave
+        self.scanner = RtuFrameScanner()
+        self.pairer = TransactionPairer()
+        self.diff = RegisterDiff(window=window, report_initial=False)
+        self.recent = deque(maxlen=history)
+        self.counts = {}            # (slave, addr) -> number of changes
+        self.bytes_in = 0
+        self.lock = threading.Lock()
+
+    def feed(self, data, t):
+        with self.lock:
+            self.bytes_in += len(data)
+            self._process(self.scanner.feed(data, t))
+
+    def silence(self):
+        """Bus went quiet: whatever is still buffered cannot become a frame."""
+        with self.lock:
+            if self.scanner.buf:
+                self._process(self.scanner.flush())
+
+    def _process(self, frames):
+        for frame in frames:
+            for event in self.pairer.push(frame):
+                if self.slave is not None and event['slave_addr'] != self.slave:
+                    continue
+                for c in self.diff.update(event):
+                    key = (c['slave_addr'], c['address'])
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                    self.recent.append(c)
+
+    def snapshot(self):
+        """Current state per slave, suitable for rendering or JSON."""
+        with self.lock:
+            slaves = {}
+            for (slave, addr), (value, t) in sorted(self.diff.values.items()):
+                name, signed = READ_MAP.get(addr, ("", True))
+                slaves.setdefault(slave, {'read': [], 'write': []})['read'].append({
+                    'address': addr,
+                    'name': name,
+                    'raw': value,
+                    'value': decode_signed_16bit(value) if signed else value,
+                    't': t,
+                    'changes': self.counts.get((slave, addr), 0),
+                })
+            for (slave, start), values in sorted(self.diff.last_write.items()):
+                rows = slaves.setdefault(slave, {'read': [], 'write': []})['write']
+                for k, value in enumerate(values):
+                    name, signed = WRITE_MAP.get(start + k, ("", True))
+                    rows.append({
+                        'address': start + k,
+                        'name': name,
+                        'raw': value,
+                        'value': decode_signed_16bit(value) if signed else value,
+                    })
+            return {
+                'bytes': self.bytes_in,
+                'frames': self.scanner.frames,
+                'skipped': self.scanner.skipped,
+                'events': self.diff.events,
+                'changes': self.diff.changes,
+                'slaves': slaves,
+                'recent': [dict(c, writes=len(c['writes'])) for c in list(self.recent)[-20:]],
+            }
+
+def fmt_time(t, now):
+    if t is None or now is None:
+        return "-"
+    return f"{now - t:6.1f}s"
+
+def render_text(snap, now=None):
+    out = [f"Bytes: {snap['bytes']}  Tramas: {snap['frames']}  Descartados: {snap['skipped']}  "
+           f"Eventos: {snap['events']}  Mudanças: {snap['changes']}"]
+    for slave, tables in sorted(snap['slaves'].items()):
+        out.append(f"\n=== Escravo 0x{slave:02X} ===")
+        if tables['write']:
+            out.append("  Escrita (mestre):")
+            for r in tables['write']:
+                out.append(f"    0x{r['address']:04X} {r['name']:<28} 0x{r['raw']:04X} {r['value']:>7}")
+        if tables['read']:
+            out.append("  Leitura:                                               idade  mudanças")
+            for r in tables['read']:
+                out.append(f"    0x{r['address']:04X} {r['name']:<28} 0x{r['raw']:04X} {r['value']:>7}  "
+                           f"{fmt_time(r['t'], now):>8} {r['changes']:>6}")
+    if snap['recent']:
+        out.append("\n--- Últimas mudanças ---")
+        for c in snap['recent'][-10:]:
+            t = f"{c['t']:.3f}" if c['t'] is not None else "-"
+            old = "----" if c['old'] is None else f"0x{c['old']:04X}"
+            out.append(f"  {t} [0x{c['slave_addr']:02X}] 0x{c['address']:04X}: {old} -> 0x{c['new']:04X}"
+                       + (f" ({c['writes']} escrita(s) antes)" if c['writes'] else ""))
+    return "\n".join(out)
+
+def make_handler(monitor, refresh):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            snap = monitor.snapshot()
+            if self.path.startswith('/state.json'):
+                body = json.dumps(snap, default=str).encode('utf-8')
+                ctype = 'application/json'
+            else:
+                text = escape(render_text(snap, now=time.monotonic()))
+                body = (f"<html><head><meta charset='utf-8'>"
+                        f"<meta http-equiv='refresh' content='{max(refresh, 0.5)}'></head>"
+                        f"<body><pre>{text}</pre></body></html>").encode('utf-8')
+                ctype = 'text/html; charset=utf-8'
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+def start_http(monitor, port, refresh):
+    server = ThreadingHTTPServer(('', port), make_handler(monitor, refresh))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Painel web em http://localhost:{port}/")
+    return server
+
+def run_serial(monitor, port, baud, refresh, idle_ms=IDLE_FLUSH_MS):
+    try:
+        import serial
+    except ImportError:
+        print("Erro: biblioteca 'pyserial' não encontrada. Instale com: pip install pyserial")
+        sys.exit(1)
+
+    gap = frame_gap(baud)
+    idle = max(gap, idle_ms / 1000.0)
+    try:
+        ser = serial.Serial(port=port, baudrate=baud, timeout=max(gap, 0.002))
+    except serial.SerialException as e:
+        print(f"Não foi possível abrir a porta {port}: {e}")
+        sys.exit(1)
+
+    print(f"Monitorando {port} @ {baud} bps (t3.5 {gap * 1000:.2f} ms, fim de trama após "
+          f"{idle * 1000:.1f} ms sem bytes). Ctrl+C para sair.")
+    next_draw = 0.0
+    last_rx = time.monotonic()
+    try:
+        while True:
+            data = ser.read(ser.in_waiting or 1)
+            now = time.monotonic()
+            if data:
+                monitor.feed(data, now)
+                last_rx = now
+            elif now - last_rx >= idle:
+                monitor.silence()
+            if now >= next_draw:
+                sys.stdout.write("\x1b[H\x1b[2J" + render_text(monitor.snapshot(), now=now) + "\n")
+                sys.stdout.flush()
+                next_draw = now + refresh
+    except KeyboardInterrupt:
+        print("\nEncerrando...")
+    finally:
+        ser.close()
+
+def run_replay(monitor, path):
+    # one flush per line, as the sniffer splits frames by bus silence
+    last_t = None
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for t, data in iter_log_lines(f):
+            monitor.feed(data, t)
+            monitor.silence()
+            if t is not None:
+                last_t = t
+    # ages relative to the end of the capture
+    print(render_text(monitor.snapshot(), now=last_t))
+
+def main():
+    ap = argparse.ArgumentParser(description="Monitor Modbus RTU ao vivo: valores atuais dos registradores por escravo.")
+    ap.add_argument('port', nargs='?', help='Porta serial (ex: COM5 ou /dev/ttyUSB0)')
+    ap.add_argument('baud', nargs='?', type=int, default=9600, help='Baud rate (padrão 9600)')
+    ap.add_argument('--slave', type=lambda s: int(s, 0), default=None, help='Filtra por endereço de escravo')
+    ap.add_argument('--refresh', type=float, default=0.5, help='Intervalo de atualização do painel (s)')
+    ap.add_argument('--history', type=int, default=200, help='Mudanças recentes mantidas em memória')
+    ap.add_argument('--window', type=float, default=2.0, help='Janela (s) para correlacionar mudanças com escritas')
+    ap.add_argument('--idle-ms', type=float, default=IDLE_FLUSH_MS,
+                    help=f'Silêncio (ms) que encerra uma trama parcial; >= latência do adaptador USB (padrão {IDLE_FLUSH_MS:g})')
+    ap.add_argument('--http', type=int, default=None, metavar='PORTA', help='Serve o painel via HTTP nesta porta')
+    ap.add_argument('--replay', default=None, help='Reproduz um log do sniffer em vez de ler a serial')
+    args = ap.parse_args()
+
+    monitor = LiveMonitor(slave=args.slave, history=args.history, window=args.window)
+
+    if args.replay:
+        if not Path(args.replay).exists():
+            print("Arquivo não encontrado:", args.replay)
+            sys.exit(1)
+        run_replay(monitor, args.replay)
+        return
+
+    if not args.port:
+        ap.error("informe a porta serial ou --replay")
+    if args.http:
+        start_http(monitor, args.http, args.refresh)
+    run_serial(monitor, args.port, args.baud, args.refresh, args.idle_ms)
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,14 @@
 import struct
 import re
+from bisect import bisect_left
+
+try:
+    from crc_numpy import confirmed_windows
+except ImportError:  # numpy not installed: plain byte-by-byte scan
+    confirmed_windows = None
+
+# Captures at least this large are pre-filtered with the vectorised CRC (crc_numpy.py)
+PREFILTER_MIN_BYTES = 4096
 
 def crc16_modbus(data: bytes) -> int:
     """Calculates the Modbus RTU CRC-16 checksum."""
@@ -84,8 +93,27 @@ def find_modbus_frames(byte_stream: bytes) -> list:
     starting from a potential frame header.
     """
     frames = []
+    confirmed = candidates = None
+    if confirmed_windows is not None and len(byte_stream) >= PREFILTER_MIN_BYTES:
+        confirmed = confirmed_windows(byte_stream, slaves=[0x02], functions=[0x17])
+        candidates = sorted(confirmed)
+        k = 0
+
+    def crc_matches(start, length):
+        if confirmed is not None:
+            return length in confirmed.get(start, ())
+        frame = byte_stream[start : start + length]
+        return ((frame[-1] << 8) | frame[-2]) == crc16_modbus(frame[:-2])
+
     i = 0
     while i < len(byte_stream) - 4:
+        if candidates is not None:
+            # Jump straight to the next offset with a CRC-confirmed candidate frame
+            k = bisect_left(candidates, i, k)
+            if k == len(candidates):
+                break
+            i = candidates[k]
+
         # Look for potential frame start: Slave Address (02) and Function Code (17)
         if byte_stream[i] == 0x02 and byte_stream[i+1] == 0x17:
             
@@ -98,11 +126,7 @@ def find_modbus_frames(byte_stream: bytes) -> list:
                 
                 if i + expected_req_len <= len(byte_stream):
                     req_candidate = byte_stream[i : i + expected_req_len]
-                    data_for_crc = req_candidate[:-2]
-                    crc_received = (req_candidate[-1] << 8) | req_candidate[-2]
-                    crc_calculated = crc16_modbus(data_for_crc)
-
-                    if crc_received == crc_calculated:
+                    if crc_matches(i, len(req_candidate)):
                         parsed_data = parse_fc23_request(req_candidate)
                         if parsed_data:
                             frames.append({
@@ -122,11 +146,7 @@ def find_modbus_frames(byte_stream: bytes) -> list:
                 
                 if i + expected_res_len <= len(byte_stream):
                     res_candidate = byte_stream[i : i + expected_res_len]
-                    data_for_crc = res_candidate[:-2]
-                    crc_received = (res_candidate[-1] << 8) | res_candidate[-2]
-                    crc_calculated = crc16_modbus(data_for_crc)
-
-                    if crc_received == crc_calculated:
+                    if crc_matches(i, len(res_candidate)):
                         parsed_data = parse_fc23_response(res_candidate)
                         if parsed_data:
                             frames.append({
@@ -1,5 +1,19 @@
+import argparse
 import struct
-import re
+import sys
+from bisect import bisect_left
+from pathlib import Path
+
+from decoder_sinks import SINKS, format_report, write_records
+from modbus_timeline import RtuFrameScanner, iter_log_lines
+
+try:
+    from crc_numpy import confirmed_windows
+except ImportError:  # numpy not installed: plain byte-by-byte scan
+    confirmed_windows = None
+
+# Captures at least this large are pre-filtered with the vectorised CRC (crc_numpy.py)
+PREFILTER_MIN_BYTES = 4096
 
 def crc16_modbus(data: bytes) -> int:
     """Calculates the Modbus RTU CRC-16 checksum."""
@@ -92,15 +106,33 @@ def parse_fc23_response(frame_bytes: bytes):
         'type': 'RESPONSE'
     }
 
-def find_modbus_frames(byte_stream: bytes) -> list:
+def iter_modbus_frames(byte_stream: bytes):
     """
-    Scans the byte stream for valid Modbus RTU frames (FC 23) and returns them.
+    Scans the byte stream for valid Modbus RTU frames (FC 23) and yields them in order.
     This function handles the concatenation problem by checking all possible frame lengths
     starting from a potential frame header.
     """
-    frames = []
+    confirmed = candidates = None
+    if confirmed_windows is not None and len(byte_stream) >= PREFILTER_MIN_BYTES:
+        confirmed = confirmed_windows(byte_stream, slaves=[0x02], functions=[0x17])
+        candidates = sorted(confirmed)
+        k = 0
+
+    def crc_matches(start, length):
+        if confirmed is not None:
+            return length in confirmed.get(start, ())
+        frame = byte_stream[start : start + length]
+        return ((frame[-1] << 8) | frame[-2]) == crc16_modbus(frame[:-2])
+
     i = 0
     while i < len(byte_stream) - 4:
+        if candidates is not None:
+            # Jump straight to the next offset with a CRC-confirmed candidate frame
+            k = bisect_left(candidates, i, k)
+            if k == len(candidates):
+                break
+            i = candidates[k]
+
         # Look for potential frame start: Slave Address (02) and Function Code (17)
         if byte_stream[i] == 0x02 and byte_stream[i+1] == 0x17:
             
@@ -113,19 +145,15 @@ def find_modbus_frames(byte_stream: bytes) -> list:
                 
                 if i + expected_req_len <= len(byte_stream):
                     req_candidate = byte_stream[i : i + expected_req_len]
-                    data_for_crc = req_candidate[:-2]
-                    crc_received = (req_candidate[-1] << 8) | req_candidate[-2]
-                    crc_calculated = crc16_modbus(data_for_crc)
-
-                    if crc_received == crc_calculated:
+                    if crc_matches(i, len(req_candidate)):
                         parsed_data = parse_fc23_request(req_candidate)
                         if parsed_data:
-                            frames.append({
+                            yield {
                                 'start_idx': i,
                                 'end_idx': i + expected_req_len - 1,
                                 'bytes': req_candidate,
                                 'parsed_data': parsed_data
-                            })
+                            }
                             i += expected_req_len
                             continue
             
@@ -137,87 +165,97 @@ def find_modbus_frames(byte_stream: bytes) -> list:
                 
                 if i + expected_res_len <= len(byte_stream):
                     res_candidate = byte_stream[i : i + expected_res_len]
-                    data_for_crc = res_candidate[:-2]
-                    crc_received = (res_candidate[-1] << 8) | res_candidate[-2]
-                    crc_calculated = crc16_modbus(data_for_crc)
-
-                    if crc_received == crc_calculated:
+                    if crc_matches(i, len(res_candidate)):
                         parsed_data = parse_fc23_response(res_candidate)
                         if parsed_data:
-                            frames.append({
+                            yield {
                                 'start_idx': i,
                                 'end_idx': i + expected_res_len - 1,
                                 'bytes': res_candidate,
                                 'parsed_data': parsed_data
-                            })
+                            }
                             i += expected_res_len
                             continue
         
         i += 1 # Move to the next byte if no valid frame was found starting at 'i'
 
-    return frames
+def find_modbus_frames(byte_stream: bytes) -> list:
+    """Scans the byte stream for valid Modbus RTU frames (FC 23) and returns them as a list."""
+    return list(iter_modbus_frames(byte_stream))
 
-def decode_modbus_log(log_text: str):
-    """Main function to decode the Modbus log."""
-    
-    # 1. Clean and convert to byte stream
-    # Remove timestamp (e.g., "402.797 ") and "[RX]"
-    # Use regex to remove anything that is NOT a hex character or a space/newline
-    # Then remove all non-hex characters
-    cleaned_text = re.sub(r'[^0-9a-fA-F\s]', '', log_text)
-    hex_list = cleaned_text.split()
-    
-    # Convert list of hex strings to a single byte string
-    try:
-        byte_stream = bytes.fromhex(''.join(hex_list))
-    except ValueError as e:
-        return f"Erro ao converter para bytes: {e}. Verifique se todos os caracteres são hexadecimais válidos."
+def log_to_bytes(log_text: str) -> bytes:
+    """
+    Converts the log text to a byte stream: the data bytes of every line, without
+    timestamps and [RX]/[TX] tags (modbus_timeline.iter_log_lines).
+    """
+    return b"".join(data for _, data in iter_log_lines(log_text))
 
-    # 2. Find and parse frames
-    frames = find_modbus_frames(byte_stream)
+def _records(frames):
+    """Numbers (offset, bytes, parsed_data, t) frames and pairs each response with its request."""
+    last_request = {}
+    for idx, (offset, frame_bytes, parsed, t) in enumerate(frames, 1):
+        record = dict(parsed)
+        record['index'] = idx
+        record['offset'] = offset
+        record['bytes'] = frame_bytes
+        record['crc'] = (frame_bytes[-1] << 8) | frame_bytes[-2]  # already CRC-checked
+        if t is not None:
+            record['t'] = t
+        if record['type'] == 'REQUEST':
+            last_request[record['slave_addr']] = record
+        else:
+            req = last_request.pop(record['slave_addr'], None)
+            paired = req is not None and req['read_qty'] == len(record['registers'])
+            record['start_address'] = req['read_start'] if paired else None
+        yield record
 
-    if not frames:
-        return "Nenhuma trama Modbus (FC 23) válida encontrada com CRC correto."
+def iter_log_frames(lines):
+    """
+    Yields (offset, bytes, parsed_data, t) for the FC 23 frames of a sniffer log, line by
+    line (modbus_timeline.RtuFrameScanner, one flush per line as the sniffer splits frames
+    by bus silence). The offset counts data bytes only, as in log_to_bytes().
+    """
+    scanner = RtuFrameScanner()
+    base = 0
+    for t, data in iter_log_lines(lines):
+        pos = 0
+        for frame in scanner.feed(data, t) + scanner.flush():
+            if frame['function_code'] != 0x17:
+                continue
+            frame_bytes = frame['bytes']
+            parse = parse_fc23_request if frame['type'] == 'REQUEST' else parse_fc23_response
+            parsed = parse(frame_bytes)
+            if parsed is None:
+                continue
+            found = data.find(frame_bytes, pos)
+            if found >= 0:
+                pos = found + len(frame_bytes)
+            yield base + max(found, 0), frame_bytes, parsed, t
+        base += len(data)
 
-    output = ["\n--- Análise da Comunicação Modbus RTU (FC 23) ---\n"]
-    
-    for idx, frame in enumerate(frames, 1):
-        data = frame['parsed_data']
-        
-        output.append(f"### Trama #{idx} - {data['type']}")
-        output.append(f"  Bytes: {' '.join(f'{b:02X}' for b in frame['bytes'])}")
-        output.append(f"  CRC Válido: {crc16_modbus(frame['bytes'][:-2]):04X} (Recebido: {(frame['bytes'][-1] << 8) | frame['bytes'][-2]:04X})")
-        
-        if data['type'] == 'REQUEST':
-            output.append(f"  🔵 MESTRE -> ESCRAVO 0x{data['slave_addr']:02X}")
-            output.append(f"    Função: 0x{data['function_code']:02X} (Read/Write Multiple Registers)")
-            output.append(f"    Leitura: Endereço 0x{data['read_start']:04X} ({data['read_start']} decimal), Qtd. {data['read_qty']}")
-            output.append(f"    Escrita: Endereço 0x{data['write_start']:04X} ({data['write_start']} decimal), Qtd. {data['write_qty']}")
-            output.append(f"    Valores de Escrita ({len(data['write_values'])}):")
-            
-            for i, val in enumerate(data['write_values']):
-                hex_val = f"0x{val:04X}"
-                unsigned = val
-                signed = decode_signed_16bit(val)
-                float_16bit = decode_float_16bit(val)
-                output.append(f"      - {hex_val}: Unsigned={unsigned}, Signed={signed}, Float16bit={float_16bit:.2f}")
-        
-        elif data['type'] == 'RESPONSE':
-            output.append(f"  🟢 ESCRAVO 0x{data['slave_addr']:02X} -> MESTRE")
-            output.append(f"    Função: 0x{data['function_code']:02X} (Read/Write Multiple Registers)")
-            output.append(f"    Contagem de Bytes: {data['byte_count']}")
-            output.append(f"    Registros Lidos ({len(data['registers'])}):")
-            
-            for i, val in enumerate(data['registers']):
-                hex_val = f"0x{val:04X}"
-                unsigned = val
-                signed = decode_signed_16bit(val)
-                float_16bit = decode_float_16bit(val)
-                output.append(f"      - {hex_val}: Unsigned={unsigned}, Signed={signed}, Float16bit={float_16bit:.2f}")
-        
-        output.append("-" * 50)
-    
-    return "\n".join(output)
+def iter_log_records(lines):
+    """Same records as iter_frame_records, read line by line from a log (file object or text), plus 't'."""
+    return _records(iter_log_frames(lines))
+
+def iter_frame_records(byte_stream: bytes):
+    """
+    Yields one structured record per frame (plain values only, nothing formatted):
+      {'index', 'type', 'slave_addr', 'function_code', 'offset', 'bytes', 'crc',
+       'read_start', 'read_qty', 'write_start', 'write_qty', 'write_values'}  (REQUEST)
+      {'index', 'type', 'slave_addr', 'function_code', 'offset', 'bytes', 'crc',
+       'byte_count', 'start_address', 'registers'}                           (RESPONSE)
+    'start_address' of a response comes from the previous request of the same slave
+    (None when it cannot be paired).
+    """
+    frames = ((f['start_idx'], f['bytes'], f['parsed_data'], None) for f in iter_modbus_frames(byte_stream))
+    return _records(frames)
+
+def decode_modbus_log(log_text: str):
+    """Decodes a Modbus log into the text report as one string (main() streams it instead)."""
+    lines = list(format_report(iter_log_records(log_text)))
+    if not lines:
+        return "Nenhuma trama Modbus (FC 23) válida encontrada com CRC correto."
+    return "\n".join(["\n--- Análise da Comunicação Modbus RTU (FC 23) ---\n"] + lines)
 
 # Dados fornecidos pelo usuário para teste
 log_data = """
@@ -234,6 +272,30 @@ log_data = """
 403.300 [RX] 02 17 12 18 00 00 00 00 00 00 05 00 17 00 00 03 E8 00 3B 9B EE 74 A8 
 """
 
+def main():
+    ap = argparse.ArgumentParser(description="Decodificador Modbus RTU FC23 (valores com e sem sinal).")
+    ap.add_argument('log', nargs='?', help='Arquivo de log (padrão: log_data de exemplo)')
+    ap.add_argument('--format', choices=sorted(SINKS), default='text', help='Formato de saída')
+    ap.add_argument('--out', default=None, help='Arquivo de saída (padrão: terminal)')
+    args = ap.parse_args()
+
+    if args.log and not Path(args.log).exists():
+        print("Arquivo não encontrado:", args.log)
+        sys.exit(1)
+
+    # the log is read line by line and each record goes straight to the sink
+    src = open(args.log, 'r', encoding='utf-8', errors='ignore') if args.log else log_data
+    out = open(args.out, 'w', encoding='utf-8', newline='') if args.out else sys.stdout
+    try:
+        n = write_records(iter_log_records(src), SINKS[args.format](out))
+    finally:
+        if args.out:
+            out.close()
+        if args.log:
+            src.close()
+    if n == 0 and args.format == 'text' and args.out is None:
+        print("Nenhuma trama Modbus (FC 23) válida encontrada com CRC correto.")
+    print(f"{n} tramas.", file=sys.stderr)
+
 if __name__ == '__main__':
-    result = decode_modbus_log(log_data)
-    print(result)
+    main()
@@ -0,0 +1,312 @@
+"""
+modbus_timeline.py
+
+Generic Modbus RTU helpers shared by the batch analysis tools in this folder:
+ - table-driven CRC-16
+ - incremental frame scanner (FC01-06, FC15, FC16, FC23 and exceptions)
+ - parsing of the sniffer log lines ("402.797 [RX] 02 17 ...", "RX: 01 03 ...")
+ - request/response pairing into register read/write events
+ - per-block register timelines as NumPy arrays
+"""
+
+import os
+import re
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # only build_block_timelines needs numpy
+    np = None
+
+# RAWCAP reader shared with serial_saver.py (rawcap.py does not need pyserial)
+SERIAL_SAVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'py1.Serial saver')
+if SERIAL_SAVER_DIR not in sys.path:
+    sys.path.append(SERIAL_SAVER_DIR)
+from rawcap import open_raw_capture
+
+# --- CRC ---
+
+def _make_crc_table():
+    table = []
+    for n in range(256):
+        crc = n
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table.append(crc)
+    return table
+
+CRC16_TABLE = _make_crc_table()
+
+def crc16_modbus(data: bytes) -> int:
+    """Calculates the Modbus RTU CRC-16 checksum (table-driven)."""
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+def crc_ok(frame_bytes) -> bool:
+    """True when the last two bytes (Low, High) match the CRC of the rest."""
+    if len(frame_bytes) < 4:
+        return False
+    return crc16_modbus(frame_bytes[:-2]) == (frame_bytes[-1] << 8) | frame_bytes[-2]
+
+# --- Frame parsing ---
+
+MAX_RTU_FRAME = 256
+
+def candidate_lengths(buf, i=0):
+    """
+    Returns the possible frame lengths (and their direction) for a frame starting at buf[i].
+    A length of None means the header is not complete yet.
+    """
+    n = len(buf) - i
+    if n < 2:
+        return [(None, None)]
+    fc = buf[i + 1]
+    if fc & 0x80:
+        return [(5, 'EXCEPTION')]
+    if fc in (0x01, 0x02, 0x03, 0x04):
+        res_len = 5 + buf[i + 2] if n > 2 else None
+        return [(8, 'REQUEST'), (res_len, 'RESPONSE')]
+    if fc in (0x05, 0x06):
+        return [(8, 'REQUEST')]
+    if fc in (0x0F, 0x10):
+        req_len = 9 + buf[i + 6] if n > 6 else None
+        return [(8, 'RESPONSE'), (req_len, 'REQUEST')]
+    if fc == 0x17:
+        req_len = 13 + buf[i + 10] if n > 10 else None
+        res_len = 5 + buf[i + 2] if n > 2 else None
+        return [(res_len, 'RESPONSE'), (req_len, 'REQUEST')]
+    return []
+
+def _words(data):
+    return [(data[k] << 8) | data[k + 1] for k in range(0, len(data) - 1, 2)]
+
+def parse_frame(frame_bytes: bytes, frame_type: str):
+    """Decodes the PDU fields of a CRC-checked frame into a dict (None if inconsistent)."""
+    fc = frame_bytes[1]
+    frame = {
+        'slave_addr': frame_bytes[0],
+        'function_code': fc,
+        'type': frame_type,
+    }
+    if frame_type == 'EXCEPTION':
+        frame['exception_code'] = frame_bytes[2]
+        return frame
+
+    if fc in (0x01, 0x02, 0x03, 0x04):
+        if frame_type == 'REQUEST':
+            frame['start_address'] = (frame_bytes[2] << 8) | frame_bytes[3]
+            frame['num_registers'] = (frame_bytes[4] << 8) | frame_bytes[5]
+        else:
+            frame['byte_count'] = frame_bytes[2]
+            if fc in (0x03, 0x04):
+                if frame_bytes[2] % 2:
+                    return None
+                frame['registers'] = _words(frame_bytes[3:-2])
+    elif fc in (0x05, 0x06):
+        frame['start_address'] = (frame_bytes[2] << 8) | frame_bytes[3]
+        frame['write_values'] = [(frame_bytes[4] << 8) | frame_bytes[5]]
+    elif fc in (0x0F, 0x10):
+        frame['start_address'] = (frame_bytes[2] << 8) | frame_bytes[3]
+        frame['num_registers'] = (frame_bytes[4] << 8) | frame_bytes[5]
+        if frame_type == 'REQUEST':
+            frame['byte_count'] = frame_bytes[6]
+            if fc == 0x10:
+                if frame_bytes[6] != frame['num_registers'] * 2:
+                    return None
+                frame['write_values'] = _words(frame_bytes[7:-2])
+    elif fc == 0x17:
+        if frame_type == 'REQUEST':
+            frame['read_start'] = (frame_bytes[2] << 8) | frame_bytes[3]
+            frame['read_qty'] = (frame_bytes[4] << 8) | frame_bytes[5]
+            frame['write_start'] = (frame_bytes[6] << 8) | frame_bytes[7]
+            frame['write_qty'] = (frame_bytes[8] << 8) | frame_bytes[9]
+            frame['write_byte_count'] = frame_bytes[10]
+            if frame['write_byte_count'] != frame['write_qty'] * 2:
+                return None
+            frame['write_values'] = _words(frame_bytes[11:-2])
+        else:
+            frame['byte_count'] = frame_bytes[2]
+            if frame_bytes[2] % 2:
+                return None
+            frame['registers'] = _words(frame_bytes[3:-2])
+    return frame
+
+class RtuFrameScanner:
+    """
+    Incremental Modbus RTU frame scanner.
+    feed() accepts arbitrary chunks and returns the frames completed so far; bytes that
+    cannot start a valid frame are skipped one at a time (resynchronisation).
+    flush() abandons a pending partial frame, e.g. at the end of a log line or after an
+    inter-frame silence on a live bus.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.t = None
+        self.skipped = 0
+        self.frames = 0
+
+    def feed(self, data, t=None):
+        if t is not None:
+            self.t = t
+        self.buf += data
+        return self._scan(final=False)
+
+    def flush(self):
+        out = self._scan(final=True)
+        self.skipped += len(self.buf)
+        self.buf.clear()
+        return out
+
+    def _scan(self, final):
+        out = []
+        buf = self.buf
+        i = 0
+        while len(buf) - i >= 4:
+            wait = False
+            matched = None
+            for length, frame_type in candidate_lengths(buf, i):
+                if length is None or i + length > len(buf):
+                    wait = True
+                    continue
+                if crc_ok(buf[i:i + length]):
+                    matched = (length, frame_type)
+                    break
+            if matched:
+                length, frame_type = matched
+                frame_bytes = bytes(buf[i:i + length])
+                parsed = parse_frame(frame_bytes, frame_type)
+                if parsed is not None:
+                    parsed['t'] = self.t
+                    parsed['bytes'] = frame_bytes
+                    out.append(parsed)
+                    self.frames += 1
+                    i += length
+                    continue
+            if wait and not final and len(buf) - i < MAX_RTU_FRAME:
+                break
+            i += 1
+            self.skipped += 1
+        del buf[:i]
+        return out
+
+# --- Log parsing ---
+
+LOG_TIME_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s+')
+LOG_TAG_RE = re.compile(r'\[?\b[RT]X\b\]?:?')
+HEX_BYTE_RE = re.compile(r'\b[0-9A-Fa-f]{2}\b')
+
+def iter_log_lines(lines):
+    """Yields (timestamp or None, bytes) for every line of a sniffer/serial log that carries data."""
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    for line in lines:
+        t = None
+        m = LOG_TIME_RE.match(line)
+        if m and '[' in line:
+            t = float(m.group(1))
+            line = line[m.end():]
+        line = LOG_TAG_RE.sub(' ', line)
+        parts = HEX_BYTE_RE.findall(line)
+        if parts:
+            yield t, bytes(int(p, 16) for p in parts)
+
+def iter_rawcap_chunks(path):
+    """
+    Yields (t, bytes) for every chunk of a serial_saver.py --raw capture (.bin, .bin.gz or
+    .part), one record at a time. Raises ValueError if the file is not RAWCAP.
+    """
+    _, chunks = open_raw_capture(path)
+    yield from chunks
+
+def iter_log_frames(lines):
+    """Yields the parsed frames of a log, one scanner flush per line (the sniffer splits frames by bus silence)."""
+    scanner = RtuFrameScanner()
+    for t, data in iter_log_lines(lines):
+        yield from scanner.feed(data, t)
+        yield from scanner.flush()
+
+# --- Transactions ---
+
+class TransactionPairer:
+    """
+    Pairs requests and responses per slave, one frame at a time (live use); push() returns
+    the register events completed by that frame:
+      {'t', 'slave_addr', 'function_code', 'kind': 'read' | 'write', 'start_address', 'values'}
+    Reads come from FC03/FC04 and FC23 responses, writes from FC06/FC16/FC23 requests.
+    Only the last request of each slave is kept.
+    """
+
+    def __init__(self):
+        self.pending = {}
+
+    def push(self, frame):
+        pending = self.pending
+        slave = frame['slave_addr']
+        fc = frame['function_code']
+        ftype = frame['type']
+        if ftype == 'REQUEST':
+            if fc in (0x05, 0x06) and pending.get(slave, {}).get('bytes') == frame['bytes']:
+                # FC05/FC06 responses are an echo of the request
+                pending.pop(slave, None)
+                return []
+            pending[slave] = frame
+            if 'write_values' in frame:
+                return [{
+                    't': frame['t'],
+                    'slave_addr': slave,
+                    'function_code': fc,
+                    'kind': 'write',
+                    'start_address': frame.get('write_start', frame.get('start_address')),
+                    'values': frame['write_values'],
+                }]
+        elif ftype == 'RESPONSE' and 'registers' in frame:
+            req = pending.pop(slave, None)
+            if req is None or req['function_code'] != fc:
+                return []
+            start = req.get('read_start', req.get('start_address'))
+            qty = req.get('read_qty', req.get('num_registers'))
+            if qty != len(frame['registers']):
+                return []
+            return [{
+                't': frame['t'],
+                'slave_addr': slave,
+                'function_code': fc,
+                'kind': 'read',
+                'start_address': start,
+                'values': frame['registers'],
+            }]
+        else:
+            pending.pop(slave, None)
+        return []
+
+def iter_register_events(frames):
+    """Yields the register events of a frame sequence (see TransactionPairer)."""
+    pairer = TransactionPairer()
+    for frame in frames:
+        yield from pairer.push(frame)
+
+def build_block_timelines(events, slave=None):
+    """
+    Groups read events by (slave, start_address, quantity) and stacks them into arrays:
+      {(slave, start, qty): {'t': float64[n], 'regs': uint16[n, qty]}}
+    Events without a timestamp use their sample index as time.
+    """
+    grouped = {}
+    for idx, ev in enumerate(events):
+        if ev['kind'] != 'read' or (slave is not None and ev['slave_addr'] != slave):
+            continue
+        key = (ev['slave_addr'], ev['start_address'], len(ev['values']))
+        ts, rows = grouped.setdefault(key, ([], []))
+        ts.append(ev['t'] if ev['t'] is not None else float(idx))
+        rows.append(ev['values'])
+    return {
+        key: {'t': np.asarray(ts, dtype=np.float64), 'regs': np.asarray(rows, dtype=np.uint16)}
+        for key, (ts, rows) in grouped.items()
+    }
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+register_diff.py
+
+Change-detection stage for register dumps: keeps the last known value per (slave, address)
+and reports only the registers that changed (old/new/delta/time), instead of printing the
+full dump of every response like modbus_signed_decoder_v2.py.
+
+Each change is also correlated with the writes (FC06/FC16/FC23 requests carrying a new
+value) seen in the same capture within a time window, which is what the setpoint experiments
+(8.registradores_fantasmas, 10.writer_modbus_reserved) are looking for.
+
+RegisterDiff.update() works event by event, so it can run on the live decoder as well as on
+saved logs. Identical block responses (the common case when polling) are skipped with a
+single list comparison.
+
+Usage:
+  python register_diff.py sniffer_parallel_10percent.txt
+  python register_diff.py pfenable.txt --window 3 --summary
+"""
+
+import argparse
+import sys
+from collections import deque, Counter
+from pathlib import Path
+
+from modbus_timeline import iter_log_frames, iter_register_events
+
+def decode_signed_16bit(value: int) -> int:
+    """Converts a 16-bit unsigned integer to a signed integer using Two's Complement."""
+    if value & 0x8000:
+        return value - 0x10000
+    return value
+
+class RegisterDiff:
+    """
+    Tracks register values per (slave, address) and returns the changes of each read event.
+    Writes that change a value are remembered for `window` seconds and attached to the
+    changes that follow them. Without timestamps a write expires after `window_events`
+    register events; at most `max_writes` writes are kept either way.
+    """
+
+    def __init__(self, window=2.0, report_initial=False, max_writes=64, window_events=20):
+        self.window = window
+        self.window_events = window_events
+        self.report_initial = report_initial
+        self.values = {}        # (slave, addr) -> (value, t)
+        self.last_block = {}    # (slave, start, qty) -> values list
+        self.last_write = {}    # (slave, start) -> last written values
+        self.writes = deque(maxlen=max_writes)  # (event number, write) that changed a value
+        self.correlation = Counter()  # ((slave, write_addr), (slave, changed_addr)) -> count
+        self.events = 0
+        self.changes = 0
+
+    def _expire_writes(self, t):
+        while self.writes:
+            seq, w = self.writes[0]
+            if t is not None and w['t'] is not None:
+                expired = t - w['t'] > self.window
+            else:
+                expired = self.events - seq > self.window_events
+            if not expired:
+                break
+            self.writes.popleft()
+
+    def update(self, event):
+        """Processes one register event from modbus_timeline.iter_register_events; returns a list of changes."""
+        self.events += 1
+        t = event['t']
+        slave = event['slave_addr']
+        start = event['start_address']
+        values = event['values']
+        self._expire_writes(t)
+
+        if event['kind'] == 'write':
+            # masters usually repeat the same write every cycle; only a new value is an event
+            wkey = (slave, start)
+            if self.last_write.get(wkey) != values:
+                self.last_write[wkey] = values
+                self.writes.append((self.events, event))
+            return []
+
+        key = (slave, start, len(values))
+        if self.last_block.get(key) == values:
+            return []
+        self.last_block[key] = values
+
+        changes = []
+        state = self.values
+        for offset, new in enumerate(values):
+            addr = start + offset
+            prev = state.get((slave, addr))
+            state[(slave, addr)] = (new, t)
+            if prev is None:
+                if not self.report_initial:
+                    continue
+                old, t_old = None, None
+            else:
+                old, t_old = prev
+                if old == new:
+                    continue
+            change = {
+                't': t,
+                'slave_addr': slave,
+                'address': addr,
+                'old': old,
+                'new': new,
+                'delta': None if old is None else decode_signed_16bit(new) - decode_signed_16bit(old),
+                'since': None if t_old is None or t is None else t - t_old,
+                'writes': [],
+            }
+            for _, w in self.writes:
+                if w['slave_addr'] != slave:
+                    continue
+                lag = None if t is None or w['t'] is None else t - w['t']
+                change['writes'].append({
+                    'address': w['start_address'],
+                    'values': w['values'],
+                    'lag': lag,
+                })
+                self.correlation[((slave, w['start_address']), (slave, addr))] += 1
+            changes.append(change)
+        self.changes += len(changes)
+        return changes
+
+def format_change(c):
+    t = f"{c['t']:.3f}" if c['t'] is not None else "-"
+    old = "----" if c['old'] is None else f"0x{c['old']:04X}"
+    delta = "" if c['delta'] is None else f" Δ={c['delta']:+d}"
+    line = f"{t} [0x{c['slave_addr']:02X}] 0x{c['address']:04X}: {old} -> 0x{c['new']:04X} ({decode_signed_16bit(c['new'])}){delta}"
+    if c['writes']:
+        w = c['writes'][-1]
+        lag = f" +{w['lag']:.3f}s" if w['lag'] is not None else ""
+        line += f"  ⟵ escrita 0x{w['address']:04X}{lag}"
+    return line
+
+def main():
+    ap = argparse.ArgumentParser(description="Mostra apenas os registradores que mudaram entre respostas Modbus consecutivas.")
+    ap.add_argument('logs', nargs='+', help='Arquivos de log do sniffer')
+    ap.add_argument('--slave', type=lambda s: int(s, 0), default=None, help='Filtra por endereço de escravo')
+    ap.add_argument('--window', type=float, default=2.0, help='Janela (s) para correlacionar mudanças com escritas')
+    ap.add_argument('--window-events', type=int, default=20, help='Janela (em eventos) para logs sem timestamp')
+    ap.add_argument('--initial', action='store_true', help='Mostra também os valores iniciais de cada registrador')
+    ap.add_argument('--summary', action='store_true', help='Resumo escrita -> registradores que mudaram')
+    args = ap.parse_args()
+
+    lines = []
+    for name in args.logs:
+        p = Path(name)
+        if not p.exists():
+            print("Arquivo não encontrado:", name)
+            sys.exit(1)
+        lines.extend(p.read_text(encoding='utf-8', errors='ignore').splitlines())
+
+    diff = RegisterDiff(window=args.window, report_initial=args.initial, window_events=args.window_events)
+    for event in iter_register_events(iter_log_frames(lines)):
+        if args.slave is not None and event['slave_addr'] != args.slave:
+            continue
+        for change in diff.update(event):
+            print(format_change(change))
+
+    print(f"\n{diff.events} eventos, {diff.changes} mudanças.")
+    if args.summary and diff.correlation:
+        print("\n--- Escritas seguidas de mudanças ---")
+        for ((slave, waddr), (_, addr)), n in diff.correlation.most_common(20):
+            print(f"  [0x{slave:02X}] escrita 0x{waddr:04X} -> 0x{addr:04X} mudou {n}x")
+
+if __name__ == '__main__':
+    main()
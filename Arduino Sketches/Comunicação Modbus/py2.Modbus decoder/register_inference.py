@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+register_inference.py
+
+Batch version of interpretador.py: instead of interpreting one value at a time, takes the
+register timeline of a whole capture, evaluates every candidate encoding with NumPy over
+the full arrays and ranks the most plausible type for each register / register pair.
+
+Candidate encodings (same set as interpretador.py):
+  16 bits: uint16/int16 (BE/LE), float16 (BE/LE), Q8.8, Q4.12, Q1.15
+  32 bits: uint32/int32/float32 in ABCD, CDAB (word swap) and DCBA orders, Q16.16,
+           Q8.24, Q1.31
+
+Score (0..1) per candidate = finite * range * (smoothness, or smoothness + |correlation|
+with a reference series when --ref is given). Constant series are penalised since they
+carry no evidence about the type.
+
+Usage:
+  python register_inference.py sniffer_parallel_10percent.txt --top 3
+  python register_inference.py "dtsu riodas log.txt" --slave 1 --ref 1:0x1518:f32_abcd
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from modbus_timeline import iter_log_frames, iter_register_events, build_block_timelines
+
+# --- Candidate encodings ---
+
+def _u16(regs):
+    return regs.astype(np.uint16)
+
+def _swap16(regs):
+    return _u16(regs).byteswap()
+
+def _u32(hi, lo):
+    return (hi.astype(np.uint32) << 16) | lo.astype(np.uint32)
+
+ENCODINGS_16 = {
+    'uint16_be': lambda r: _u16(r).astype(np.float64),
+    'int16_be': lambda r: _u16(r).view(np.int16).astype(np.float64),
+    'uint16_le': lambda r: _swap16(r).astype(np.float64),
+    'int16_le': lambda r: _swap16(r).view(np.int16).astype(np.float64),
+    'f16_be': lambda r: _u16(r).view(np.float16).astype(np.float64),
+    'f16_le': lambda r: _swap16(r).view(np.float16).astype(np.float64),
+    'q8_8': lambda r: _u16(r) / 256.0,
+    'q4_12': lambda r: _u16(r) / 4096.0,
+    'q1_15': lambda r: _u16(r).view(np.int16) / 32768.0,
+}
+
+ENCODINGS_32 = {
+    'u32_abcd': lambda hi, lo: _u32(hi, lo).astype(np.float64),
+    'i32_abcd': lambda hi, lo: _u32(hi, lo).view(np.int32).astype(np.float64),
+    'f32_abcd': lambda hi, lo: _u32(hi, lo).view(np.float32).astype(np.float64),
+    'u32_cdab': lambda hi, lo: _u32(lo, hi).astype(np.float64),
+    'i32_cdab': lambda hi, lo: _u32(lo, hi).view(np.int32).astype(np.float64),
+    'f32_cdab': lambda hi, lo: _u32(lo, hi).view(np.float32).astype(np.float64),
+    'u32_dcba': lambda hi, lo: _u32(hi, lo).byteswap().astype(np.float64),
+    'i32_dcba': lambda hi, lo: _u32(hi, lo).byteswap().view(np.int32).astype(np.float64),
+    'f32_dcba': lambda hi, lo: _u32(hi, lo).byteswap().view(np.float32).astype(np.float64),
+    'q16_16': lambda hi, lo: _u32(hi, lo) / 65536.0,
+    'q8_24': lambda hi, lo: _u32(hi, lo) / 16777216.0,
+    'q1_31': lambda hi, lo: _u32(hi, lo).view(np.int32) / 2147483648.0,
+}
+
+def decode_series(regs, col, encoding):
+    """Decodes one column (or column pair for 32-bit encodings) of a uint16[n, qty] block."""
+    if encoding in ENCODINGS_16:
+        return ENCODINGS_16[encoding](regs[:, col])
+    return ENCODINGS_32[encoding](regs[:, col], regs[:, col + 1])
+
+# --- Scoring ---
+
+MIN_ABS = 1e-3
+MAX_ABS = 1e7
+
+def gini_mean_difference(xf):
+    """Mean |xi - xj| over all sample pairs of every column, NaN-aware, in O(n log n)."""
+    xs = np.sort(xf, axis=0)  # NaNs go to the end
+    m = np.isfinite(xs).sum(axis=0)
+    i = np.arange(1, len(xs) + 1)[:, None]
+    w = np.where(i <= m, 2 * i - m - 1, 0)
+    total = (w * np.nan_to_num(xs)).sum(axis=0)
+    return 2.0 * total / np.maximum(m * (m - 1), 1)
+
+def score_matrix(x, ref=None):
+    """
+    Scores every column of x (float64[n, k]) at once. Returns a dict of float64[k] arrays:
+    score, finite, range, smooth, corr, constant.
+    """
+    with np.errstate(invalid='ignore', over='ignore', divide='ignore'):
+        finite_mask = np.isfinite(x)
+        finite = finite_mask.mean(axis=0)
+        xf = np.where(finite_mask, x, np.nan)
+
+        ax = np.abs(xf)
+        in_range = (ax == 0) | ((ax >= MIN_ABS) & (ax <= MAX_ABS))
+        rng = np.where(finite_mask, in_range, False).sum(axis=0) / np.maximum(finite_mask.sum(axis=0), 1)
+
+        spread = np.nanmax(xf, axis=0) - np.nanmin(xf, axis=0)
+        constant = ~(spread > 0)
+        if len(x) > 1:
+            # mean step between consecutive samples vs. mean difference between any two
+            # samples (Gini mean difference): ~1 for noise, ~0 for a slowly varying quantity
+            step = np.nanmean(np.abs(np.diff(xf, axis=0)), axis=0)
+            smooth = np.where(constant, 0.0, np.clip(1.0 - step / gini_mean_difference(xf), 0.0, 1.0))
+            smooth = np.nan_to_num(smooth)
+        else:
+            smooth = np.zeros(x.shape[1])
+
+        corr = np.zeros(x.shape[1])
+        if ref is not None and len(x) > 2:
+            valid = np.all(finite_mask, axis=0) & ~constant & np.isfinite(ref).all()
+            if valid.any() and np.std(ref) > 0:
+                xv = x[:, valid]
+                xc = xv - xv.mean(axis=0)
+                rc = ref - ref.mean()
+                denom = np.sqrt((xc ** 2).sum(axis=0) * (rc ** 2).sum())
+                r = (xc * rc[:, None]).sum(axis=0) / denom
+                corr[valid] = np.nan_to_num(np.abs(r))
+
+        quality = 0.5 * smooth + 0.5 * corr if ref is not None else smooth
+        score = finite * rng * np.where(constant, 0.2, quality)
+    return {
+        'score': np.nan_to_num(score),
+        'finite': finite,
+        'range': rng,
+        'smooth': smooth,
+        'corr': corr,
+        'constant': constant,
+    }
+
+def rank_block(t, regs, ref_t=None, ref_v=None):
+    """
+    Evaluates all encodings for one block (t: float64[n], regs: uint16[n, qty]).
+    Returns a list of candidates sorted by score:
+      {'col', 'width', 'encoding', 'score', 'smooth', 'corr', 'constant', 'min', 'median', 'max'}
+    """
+    ref = None
+    if ref_t is not None and len(ref_t) > 1:
+        ref = np.interp(t, ref_t, ref_v)
+
+    qty = regs.shape[1]
+    results = []
+
+    def collect(encoding, width, cols, x):
+        s = score_matrix(x, ref)
+        xf = np.where(np.isfinite(x), x, np.nan)
+        lo, med, hi = np.nanmin(xf, axis=0), np.nanmedian(xf, axis=0), np.nanmax(xf, axis=0)
+        for k, col in enumerate(cols):
+            results.append({
+                'col': col,
+                'width': width,
+                'encoding': encoding,
+                'score': float(s['score'][k]),
+                'smooth': float(s['smooth'][k]),
+                'corr': float(s['corr'][k]),
+                'constant': bool(s['constant'][k]),
+                'min': float(lo[k]),
+                'median': float(med[k]),
+                'max': float(hi[k]),
+            })
+
+    with np.errstate(all='ignore'):
+        cols = list(range(qty))
+        for name, fn in ENCODINGS_16.items():
+            collect(name, 1, cols, fn(regs))
+        if qty > 1:
+            pair_cols = list(range(qty - 1))
+            hi, lo = regs[:, :-1], regs[:, 1:]
+            for name, fn in ENCODINGS_32.items():
+                collect(name, 2, pair_cols, fn(hi, lo))
+
+    results.sort(key=lambda c: c['score'], reverse=True)
+    return results
+
+def best_per_register(candidates, top=3):
+    """Groups ranked candidates by starting column keeping the `top` best of each."""
+    out = {}
+    for c in candidates:
+        lst = out.setdefault(c['col'], [])
+        if len(lst) < top:
+            lst.append(c)
+    return dict(sorted(out.items()))
+
+def parse_ref(spec):
+    """'SLAVE:ADDR:ENCODING' -> (slave, addr, encoding); addresses accept 0x prefix (argparse type)."""
+    parts = spec.split(':')
+    try:
+        if len(parts) != 3:
+            raise ValueError
+        slave, addr, enc = int(parts[0], 0), int(parts[1], 0), parts[2]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"referência inválida: {spec!r} (use SLAVE:ADDR:ENCODING)")
+    if enc not in ENCODINGS_16 and enc not in ENCODINGS_32:
+        raise argparse.ArgumentTypeError(f"codificação desconhecida: {enc!r}")
+    return slave, addr, enc
+
+def reference_series(timelines, slave, addr, encoding):
+    """Finds the block holding (slave, addr) and decodes it as the reference (t, values)."""
+    width = 1 if encoding in ENCODINGS_16 else 2
+    for (s, start, qty), block in timelines.items():
+        if s == slave and start <= addr and addr + width <= start + qty:
+            with np.errstate(all='ignore'):
+                v = decode_series(block['regs'], addr - start, encoding)
+            order = np.argsort(block['t'], kind='stable')
+            return block['t'][order], v[order]
+    return None, None
+
+def main():
+    ap = argparse.ArgumentParser(description="Inferência de tipos de registradores a partir de capturas Modbus RTU.")
+    ap.add_argument('logs', nargs='+', help='Arquivos de log do sniffer')
+    ap.add_argument('--slave', type=lambda s: int(s, 0), default=None, help='Filtra por endereço de escravo')
+    ap.add_argument('--ref', type=parse_ref, default=None, help='Série de referência SLAVE:ADDR:ENCODING (ex: 1:0x1518:f32_abcd)')
+    ap.add_argument('--top', type=int, default=3, help='Candidatos exibidos por registrador')
+    ap.add_argument('--min-samples', type=int, default=3, help='Ignora blocos com menos amostras')
+    args = ap.parse_args()
+
+    lines = []
+    for name in args.logs:
+        p = Path(name)
+        if not p.exists():
+            print("Arquivo não encontrado:", name)
+            sys.exit(1)
+        lines.extend(p.read_text(encoding='utf-8', errors='ignore').splitlines())
+
+    events = iter_register_events(iter_log_frames(lines))
+    timelines = build_block_timelines(events, slave=args.slave)
+    if not timelines:
+        print("Nenhuma leitura de registradores (FC03/FC04/FC23) encontrada.")
+        return
+
+    ref_t = ref_v = None
+    if args.ref:
+        ref_t, ref_v = reference_series(timelines, *args.ref)
+        if ref_t is None:
+            slave, addr, enc = args.ref
+            print(f"Referência {slave}:0x{addr:04X}:{enc} não encontrada na captura.")
+            return
+
+    for (slave, start, qty), block in sorted(timelines.items()):
+        n = len(block['t'])
+        if n < args.min_samples:
+            continue
+        print(f"\n=== Escravo 0x{slave:02X} | bloco 0x{start:04X} x{qty} | {n} amostras ===")
+        ranked = best_per_register(rank_block(block['t'], block['regs'], ref_t, ref_v), top=args.top)
+        for col, cands in ranked.items():
+            addr = start + col
+            desc = "  ".join(
+                f"{c['encoding']}={c['score']:.2f}{' (const)' if c['constant'] else ''}"
+                for c in cands
+            )
+            best = cands[0]
+            print(f"  0x{addr:04X}: {desc}")
+            print(f"          min={best['min']:.4g} med={best['median']:.4g} max={best['max']:.4g}"
+                  + (f" corr={best['corr']:.2f}" if ref_t is not None else ""))
+
+if __name__ == '__main__':
+    main()
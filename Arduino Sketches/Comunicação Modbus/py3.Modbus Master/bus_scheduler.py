@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+bus_scheduler.py
+
+Escalonador do barramento RS485 (half-duplex) para vários escravos numa só porta:
+uma fileira de inversores SIW400G mais o medidor DTSU666.
+
+ - tempo de cada transação modelado pelo baud rate e pelo tamanho das tramas:
+   requisição + tempo de resposta do escravo + resposta + silêncio t3.5 entre tramas
+ - jobs periódicos (leituras) e jobs únicos (comandos), cada um com prioridade e prazo
+ - a cada passo executa, entre os jobs liberados, o de maior prioridade (menor número) e,
+   no empate, o de prazo mais próximo (EDF); sem job liberado, dorme só até a próxima
+   liberação, então as transações ficam encostadas umas nas outras
+ - relatório: utilização do barramento (medida e modelada), prazos perdidos, período
+   real de cada leitura e o quanto os períodos ainda podem ser reduzidos
+
+--simulate roda sobre um relógio virtual com os tempos do modelo (sem porta serial),
+para dimensionar a taxa de atualização antes de ir a campo.
+
+Uso:
+  python bus_scheduler.py --simulate --inverters 2,3,4,5 --meter 1 --duration 60
+  python bus_scheduler.py /dev/ttyUSB0 --baud 9600 --inverters 2,3 --meter 1 --inv-period 500
+  python bus_scheduler.py COM3 --poll 1:3:0x2000:52:1000 --poll 2:3:0xC34F:9:250:0
+"""
+
+import argparse
+import sys
+import time
+
+from modbus_master import (ModbusError, RtuMaster, build_read_request, char_time,
+                           expected_response_length, frame_gap, READ_QTY, REG_PA)
+
+TURNAROUND = 0.010       # s entre o fim da requisição e o início da resposta (estimativa)
+PRIO_COMMAND = 0         # comandos passam na frente das leituras
+PRIO_POLL = 1
+
+# Leituras padrão: bloco de status/medidas do SIW400G e bloco de medidas do DTSU666
+INVERTER_POLL = (0x03, REG_PA, READ_QTY)
+METER_POLL = (0x03, 0x2000, 0x34)
+
+def transaction_time(request_len: int, response_len: int, baud: int, turnaround: float = TURNAROUND) -> float:
+    """Tempo de barramento de uma transação: tramas no fio, resposta do escravo e os dois silêncios t3.5."""
+    return (request_len + response_len) * char_time(baud) + turnaround + 2 * frame_gap(baud)
+
+class Job:
+    """Uma transação agendada. period=None: comando único."""
+
+    def __init__(self, name, request, period=None, priority=PRIO_POLL, deadline=None,
+                 release=0.0, on_result=None):
+        self.name = name
+        self.request = request
+        self.period = period
+        self.priority = priority
+        self.deadline = deadline if deadline is not None else (period if period else 1.0)
+        self.release = release
+        self.on_result = on_result
+        self.wire = None            # tempo modelado, preenchido pelo escalonador
+        self.runs = 0
+        self.errors = 0
+        self.misses = 0
+        self.skipped = 0            # liberações perdidas por atraso maior que um período
+        self.max_late = 0.0
+        self.first_done = None
+        self.last_done = None
+
+    def key(self):
+        return (self.priority, self.release + self.deadline)
+
+class BusScheduler:
+    """
+    execute(request) faz a transação e devolve a resposta (ou levanta ModbusError);
+    clock()/sleep() permitem trocar o tempo real por um relógio virtual.
+    """
+
+    def __init__(self, baud, execute, clock=time.monotonic, sleep=time.sleep, turnaround=TURNAROUND):
+        self.baud = baud
+        self.execute = execute
+        self.clock = clock
+        self.sleep = sleep
+        self.turnaround = turnaround
+        self.jobs = []
+        self.t0 = None
+        self.busy = 0.0             # tempo medido dentro de execute()
+        self.modeled = 0.0          # soma dos tempos modelados executados
+        self.commands = Job("comandos", b"", priority=PRIO_COMMAND)  # totais dos comandos já feitos
+        self.commands.wire = 0.0
+
+    def _model(self, job):
+        try:
+            response_len = expected_response_length(job.request)
+        except ValueError:
+            response_len = 8
+        job.wire = transaction_time(len(job.request), response_len, self.baud, self.turnaround)
+
+    def add_poll(self, name, request, period, priority=PRIO_POLL, deadline=None, phase=0.0, on_result=None):
+        now = self.clock()
+        job = Job(name, request, period, priority, deadline, release=now + phase, on_result=on_result)
+        self._model(job)
+        self.jobs.append(job)
+        return job
+
+    def submit(self, name, request, priority=PRIO_COMMAND, deadline=0.5, on_result=None):
+        """Comando único, liberado agora."""
+        job = Job(name, request, None, priority, deadline, release=self.clock(), on_result=on_result)
+        self._model(job)
+        self.jobs.append(job)
+        return job
+
+    def demand(self):
+        """Fração do barramento pedida pelos jobs periódicos (soma de tempo/período)."""
+        return sum(j.wire / j.period for j in self.jobs if j.period)
+
+    def step(self):
+        """Executa um job liberado, ou dorme até a próxima liberação. Retorna o job executado."""
+        now = self.clock()
+        if self.t0 is None:
+            self.t0 = now
+        ready = [j for j in self.jobs if j.release <= now and (j.period or j.runs == 0)]
+        if not ready:
+            pending = [j.release for j in self.jobs if j.period or j.runs == 0]
+            if pending:
+                self.sleep(max(0.0, min(pending) - now))
+            return None
+        job = min(ready, key=Job.key)
+
+        start = self.clock()
+        try:
+            result = self.execute(job.request)
+        except ModbusError as e:
+            result = e
+            job.errors += 1
+        done = self.clock()
+        self.busy += done - start
+        self.modeled += job.wire
+        job.runs += 1
+        job.first_done = job.first_done if job.first_done is not None else done
+        job.last_done = done
+        late = done - (job.release + job.deadline)
+        if late > 0:
+            job.misses += 1
+            job.max_late = max(job.max_late, late)
+        if job.on_result:
+            job.on_result(job, result)
+
+        if job.period:
+            job.release += job.period
+            if job.release + job.period <= done:
+                # atrasou mais de um período: pula liberações em vez de acumular fila
+                behind = int((done - job.release) // job.period)
+                job.skipped += behind
+                job.release += behind * job.period
+        else:
+            self.jobs.remove(job)
+            c = self.commands
+            c.runs += 1
+            c.errors += job.errors
+            c.misses += job.misses
+            c.max_late = max(c.max_late, job.max_late)
+            c.wire += (job.wire - c.wire) / c.runs      # média
+        return job
+
+    def run(self, duration):
+        end = self.clock() + duration
+        while self.clock() < end:
+            self.step()
+
+    def report(self):
+        elapsed = max(self.clock() - self.t0, 1e-9) if self.t0 is not None else 1e-9
+        lines = [f"Tempo: {elapsed:.1f} s | utilização medida {100 * self.busy / elapsed:.1f}% "
+                 f"(modelo {100 * self.modeled / elapsed:.1f}%) | demanda dos periódicos "
+                 f"{100 * self.demand():.1f}%"]
+        lines.append(f"{'job':<22} {'prio':>4} {'período':>8} {'real':>8} {'fio ms':>7} "
+                     f"{'exec':>6} {'erros':>5} {'prazo':>6} {'pulos':>5} {'atraso máx':>10}")
+        rows = sorted(self.jobs, key=lambda j: (j.priority, j.name))
+        if self.commands.runs:
+            rows.insert(0, self.commands)
+        for j in rows:
+            real = "-"
+            if j.period and j.runs > 1:
+                real = f"{(j.last_done - j.first_done) / (j.runs - 1) * 1000:.0f}ms"
+            period = f"{j.period * 1000:.0f}ms" if j.period else "único"
+            lines.append(f"{j.name:<22} {j.priority:>4} {period:>8} {real:>8} {j.wire * 1000:7.1f} "
+                         f"{j.runs:>6} {j.errors:>5} {j.misses:>6} {j.skipped:>5} {j.max_late * 1000:8.1f}ms")
+        demand = self.demand()
+        if demand > 0:
+            if demand > 1:
+                lines.append(f"Barramento sobrecarregado: os períodos precisam crescer {demand:.2f}x")
+            else:
+                lines.append(f"Todos os períodos podem ser reduzidos até {1 / demand:.2f}x (100% do barramento)")
+        return "\n".join(lines)
+
+class SimulatedBus:
+    """Relógio virtual: cada transação consome o tempo do modelo, sem porta serial."""
+
+    def __init__(self, baud, turnaround=TURNAROUND):
+        self.baud = baud
+        self.turnaround = turnaround
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, dt):
+        self.now += dt
+
+    def execute(self, request):
+        self.now += transaction_time(len(request), expected_response_length(request), self.baud, self.turnaround)
+        return b""
+
+def parse_poll(spec):
+    """'SLAVE:FC:START:QTY:PERIOD_MS[:PRIO]' -> (slave, fc, start, qty, period_s, prio)."""
+    parts = spec.split(":")
+    if len(parts) not in (5, 6):
+        raise argparse.ArgumentTypeError(f"--poll inválido: {spec}")
+    slave, fc, start, qty = (int(x, 0) for x in parts[:4])
+    period = float(parts[4]) / 1000.0
+    prio = int(parts[5]) if len(parts) == 6 else PRIO_POLL
+    return slave, fc, start, qty, period, prio
+
+def main():
+    ap = argparse.ArgumentParser(description="Escalonador de leituras/comandos Modbus RTU para vários escravos numa porta.")
+    ap.add_argument('port', nargs='?', help='Porta serial (ex: COM3 ou /dev/ttyUSB0)')
+    ap.add_argument('--baud', type=int, default=9600)
+    ap.add_argument('--simulate', action='store_true', help='Relógio virtual com os tempos do modelo, sem porta')
+    ap.add_argument('--inverters', default='', help='Endereços dos inversores SIW400G (ex: 2,3,4)')
+    ap.add_argument('--inv-period', type=float, default=1000, help='Período de leitura dos inversores (ms)')
+    ap.add_argument('--meter', type=lambda s: int(s, 0), default=None, help='Endereço do medidor DTSU666')
+    ap.add_argument('--meter-period', type=float, default=1000, help='Período de leitura do medidor (ms)')
+    ap.add_argument('--poll', type=parse_poll, action='append', default=[],
+                    help='Leitura extra SLAVE:FC:START:QTY:PERIOD_MS[:PRIO] (ex: 1:3:0x2044:2:200)')
+    ap.add_argument('--turnaround', type=float, default=TURNAROUND * 1000, help='Tempo de resposta do escravo (ms)')
+    ap.add_argument('--duration', type=float, default=30.0, help='Duração (s)')
+    args = ap.parse_args()
+
+    turnaround = args.turnaround / 1000.0
+    polls = []
+    inverters = [int(x, 0) for x in args.inverters.split(',') if x.strip()]
+    for slave in inverters:
+        fc, start, qty = INVERTER_POLL
+        polls.append((f"inversor 0x{slave:02X}", build_read_request(slave, start, qty, fc), args.inv_period / 1000.0, PRIO_POLL))
+    if args.meter is not None:
+        fc, start, qty = METER_POLL
+        polls.append((f"medidor 0x{args.meter:02X}", build_read_request(args.meter, start, qty, fc), args.meter_period / 1000.0, PRIO_POLL))
+    for slave, fc, start, qty, period, prio in args.poll:
+        polls.append((f"0x{slave:02X} FC{fc:02d} 0x{start:04X}+{qty}", build_read_request(slave, start, qty, fc), period, prio))
+    if not polls:
+        ap.error("nenhuma leitura configurada (use --inverters, --meter ou --poll)")
+
+    ser = None
+    if args.simulate:
+        bus = SimulatedBus(args.baud, turnaround)
+        sched = BusScheduler(args.baud, bus.execute, clock=bus.clock, sleep=bus.sleep, turnaround=turnaround)
+    else:
+        if not args.port:
+            ap.error("informe a porta serial ou --simulate")
+        import serial
+        try:
+            ser = serial.Serial(args.port, args.baud)
+        except serial.SerialException as e:
+            print(f"Erro ao abrir a porta serial {args.port}: {e}")
+            sys.exit(1)
+        master = RtuMaster(ser, baud=args.baud, retries=0)
+        sched = BusScheduler(args.baud, master.transact, turnaround=turnaround)
+
+    # fases espalhadas dentro do período para não liberar tudo no mesmo instante
+    for k, (name, request, period, prio) in enumerate(polls):
+        sched.add_poll(name, request, period, priority=prio, phase=period * k / len(polls))
+
+    print(f"{len(polls)} leituras @ {args.baud} bps, demanda {100 * sched.demand():.1f}% do barramento"
+          + (" (simulado)" if args.simulate else ""))
+    try:
+        sched.run(args.duration)
+    except KeyboardInterrupt:
+        print("\nEncerrando...")
+    finally:
+        if ser:
+            ser.close()
+    print(sched.report())
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
 import serial
+import json
+import os
 import struct
 import time
 import sys
@@ -15,6 +17,16 @@ REG_MODE = 0xC350  # Modo de Reativa (0x0055, 0x00A1, 0x00A2)
 REG_FP = 0xC351    # Fator de Potência (Signed, Escala 1000)
 REG_PA = 0xC34F    # Controle de Potência Ativa (Signed)
 
+# Bloco de parâmetros escrito pelo mestre a cada FC 23 (C34F a C358) e bloco lido de volta.
+# Atenção: a parte de leitura da FC 23 (C34F a C357) NÃO devolve os parâmetros, e sim o
+# status e as medidas do inversor (Status, Potência Ativa, ... ver anotacoes.txt).
+BLOCK_START = REG_PA
+BLOCK_QTY = 10
+READ_QTY = 9
+# Trama padrão do mestre original (valores de escrita C34F..C358)
+DEFAULT_BLOCK = [0x0000, 0x0055, 0x03E8, 0x0000, 0x0055, 0x00CF, 0x03E8, 0x0055, 0x001E, 0x0000]
+BLOCK_CACHE = 'siw400g_block.json'  # última imagem confirmada pelo inversor
+
 # --- FUNÇÕES DE UTILIDADE ---
 
 def crc16_modbus(data: bytes) -> bytes:
@@ -39,8 +51,8 @@ def build_fc23_request(slave_addr: int, read_start: int, read_qty: int, write_st
     write_qty = len(write_values)
     write_byte_count = write_qty * 2
     
-    # Formato: >BHHHBH (Big-Endian)
-    header = struct.pack('>B B H H H B', 
+    # Formato: >BBHHHH (Big-Endian; quantidade de escrita em 2 bytes, como nas tramas capturadas)
+    header = struct.pack('>B B H H H H', 
                          slave_addr, 
                          0x17, 
                          read_start, 
@@ -65,90 +77,327 @@ def build_fc23_request(slave_addr: int, read_start: int, read_qty: int, write_st
     
     return adu + crc
 
+def build_read_request(slave_addr: int, start: int, qty: int, function_code: int = 0x03) -> bytes:
+    """Trama RTU de leitura (FC 03 holding / FC 04 input registers)."""
+    adu = struct.pack('>B B H H', slave_addr, function_code, start, qty)
+    return adu + crc16_modbus(adu)
+
+def build_fc16_request(slave_addr: int, start: int, values: list) -> bytes:
+    """Trama RTU FC 16 (Write Multiple Registers)."""
+    adu = struct.pack('>B B H H B', slave_addr, 0x10, start, len(values), 2 * len(values))
+    adu += b''.join(struct.pack('>H', v & 0xFFFF) for v in values)
+    return adu + crc16_modbus(adu)
+
 def to_signed_16bit(value: int) -> int:
     """Converte um valor decimal para o formato de 16 bits com sinal (Two's Complement)."""
     if value < 0:
         return 0x10000 + value
     return value
 
+# --- MOTOR DE TRANSAÇÕES RTU ---
+# Em vez de esperar um tempo fixo e ler o que chegou, cada transação lê exatamente o
+# tamanho de resposta esperado (ou até o barramento ficar em silêncio), valida endereço,
+# função e CRC, trata respostas de exceção e repete com espera crescente.
+
+RESPONSE_TIMEOUT = 0.5   # s até o primeiro byte da resposta
+MAX_RETRIES = 2          # novas tentativas após a primeira
+RETRY_BACKOFF = 0.05     # s antes da 1ª nova tentativa; dobra a cada tentativa
+IDLE_MIN = 0.02          # s de silêncio mínimo que encerra a resposta (latência do adaptador USB-RS485)
+
+EXCEPTION_CODES = {
+    0x01: "Função ilegal",
+    0x02: "Endereço de dados ilegal",
+    0x03: "Valor de dados ilegal",
+    0x04: "Falha no dispositivo escravo",
+    0x05: "Reconhecido (processamento longo)",
+    0x06: "Dispositivo escravo ocupado",
+    0x08: "Erro de paridade de memória",
+    0x0A: "Gateway: caminho indisponível",
+    0x0B: "Gateway: dispositivo não respondeu",
+}
+RETRY_EXCEPTIONS = {0x05, 0x06}  # exceções transitórias: vale repetir
+
+class ModbusError(Exception):
+    """Falha de uma transação Modbus (após todas as tentativas)."""
+
+class ModbusTimeout(ModbusError):
+    pass
+
+class ModbusFrameError(ModbusError):
+    """Resposta truncada, com CRC inválido ou que não corresponde à requisição."""
+
+class ModbusExceptionResponse(ModbusError):
+    def __init__(self, function_code, code):
+        self.function_code = function_code
+        self.code = code
+        super().__init__(f"Exceção 0x{code:02X} na função 0x{function_code:02X}: "
+                         f"{EXCEPTION_CODES.get(code, 'desconhecida')}")
+
+def char_time(baud: int) -> float:
+    """Duração de um caractere RTU (11 bits) em segundos."""
+    return 11.0 / baud
+
+def frame_gap(baud: int) -> float:
+    """Silêncio entre tramas (t3.5); fixo em 1,75 ms acima de 19200 bps."""
+    return 3.5 * char_time(baud) if baud <= 19200 else 0.00175
+
+def expected_response_length(request: bytes) -> int:
+    """Tamanho da resposta normal (com CRC) para uma requisição RTU."""
+    fc = request[1]
+    if fc in (0x01, 0x02):
+        qty = struct.unpack('>H', request[4:6])[0]
+        return 5 + (qty + 7) // 8
+    if fc in (0x03, 0x04):
+        qty = struct.unpack('>H', request[4:6])[0]
+        return 5 + 2 * qty
+    if fc in (0x05, 0x06, 0x0F, 0x10):
+        return 8
+    if fc == 0x17:
+        read_qty = struct.unpack('>H', request[4:6])[0]
+        return 5 + 2 * read_qty
+    raise ValueError(f"Função 0x{fc:02X} não suportada")
+
+class RtuMaster:
+    """
+    Mestre Modbus RTU sobre uma serial já aberta.
+    transact() devolve a resposta validada e guarda o tempo de ida e volta (RTT) em
+    last_rtt; stats() resume todas as transações.
+    """
+
+    def __init__(self, ser, baud: int = BAUD_RATE, timeout: float = RESPONSE_TIMEOUT,
+                 retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF):
+        self.ser = ser
+        self.timeout = timeout
+        self.gap = frame_gap(baud)                  # t3.5: modelo de enquadramento
+        self.idle = max(self.gap, IDLE_MIN)         # silêncio que encerra a leitura da resposta
+        self.retries = retries
+        self.backoff = backoff
+        self.last_rtt = None
+        self.rtts = []
+        self.transactions = 0
+        self.retried = 0
+        self.failures = 0
+
+    def _read_response(self, request: bytes, expected: int) -> bytes:
+        # primeiro byte: espera até o timeout de resposta
+        self.ser.timeout = self.timeout
+        buf = bytearray(self.ser.read(1))
+        if not buf:
+            raise ModbusTimeout("Nenhuma resposta do escravo")
+        # demais bytes: cada leitura espera no máximo self.idle. O t3.5 sozinho não serve de
+        # prazo: o adaptador USB entrega os bytes em rajadas (latência de ~16 ms)
+        self.ser.timeout = self.idle
+        while len(buf) < expected:
+            chunk = self.ser.read(expected - len(buf))
+            if not chunk:
+                break
+            buf += chunk
+            if len(buf) >= 2 and buf[1] == request[1] | 0x80:
+                expected = 5    # resposta de exceção: addr, fc|0x80, código, CRC
+        return bytes(buf)
+
+    def _validate(self, request: bytes, response: bytes, expected: int) -> bytes:
+        if len(response) >= 5 and response[1] == request[1] | 0x80:
+            response = response[:5]
+        elif len(response) < expected:
+            raise ModbusFrameError(f"Resposta truncada: {len(response)} de {expected} bytes ({response.hex().upper()})")
+        if crc16_modbus(response[:-2]) != response[-2:]:
+            raise ModbusFrameError(f"CRC inválido: {response.hex().upper()}")
+        if response[0] != request[0]:
+            raise ModbusFrameError(f"Resposta do escravo 0x{response[0]:02X}, esperado 0x{request[0]:02X}")
+        if response[1] == request[1] | 0x80:
+            raise ModbusExceptionResponse(request[1], response[2])
+        if response[1] != request[1]:
+            raise ModbusFrameError(f"Função 0x{response[1]:02X} na resposta, esperado 0x{request[1]:02X}")
+        return response
+
+    def transact(self, request: bytes) -> bytes:
+        """Envia a requisição e devolve a resposta validada. Levanta ModbusError após as tentativas."""
+        expected = expected_response_length(request)
+        self.transactions += 1
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                time.sleep(delay)
+                delay *= 2
+            self.ser.reset_input_buffer()   # descarta restos de uma resposta atrasada
+            t0 = time.perf_counter()
+            self.ser.write(request)
+            try:
+                response = self._validate(request, self._read_response(request, expected), expected)
+            except ModbusExceptionResponse as e:
+                if e.code in RETRY_EXCEPTIONS and attempt < self.retries:
+                    continue
+                self.failures += 1
+                raise
+            except ModbusError:
+                if attempt < self.retries:
+                    continue
+                self.failures += 1
+                raise
+            self.last_rtt = time.perf_counter() - t0
+            self.rtts.append(self.last_rtt)
+            return response
+
+    def read_write_registers(self, slave_addr: int, read_start: int, read_qty: int,
+                             write_start: int, write_values: list) -> list:
+        """FC23: escreve write_values e devolve os read_qty registradores lidos."""
+        response = self.transact(build_fc23_request(slave_addr, read_start, read_qty, write_start, write_values))
+        return list(struct.unpack(f'>{read_qty}H', response[3:3 + 2 * read_qty]))
+
+    def write_registers(self, slave_addr: int, start: int, values: list):
+        """FC16: escreve registradores consecutivos a partir de start."""
+        self.transact(build_fc16_request(slave_addr, start, values))
+
+    def stats(self) -> str:
+        line = (f"{self.transactions} transações, {self.retried} novas tentativas, "
+                f"{self.failures} falhas")
+        if self.rtts:
+            ms = sorted(x * 1000 for x in self.rtts)
+            line += f" | RTT ms: mín {ms[0]:.1f}  média {sum(ms) / len(ms):.1f}  máx {ms[-1]:.1f}"
+        return line
+
+# --- CACHE DO BLOCO DE PARÂMETROS ---
+
+class ParameterBlock:
+    """
+    Imagem dos registradores de escrita C34F..C358 de um inversor.
+    Cada comando altera só os registradores pedidos sobre a imagem; se o resultado for
+    igual à imagem atual, a escrita é omitida (nenhum tráfego no barramento). A imagem só
+    é atualizada depois que o inversor confirma a FC 23, e é gravada em `path` para a
+    próxima execução. A parte de leitura de cada FC 23 fica em `status`.
+    """
+
+    def __init__(self, master: RtuMaster, slave_addr: int = SLAVE_ADDRESS, path: str = BLOCK_CACHE):
+        self.master = master
+        self.slave_addr = slave_addr
+        self.path = path
+        self.image = self.load() or list(DEFAULT_BLOCK)
+        self.confirmed = False   # imagem já confirmada por uma FC 23 nesta execução?
+        self.status = None
+        self.written = 0
+        self.skipped = 0
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        entry = data.get(f"{self.slave_addr}")
+        if not entry or entry.get('start') != BLOCK_START or len(entry.get('values', [])) != BLOCK_QTY:
+            return None
+        return entry['values']
+
+    def save(self):
+        if not self.path:
+            return
+        data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        data[f"{self.slave_addr}"] = {'start': BLOCK_START, 'values': self.image}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def patch(self, changes: dict) -> list:
+        """Imagem atual com os registradores de `changes` ({endereço: valor}) substituídos."""
+        values = list(self.image)
+        for addr, value in changes.items():
+            k = addr - BLOCK_START
+            if not 0 <= k < BLOCK_QTY:
+                raise ValueError(f"Registrador 0x{addr:04X} fora do bloco C34F..C358")
+            values[k] = value & 0xFFFF
+        return values
+
+    def apply(self, changes: dict, force: bool = False):
+        """
+        Escreve o bloco com `changes` aplicados. Retorna os registradores lidos (status),
+        ou None se a escrita foi omitida por não mudar nada. Levanta ModbusError.
+        Com a imagem ainda não confirmada (vinda do arquivo ou do padrão) sempre escreve.
+        """
+        values = self.patch(changes)
+        if values == self.image and self.confirmed and not force:
+            self.skipped += 1
+            return None
+        self.status = self.master.read_write_registers(self.slave_addr, BLOCK_START, READ_QTY,
+                                                       BLOCK_START, values)
+        self.written += 1
+        if values != self.image or not self.confirmed:
+            self.image = values
+            self.confirmed = True
+            self.save()
+        return self.status
+
+    def refresh(self):
+        """Reenvia a imagem atual (mantém o inversor atualizado e lê o status)."""
+        return self.apply({}, force=True)
+
 # --- FUNÇÕES DE COMANDO ---
 
-def set_power_factor(ser: serial.Serial, fp_value: float):
+def _report(block: ParameterBlock, status):
+    if status is None:
+        print("  Valores já aplicados; escrita omitida.")
+    else:
+        print(f"  Resposta válida em {block.master.last_rtt * 1000:.1f} ms: "
+              + " ".join(f"{v:04X}" for v in status))
+    return status
+
+def set_power_factor(block: ParameterBlock, fp_value: float):
     """
     Envia o comando para definir o Fator de Potência (FP).
     FP é enviado como um valor Signed de 16 bits com escala 1000.
     Ex: 0.8 -> 800, -0.8 -> -800.
+    Só REG_MODE (C350 = 0x00A1, Power Factor Enable) e REG_FP (C351) mudam; os demais
+    registradores do bloco mantêm o valor que o inversor já tem.
     """
     print(f"\n--- Definindo Fator de Potência para {fp_value:.3f} ---")
-    
-    # 1. Calcular o valor de 16 bits com escala 1000
-    scaled_fp = int(fp_value * 1000)
-    fp_16bit = to_signed_16bit(scaled_fp)
-    
-    # 2. Definir o Modo de Reativa (0x00A1 = Power Factor Enable)
-    mode_enable = 0x00A1
-    
-    # 3. Construir a lista de valores de escrita (Regs C34F a C358)
-    # Usaremos a trama padrão do inversor como base para garantir a consistência
-    # Trama Padrão (Valores de Escrita): 0000, 0055, 03E8, 0000, 0055, 00CF, 03E8, 0055, 001E, 0000
-    
-    # Apenas os registradores REG_MODE (C350) e REG_FP (C351) serão alterados
-    
-    write_values = [
-        0x0000,             # C34F (Controle de Potência Ativa)
-        mode_enable,        # C350 (Modo de Reativa) -> MUDANÇA AQUI
-        fp_16bit,           # C351 (Fator de Potência) -> MUDANÇA AQUI
-        0x0000,             # C352 (% Potência Reativa)
-        0x0055,             # C353
-        0x00CF,             # C354
-        0x03E8,             # C355 (Potencia Nominal do Inversor)
-        0x0055,             # C356
-        0x001E,             # C357
-        0x0000              # C358
-    ]
-    
-    # 4. Construir a Trama FC 23
-    # O inversor lê 9 regs a partir de C34F e escreve 10 regs a partir de C34F
-    request = build_fc23_request(
-        slave_addr=SLAVE_ADDRESS,
-        read_start=REG_PA,
-        read_qty=9,
-        write_start=REG_PA,
-        write_values=write_values
-    )
-    
-    # 5. Enviar e Receber
-    print(f"  Enviando Trama ({len(request)} bytes): {request.hex().upper()}")
-    ser.write(request)
-    
-    # Esperar a resposta (FC 23 Response é curta: 8 bytes + CRC = 10 bytes)
-    time.sleep(0.1) # Pequeno atraso para o ESP07 processar e o Slave responder
-    
-    response = ser.read_all()
-    
-    if response:
-        print(f"  Resposta Recebida ({len(response)} bytes): {response.hex().upper()}")
-        # A resposta FC 23 é um eco da requisição (Slave Addr, FC, Write Start, Write Qty, CRC)
-        # O script não valida o CRC da resposta, apenas exibe.
-    else:
-        print("  Erro: Nenhuma resposta recebida do Slave.")
+    fp_16bit = to_signed_16bit(int(fp_value * 1000))
+    try:
+        status = block.apply({REG_MODE: 0x00A1, REG_FP: fp_16bit})
+    except ModbusError as e:
+        print(f"  Erro: {e}")
+        return None
+    return _report(block, status)
+
+def set_active_power(block: ParameterBlock, value: int):
+    """Define o Controle de Potência Ativa (REG_PA, C34F, signed)."""
+    print(f"\n--- Definindo Controle de Potência Ativa para {value} ---")
+    try:
+        status = block.apply({REG_PA: to_signed_16bit(value)})
+    except ModbusError as e:
+        print(f"  Erro: {e}")
+        return None
+    return _report(block, status)
 
 # --- FUNÇÃO PRINCIPAL ---
 
 def main():
     try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=0.5)
+        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=RESPONSE_TIMEOUT)
         print(f"Conectado à porta {SERIAL_PORT} @ {BAUD_RATE} bps.")
     except serial.SerialException as e:
         print(f"Erro ao abrir a porta serial {SERIAL_PORT}: {e}")
         sys.exit(1)
 
+    master = RtuMaster(ser)
+    block = ParameterBlock(master)
+
     # Exemplo de uso: Definir Fator de Potência para 0.8 (Indutivo)
-    set_power_factor(ser, 0.8)
+    set_power_factor(block, 0.8)
     
     # Exemplo de uso: Definir Fator de Potência para -0.8 (Capacitivo)
-    set_power_factor(ser, -0.8)
-    
+    set_power_factor(block, -0.8)
+
+    print(f"\n{master.stats()} | bloco: {block.written} escritas, {block.skipped} omitidas")
     ser.close()
 
 if __name__ == '__main__':
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+rtu_slave_sim.py
+
+Simulador de escravos Modbus RTU num pseudo-terminal (Linux), para testar o
+modbus_master.py, o bus_scheduler.py, o serial_saver.py e os decodificadores sem o
+hardware.
+
+ - cria um par pty e mostra o nome do lado "porta serial" (com --link, também um link
+   simbólico fixo, ex.: /tmp/ttyMODBUS)
+ - responde FC03/FC04/FC06/FC16/FC23 a partir de uma imagem de registradores por escravo:
+     siw400g  bloco C34F..C358 (anotacoes.txt): a leitura devolve status/medidas e a
+              escrita vai para a imagem de parâmetros, como no inversor
+     dtsu666  mapas do tcpdata2.py: 0x150A (13 floats), 0x181E (8 floats), 0x2044
+              (frequência x100, float) e 0x3001 (sequência, incrementa a cada atualização)
+ - emula a linha: espera o tempo da requisição no fio, o atraso de resposta (--delay) e
+   envia a resposta no ritmo do baud rate, com jitter entre bytes (--jitter)
+ - injeção de erros (probabilidades): --drop sem resposta, --crc-error, --truncate e
+   --busy (exceção 0x06)
+
+Uso:
+  python rtu_slave_sim.py --siw400g 2,3 --dtsu666 1 --link /tmp/ttyMODBUS
+  python rtu_slave_sim.py --siw400g 2 --baud 19200 --delay 5 --jitter 1 --drop 0.02 --crc-error 0.01
+"""
+
+import argparse
+import math
+import os
+import random
+import select
+import struct
+import sys
+import time
+import tty
+
+from modbus_master import BLOCK_START, DEFAULT_BLOCK, char_time, crc16_modbus, frame_gap
+
+UPDATE_S = 1.0       # intervalo de atualização das medidas simuladas
+
+# Leitura do SIW400G (anotacoes.txt, coluna R): Status, P, Q, PFV, S, -, Pinv, E(H), E(L)
+SIW400G_READ = [6144, 147, 0, 157, 150, 0, 1000, 59, -28265 & 0xFFFF]
+
+# DTSU666 (tcpdata2.py): 0x150A Uab Ubc Uca Ua Ub Uc Ia Ib Ic Pt Pa Pb Pc (floats)
+DTSU_REG_150A = 0x150A
+DTSU_REG_181E = 0x181E
+DTSU_REG_2044 = 0x2044
+DTSU_REG_SEQ = 0x3001
+
+class IllegalAddress(Exception):
+    pass
+
+class RegisterImage:
+    """Registradores de um escravo. Com write_map separado, escrita e leitura não se misturam."""
+
+    def __init__(self, regs=None, write_map=None):
+        self.regs = dict(regs or {})
+        self.write_map = write_map
+
+    def read(self, start, qty):
+        try:
+            return [self.regs[a] for a in range(start, start + qty)]
+        except KeyError:
+            raise IllegalAddress()
+
+    def write(self, start, values):
+        target = self.write_map if self.write_map is not None else self.regs
+        if any(a not in target for a in range(start, start + len(values))):
+            raise IllegalAddress()
+        for k, v in enumerate(values):
+            target[start + k] = v & 0xFFFF
+
+    def tick(self, t):
+        pass
+
+class Siw400gImage(RegisterImage):
+    def __init__(self):
+        super().__init__({BLOCK_START + k: v for k, v in enumerate(SIW400G_READ)},
+                         write_map={BLOCK_START + k: v for k, v in enumerate(DEFAULT_BLOCK)})
+        self.energy = (SIW400G_READ[7] << 16) | SIW400G_READ[8]
+
+    def tick(self, t):
+        # potência ativa oscila; energia acumulada (H/L) só cresce
+        p = int(147 + 10 * math.sin(t / 30.0))
+        self.regs[BLOCK_START + 1] = p
+        self.regs[BLOCK_START + 4] = p + 3
+        self.energy = (self.energy + 1) & 0xFFFFFFFF
+        self.regs[BLOCK_START + 7] = self.energy >> 16
+        self.regs[BLOCK_START + 8] = self.energy & 0xFFFF
+
+def _put_floats(regs, start, values):
+    for k, v in enumerate(values):
+        hi, lo = struct.unpack('>HH', struct.pack('>f', v))
+        regs[start + 2 * k] = hi
+        regs[start + 2 * k + 1] = lo
+
+class Dtsu666Image(RegisterImage):
+    def __init__(self):
+        super().__init__()
+        self.seq = 0
+        self.energy = [1520.5, 506.1, 507.3, 507.1, 0.0, 12.4, 0.0, 0.0]
+        for a in range(0x2000, 0x2046):
+            self.regs[a] = 0
+        self.tick(0.0)
+
+    def tick(self, t):
+        rnd = random.random
+        u = [380 + rnd(), 380 + rnd(), 380 + rnd(), 220 + rnd(), 220 + rnd(), 220 + rnd()]
+        i = [10 + 2 * math.sin(t / 20.0) + rnd() * 0.1 for _ in range(3)]
+        p = [u[3 + k] * i[k] / 1000.0 for k in range(3)]
+        _put_floats(self.regs, DTSU_REG_150A, u + i + [sum(p)] + p)
+        self.energy[0] += sum(p) / 3600.0
+        for k in range(3):
+            self.energy[1 + k] += p[k] / 3600.0
+        _put_floats(self.regs, DTSU_REG_181E, self.energy)
+        _put_floats(self.regs, DTSU_REG_2044, [6000.0 + int(rnd() * 4) - 2])
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.regs[DTSU_REG_SEQ] = self.seq
+
+def request_length(buf):
+    """Tamanho da requisição RTU no início de buf, ou None se ainda faltam bytes do cabeçalho."""
+    if len(buf) < 2:
+        return None
+    fc = buf[1]
+    if fc in (0x01, 0x02, 0x03, 0x04, 0x05, 0x06):
+        return 8
+    if fc in (0x0F, 0x10):
+        return 9 + buf[6] if len(buf) >= 7 else None
+    if fc == 0x17:
+        return 13 + buf[10] if len(buf) >= 11 else None
+    return 4   # função desconhecida: descarta endereço+função+CRC mínimos
+
+def exception_frame(slave, fc, code):
+    adu = bytes([slave, fc | 0x80, code])
+    return adu + crc16_modbus(adu)
+
+def handle_request(images, req):
+    """Resposta RTU (com CRC) para uma requisição válida, ou None se o escravo não existe."""
+    slave, fc = req[0], req[1]
+    image = images.get(slave)
+    if image is None:
+        return None
+    try:
+        if fc in (0x03, 0x04):
+            start, qty = struct.unpack('>HH', req[2:6])
+            if not 1 <= qty <= 125:
+                return exception_frame(slave, fc, 0x03)
+            data = image.read(start, qty)
+            adu = bytes([slave, fc, 2 * qty]) + struct.pack(f'>{qty}H', *data)
+        elif fc == 0x06:
+            addr, value = struct.unpack('>HH', req[2:6])
+            image.write(addr, [value])
+            adu = req[:6]
+        elif fc == 0x10:
+            start, qty = struct.unpack('>HH', req[2:6])
+            image.write(start, list(struct.unpack(f'>{qty}H', req[7:7 + 2 * qty])))
+            adu = req[:6]
+        elif fc == 0x17:
+            rstart, rqty, wstart, wqty = struct.unpack('>HHHH', req[2:10])
+            image.write(wstart, list(struct.unpack(f'>{wqty}H', req[11:11 + 2 * wqty])))   # escrita antes da leitura
+            data = image.read(rstart, rqty)
+            adu = bytes([slave, fc, 2 * rqty]) + struct.pack(f'>{rqty}H', *data)
+        else:
+            return exception_frame(slave, fc, 0x01)
+    except IllegalAddress:
+        return exception_frame(slave, fc, 0x02)
+    return adu + crc16_modbus(adu)
+
+class RtuSlaveSim:
+    def __init__(self, images, baud=9600, delay=0.005, jitter=0.0, drop=0.0, crc_error=0.0,
+                 truncate=0.0, busy=0.0, seed=None):
+        self.images = images
+        self.baud = baud
+        self.delay = delay
+        self.jitter = jitter
+        self.drop = drop
+        self.crc_error = crc_error
+        self.truncate = truncate
+        self.busy = busy
+        self.rng = random.Random(seed)
+        self.fd = None
+        self.name = None
+        self.counts = {'requests': 0, 'responses': 0, 'ignored': 0, 'bad_crc': 0,
+                       'drop': 0, 'crc_error': 0, 'truncate': 0, 'busy': 0}
+
+    def open(self, link=None):
+        self.fd, slave_fd = os.openpty()
+        tty.setraw(self.fd)
+        self.name = os.ttyname(slave_fd)
+        self._slave_fd = slave_fd          # mantém o lado escravo aberto entre clientes
+        if link:
+            if os.path.islink(link):
+                os.remove(link)
+            os.symlink(self.name, link)
+        return self.name
+
+    def _inject(self, slave, fc, resp):
+        r = self.rng.random()
+        for kind in ('drop', 'crc_error', 'truncate', 'busy'):
+            p = getattr(self, kind)
+            if r < p:
+                self.counts[kind] += 1
+                if kind == 'drop':
+                    return None
+                if kind == 'crc_error':
+                    return resp[:-2] + bytes([resp[-2] ^ 0xFF, resp[-1]])
+                if kind == 'truncate':
+                    return resp[:max(1, len(resp) // 2)]
+                return exception_frame(slave, fc, 0x06)
+            r -= p
+        return resp
+
+    def _send(self, data):
+        """Envia no ritmo da linha: um caractere a cada 11 bits, mais o jitter sorteado por byte."""
+        ct = char_time(self.baud)
+        t = time.monotonic()
+        for b in data:
+            t += ct + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            os.write(self.fd, bytes([b]))
+            wait = t - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+    def serve(self, duration=None):
+        buf = bytearray()
+        last_update = time.monotonic()
+        end = time.monotonic() + duration if duration else None
+        while end is None or time.monotonic() < end:
+            r, _, _ = select.select([self.fd], [], [], 0.1)
+            now = time.monotonic()
+            if now - last_update >= UPDATE_S:
+                for image in self.images.values():
+                    image.tick(now)
+                last_update = now
+            if not r:
+                buf.clear()          # silêncio: descarta resto de trama incompleta
+                continue
+            try:
+                buf += os.read(self.fd, 4096)
+            except OSError:
+                time.sleep(0.05)     # nenhum cliente com a porta aberta
+                continue
+            while True:
+                n = request_length(buf)
+                if n is None or len(buf) < n:
+                    break
+                req, rest = bytes(buf[:n]), buf[n:]
+                if crc16_modbus(req[:-2]) != req[-2:]:
+                    self.counts['bad_crc'] += 1
+                    del buf[0]       # ressincroniza byte a byte
+                    continue
+                buf = bytearray(rest)
+                self._answer(req)
+
+    def _answer(self, req):
+        self.counts['requests'] += 1
+        resp = handle_request(self.images, req)
+        if resp is None:
+            self.counts['ignored'] += 1
+            return
+        resp = self._inject(req[0], req[1], resp)
+        if resp is None:
+            return
+        # o pty entrega a requisição de uma vez: espera o tempo dela no fio e o silêncio
+        # t3.5 que a fecha antes de responder
+        time.sleep(len(req) * char_time(self.baud) + frame_gap(self.baud) + self.delay)
+        self._send(resp)
+        self.counts['responses'] += 1
+
+def parse_addrs(text):
+    return [int(x, 0) for x in text.split(',') if x.strip()] if text else []
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulador de escravos Modbus RTU (SIW400G, DTSU666) num pty.")
+    ap.add_argument('--siw400g', default='2', help='Endereços de inversores SIW400G (ex: 2,3)')
+    ap.add_argument('--dtsu666', default='', help='Endereços de medidores DTSU666 (ex: 1)')
+    ap.add_argument('--baud', type=int, default=9600, help='Baud rate emulado')
+    ap.add_argument('--delay', type=float, default=5.0, help='Atraso de resposta do escravo (ms)')
+    ap.add_argument('--jitter', type=float, default=0.0, help='Jitter máximo entre bytes da resposta (ms)')
+    ap.add_argument('--drop', type=float, default=0.0, help='Probabilidade de não responder')
+    ap.add_argument('--crc-error', type=float, default=0.0, help='Probabilidade de CRC errado')
+    ap.add_argument('--truncate', type=float, default=0.0, help='Probabilidade de resposta truncada')
+    ap.add_argument('--busy', type=float, default=0.0, help='Probabilidade de exceção 0x06 (ocupado)')
+    ap.add_argument('--seed', type=int, default=None, help='Semente dos sorteios')
+    ap.add_argument('--link', default=None, help='Cria um link simbólico para o pty (ex: /tmp/ttyMODBUS)')
+    ap.add_argument('--duration', type=float, default=None, help='Encerra após N segundos')
+    args = ap.parse_args()
+
+    if not hasattr(os, 'openpty'):
+        print("Erro: o simulador precisa de pseudo-terminais (Linux/macOS).")
+        sys.exit(1)
+
+    images = {a: Siw400gImage() for a in parse_addrs(args.siw400g)}
+    images.update({a: Dtsu666Image() for a in parse_addrs(args.dtsu666)})
+    sim = RtuSlaveSim(images, baud=args.baud, delay=args.delay / 1000.0, jitter=args.jitter / 1000.0,
+                      drop=args.drop, crc_error=args.crc_error, truncate=args.truncate, busy=args.busy,
+                      seed=args.seed)
+    name = sim.open(args.link)
+    kinds = ", ".join(f"0x{a:02X}={type(img).__name__[:-5]}" for a, img in sorted(images.items()))
+    print(f"Escravos simulados em {name}" + (f" ({args.link})" if args.link else "")
+          + f" @ {args.baud} bps: {kinds}. Ctrl+C para sair.")
+    try:
+        sim.serve(args.duration)
+    except KeyboardInterrupt:
+        print("\nEncerrando...")
+    finally:
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+    print(" | ".join(f"{k}: {v}" for k, v in sim.counts.items()))
+
+if __name__ == '__main__':
+    main()
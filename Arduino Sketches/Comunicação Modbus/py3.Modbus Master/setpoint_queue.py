@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+setpoint_queue.py
+
+Fila de setpoints (potência ativa, fator de potência, ...) na frente do RtuMaster, para
+quando o controle gera valores mais rápido do que o barramento consegue levar.
+
+ - só o valor mais recente pendente de cada (escravo, grupo de registradores) é mantido:
+   um setpoint novo substitui o anterior que ainda não foi enviado
+ - todas as mudanças pendentes de um grupo saem numa transação só:
+     siw400g  registradores C34F..C358: uma FC 23 com o bloco inteiro (ParameterBlock,
+              que omite a escrita se o inversor já tem esses valores)
+     fc16     outros registradores: uma FC 16 por sequência de endereços consecutivos
+ - uma thread envia os grupos na ordem em que ficaram pendentes
+ - envio com erro (após as tentativas do RtuMaster): as mudanças voltam para o fim da fila,
+   por baixo de um valor mais novo que tenha chegado nesse meio tempo, até MAX_REQUEUES
+   vezes; depois disso o grupo é descartado
+ - estatísticas: latência do enfileiramento do valor mais novo até a confirmação do
+   escravo, setpoints substituídos antes do envio, transações, erros, reenfileirados e
+   descartados
+
+Uso:
+  python setpoint_queue.py COM3 --slaves 2,3 --rate 50 --duration 10
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from modbus_master import (BLOCK_CACHE, BLOCK_QTY, BLOCK_START, REG_FP, REG_MODE, REG_PA,
+                           ModbusError, ParameterBlock, RtuMaster, to_signed_16bit)
+
+MODE_PF = 0x00A1           # Power Factor Enable (anotacoes.txt)
+LATENCY_HISTORY = 10000    # latências mantidas para as estatísticas
+MAX_REQUEUES = 3           # reenvios de um grupo que falhou antes de descartá-lo
+
+def register_group(addr):
+    """Grupo de escrita de um registrador."""
+    return 'siw400g' if BLOCK_START <= addr < BLOCK_START + BLOCK_QTY else 'fc16'
+
+def contiguous_runs(changes):
+    """{endereço: valor} -> [(início, [valores])] com endereços consecutivos."""
+    runs = []
+    for addr in sorted(changes):
+        if runs and addr == runs[-1][0] + len(runs[-1][1]):
+            runs[-1][1].append(changes[addr])
+        else:
+            runs.append((addr, [changes[addr]]))
+    return runs
+
+class Pending:
+    """Mudanças ainda não enviadas de um (escravo, grupo)."""
+
+    def __init__(self, changes, t):
+        self.changes = dict(changes)
+        self.t_first = t
+        self.t_last = t
+        self.attempts = 0              # envios que já falharam
+
+class SetpointQueue:
+    def __init__(self, master: RtuMaster, block_cache: str = BLOCK_CACHE):
+        self.master = master
+        self.block_cache = block_cache
+        self.blocks = {}                 # escravo -> ParameterBlock
+        self.pending = OrderedDict()     # (escravo, grupo) -> Pending, em ordem de chegada
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.enqueued = 0
+        self.superseded = 0              # valores substituídos antes de chegar ao escravo
+        self.sent = 0
+        self.skipped = 0                 # grupos sem mudança real (escrita omitida)
+        self.errors = 0
+        self.requeued = 0                # grupos que voltaram para a fila após erro
+        self.dropped = 0                 # grupos descartados após MAX_REQUEUES
+        self.latencies = []
+
+    # --- produtor ---
+
+    def enqueue(self, slave, changes):
+        """Agenda {endereço: valor}; sobrescreve o que ainda estiver pendente nos mesmos registradores."""
+        now = time.monotonic()
+        by_group = {}
+        for addr, value in changes.items():
+            by_group.setdefault(register_group(addr), {})[addr] = value & 0xFFFF
+        with self.cond:
+            for group, ch in by_group.items():
+                key = (slave, group)
+                p = self.pending.get(key)
+                if p is None:
+                    self.pending[key] = Pending(ch, now)
+                else:
+                    self.superseded += any(a in p.changes for a in ch)
+                    p.changes.update(ch)
+                    p.t_last = now
+                self.enqueued += 1
+            self.cond.notify()
+
+    def set_power_factor(self, slave, fp_value):
+        self.enqueue(slave, {REG_MODE: MODE_PF, REG_FP: to_signed_16bit(int(fp_value * 1000))})
+
+    def set_active_power(self, slave, value):
+        self.enqueue(slave, {REG_PA: to_signed_16bit(value)})
+
+    # --- consumidor ---
+
+    def _block(self, slave):
+        if slave not in self.blocks:
+            self.blocks[slave] = ParameterBlock(self.master, slave, path=self.block_cache)
+        return self.blocks[slave]
+
+    def _send(self, slave, group, p):
+        if group == 'siw400g':
+            if self._block(slave).apply(p.changes) is None:
+                self.skipped += 1
+            else:
+                self.sent += 1
+            return
+        for start, values in contiguous_runs(p.changes):
+            self.master.write_registers(slave, start, values)
+            self.sent += 1
+
+    def process_one(self, timeout=None):
+        """Envia o grupo pendente mais antigo. Retorna False se nada ficou pendente no timeout."""
+        with self.cond:
+            if not self.pending and not self.cond.wait_for(lambda: self.pending or self.stop_event.is_set(), timeout):
+                return False
+            if not self.pending:
+                return False
+            (slave, group), p = self.pending.popitem(last=False)
+        try:
+            self._send(slave, group, p)
+        except ModbusError as e:
+            self.errors += 1
+            print(f"  Erro no escravo 0x{slave:02X} ({group}): {e}")
+            self._requeue(slave, group, p)
+            return True
+        if len(self.latencies) < LATENCY_HISTORY:
+            self.latencies.append(time.monotonic() - p.t_last)
+        return True
+
+    def _requeue(self, slave, group, p):
+        """Devolve à fila as mudanças que falharam, sem sobrescrever valores mais novos."""
+        p.attempts += 1
+        with self.cond:
+            newer = self.pending.get((slave, group))
+            if newer is not None:
+                # chegou valor novo durante o envio: as mudanças antigas só completam o que falta
+                newer.changes = {**p.changes, **newer.changes}
+                newer.t_first = min(newer.t_first, p.t_first)
+                self.requeued += 1
+                return
+            if p.attempts > MAX_REQUEUES:
+                self.dropped += 1
+                print(f"  Escravo 0x{slave:02X} ({group}): descartado após {p.attempts} envios com erro")
+                return
+            self.pending[(slave, group)] = p      # no fim: não trava os outros escravos
+            self.requeued += 1
+            self.cond.notify()
+
+    def flush(self):
+        """Envia tudo o que está pendente (uso sem thread)."""
+        while self.process_one(timeout=0):
+            pass
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.process_one(timeout=0.1)
+        self.flush()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(5.0)
+
+    def stats(self):
+        line = (f"{self.enqueued} setpoints, {self.superseded} substituídos antes do envio, "
+                f"{self.sent} transações, {self.skipped} omitidas, {self.errors} erros, "
+                f"{self.requeued} reenfileirados, {self.dropped} descartados")
+        if self.latencies:
+            ms = sorted(x * 1000 for x in self.latencies)
+            p95 = ms[min(len(ms) - 1, int(0.95 * len(ms)))]
+            line += (f" | latência ms: mín {ms[0]:.1f}  mediana {statistics.median(ms):.1f}  "
+                     f"p95 {p95:.1f}  máx {ms[-1]:.1f}")
+        return line
+
+def main():
+    ap = argparse.ArgumentParser(description="Fila de setpoints com coalescência para inversores SIW400G.")
+    ap.add_argument('port', help='Porta serial (ex: COM3 ou /dev/ttyUSB0)')
+    ap.add_argument('--baud', type=int, default=9600)
+    ap.add_argument('--slaves', default='2', help='Endereços dos inversores (ex: 2,3)')
+    ap.add_argument('--rate', type=float, default=20.0, help='Setpoints de FP por segundo (por inversor) no teste')
+    ap.add_argument('--duration', type=float, default=10.0, help='Duração do teste (s)')
+    args = ap.parse_args()
+
+    import serial
+    try:
+        ser = serial.Serial(args.port, args.baud)
+    except serial.SerialException as e:
+        print(f"Erro ao abrir a porta serial {args.port}: {e}")
+        sys.exit(1)
+
+    slaves = [int(x, 0) for x in args.slaves.split(',') if x.strip()]
+    master = RtuMaster(ser, baud=args.baud)
+    queue = SetpointQueue(master)
+    queue.start()
+
+    # controle de teste: FP em passeio aleatório entre 0.80 e 1.00, mais rápido que o barramento
+    fp = {s: 1.0 for s in slaves}
+    end = time.monotonic() + args.duration
+    try:
+        while time.monotonic() < end:
+            for s in slaves:
+                fp[s] = min(1.0, max(0.8, fp[s] + random.uniform(-0.01, 0.01)))
+                queue.set_power_factor(s, round(fp[s], 3))
+            time.sleep(1.0 / args.rate)
+    except KeyboardInterrupt:
+        print("\nEncerrando...")
+    queue.stop()
+    ser.close()
+    print(queue.stats())
+    print(master.stats())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+async_client.py
+
+Cliente Modbus TCP assíncrono (asyncio) com pipeline: várias transações em voo na mesma
+conexão, cada resposta casada com o pedido pelo identificador da transação. Assim o tempo
+de ida e volta pela rede até a ponte ESP07/ESP32 se sobrepõe em vez de somar.
+
+ - enquadramentos:
+     mbap    Modbus TCP padrão (porta 502, ex.: 21.dtsu666TCP): transaction id de 16 bits
+     tunnel  túnel RTU<->TCP v3 (porta 1502, 18.tunel_rtu_tcp v3/slave_server):
+             A5 5A seq len(LE) + quadro RTU com CRC; seq de 8 bits (0 é o keepalive)
+ - depth: máximo de transações em voo (1 = um pedido por vez, como o ModbusTcpClient)
+ - reconexão: se a conexão cai, os pedidos em voo são reenviados (só leituras) depois de
+   reconectar; a fila de espera, a ordem, o contador de ids e as estatísticas continuam
+ - respostas atrasadas (de pedidos que já deram timeout) são descartadas pelo id
+
+Benchmark: lê o mesmo bloco N vezes para cada profundidade de pipeline e mostra vazão,
+latência e erros, para achar quanto pipeline cada firmware de ponte aguenta. O tamanho
+lido varia a cada pedido: uma resposta entregue ao pedido errado aparece como "inválidas".
+
+Uso:
+  python async_client.py 172.16.99.100 --depths 1,2,4,8
+  python async_client.py 172.16.99.100 --port 1502 --framing tunnel --unit 2 --addr 0xC34F --count 9
+"""
+
+import argparse
+import asyncio
+import statistics
+import struct
+import sys
+import time
+
+TIMEOUT_S = 2.0          # por transação
+RECONNECT_S = 2.0        # espera entre tentativas de conexão
+RETRIES = 1              # reenvios de um pedido perdido por queda de conexão
+MAGIC = b"\xA5\x5A"
+
+class ModbusError(Exception):
+    pass
+
+class ModbusTimeout(ModbusError):
+    pass
+
+class ModbusFrameError(ModbusError):
+    pass
+
+class ModbusConnectionLost(ModbusError):
+    pass
+
+class ModbusExceptionResponse(ModbusError):
+    def __init__(self, function_code, code):
+        super().__init__(f"exceção Modbus {code} na função 0x{function_code:02X}")
+        self.function_code = function_code
+        self.code = code
+
+def crc16(data: bytes) -> int:
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+# --------------------- Enquadramentos ---------------------
+class MbapFraming:
+    """Modbus TCP: cabeçalho MBAP (tid, protocolo 0, tamanho, unidade) + PDU."""
+    name = "mbap"
+    first_id = 0
+    id_mod = 0x10000
+
+    def encode(self, tid, unit, pdu):
+        return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + pdu
+
+    async def read_frame(self, reader):
+        """(tid, unidade, pdu). None se o quadro não é resposta (não ocorre no MBAP)."""
+        tid, proto, length, unit = struct.unpack(">HHHB", await reader.readexactly(7))
+        if proto != 0 or not 2 <= length <= 254:
+            raise ModbusFrameError(f"cabeçalho MBAP inválido (protocolo {proto}, tamanho {length})")
+        return tid, unit, await reader.readexactly(length - 1)
+
+class TunnelFraming:
+    """Túnel v3: A5 5A, seq, tamanho LE, quadro RTU (unidade + PDU + CRC)."""
+    name = "tunnel"
+    first_id = 1          # seq 0 é usado pelo keepalive da ponte
+    id_mod = 0x100
+
+    def encode(self, tid, unit, pdu):
+        frame = bytes([unit]) + pdu
+        frame += struct.pack("<H", crc16(frame))
+        return MAGIC + struct.pack("<BH", tid, len(frame)) + frame
+
+    async def read_frame(self, reader):
+        # ressincroniza no magic (como tcpResyncToMagic do firmware)
+        prev = b""
+        while True:
+            b = await reader.readexactly(1)
+            if prev + b == MAGIC:
+                break
+            prev = b
+        seq, length = struct.unpack("<BH", await reader.readexactly(3))
+        frame = await reader.readexactly(length)
+        if length == 0:
+            # keepalive (seq 0) ou escravo RTU sem resposta (seq do pedido)
+            return (None if seq == 0 else (seq, None, None))
+        if frame == b"OK":
+            return None               # resposta ao HELLO
+        if length < 4 or crc16(frame[:-2]) != struct.unpack("<H", frame[-2:])[0]:
+            return seq, None, b""     # CRC ruim: pedido falha com erro de quadro
+        return seq, frame[0], frame[1:-2]
+
+FRAMINGS = {"mbap": MbapFraming, "tunnel": TunnelFraming}
+
+# --------------------- Cliente ---------------------
+class AsyncModbusClient:
+    def __init__(self, host, port=502, unit=1, depth=4, timeout=TIMEOUT_S, framing="mbap",
+                 reconnect_delay=RECONNECT_S, connect_attempts=None, retries=RETRIES):
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.depth = depth
+        self.timeout = timeout
+        self.framing = FRAMINGS[framing]() if isinstance(framing, str) else framing
+        self.reconnect_delay = reconnect_delay
+        self.connect_attempts = connect_attempts    # None: tenta para sempre
+        self.retries = retries
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.pending = {}                 # id -> Future da resposta
+        self.next_id = self.framing.first_id
+        self.slots = asyncio.Semaphore(depth)
+        self.conn_lock = asyncio.Lock()
+        self.requests = 0
+        self.ok = 0
+        self.timeouts = 0
+        self.exceptions = 0
+        self.frame_errors = 0
+        self.stale = 0                    # respostas sem pedido pendente (atrasadas)
+        self.reconnects = 0
+        self.connections = 0
+        self.inflight_max = 0
+        self.rtts = []
+
+    # --- conexão ---
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        async with self.conn_lock:
+            if self.connected:
+                return
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    self.reader, self.writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout)
+                    break
+                except (OSError, asyncio.TimeoutError) as e:
+                    if self.connect_attempts is not None and attempt >= self.connect_attempts:
+                        raise ModbusConnectionLost(f"sem conexão com {self.host}:{self.port}: {e}")
+                    print(f"TCP offline ({self.host}:{self.port}): {e}. Aguardando...")
+                    await asyncio.sleep(self.reconnect_delay)
+            self.connections += 1
+            if self.connections > 1:
+                self.reconnects += 1
+            self.reader_task = asyncio.ensure_future(self._read_loop(self.reader))
+
+    async def close(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+            try:
+                await self.reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.reader_task = None
+        self._drop(ModbusConnectionLost("conexão fechada"))
+
+    def _drop(self, exc):
+        """Fecha a conexão atual e falha os pedidos em voo (que serão reenviados)."""
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+        for fut in self.pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+        self.pending.clear()
+
+    async def _read_loop(self, reader):
+        try:
+            while True:
+                frame = await self.framing.read_frame(reader)
+                if frame is None:
+                    continue
+                tid, unit, pdu = frame
+                fut = self.pending.pop(tid, None)
+                if fut is None or fut.done():
+                    self.stale += 1
+                    continue
+                if pdu is None:
+                    fut.set_exception(ModbusTimeout("escravo RTU não respondeu (ponte)"))
+                elif not pdu:
+                    fut.set_exception(ModbusFrameError("CRC inválido na resposta"))
+                else:
+                    fut.set_result(pdu)
+        except asyncio.CancelledError:
+            raise
+        except (OSError, asyncio.IncompleteReadError, ModbusFrameError) as e:
+            if self.reader is reader:
+                self._drop(ModbusConnectionLost(f"conexão perdida: {e or type(e).__name__}"))
+
+    # --- transações ---
+    def _new_id(self):
+        while True:
+            tid = self.next_id
+            self.next_id += 1
+            if self.next_id >= self.framing.id_mod:
+                self.next_id = self.framing.first_id
+            if tid not in self.pending:
+                return tid
+
+    async def _transact(self, unit, pdu):
+        tid = self._new_id()
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[tid] = fut
+        self.inflight_max = max(self.inflight_max, len(self.pending))
+        t0 = time.monotonic()
+        try:
+            self.writer.write(self.framing.encode(tid, unit, pdu))
+            await self.writer.drain()
+            resp = await asyncio.wait_for(fut, self.timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(tid, None)
+            raise ModbusTimeout(f"sem resposta em {self.timeout:.1f} s (id {tid})")
+        except (OSError, AttributeError) as e:
+            self.pending.pop(tid, None)
+            raise ModbusConnectionLost(f"falha ao enviar: {e}")
+        self.rtts.append(time.monotonic() - t0)
+        return resp
+
+    async def request(self, pdu, unit=None, idempotent=True, expect_len=None):
+        """Envia um PDU e devolve o PDU da resposta. Exceções Modbus viram ModbusExceptionResponse."""
+        unit = self.unit if unit is None else unit
+        async with self.slots:
+            self.requests += 1
+            attempt = 0
+            while True:
+                if not self.connected:
+                    await self.connect()
+                try:
+                    resp = await self._transact(unit, pdu)
+                    break
+                except ModbusConnectionLost:
+                    attempt += 1
+                    if not idempotent or attempt > self.retries:
+                        raise
+                except ModbusTimeout:
+                    self.timeouts += 1
+                    raise
+                except ModbusFrameError:
+                    self.frame_errors += 1
+                    raise
+        if resp[0] & 0x80:
+            self.exceptions += 1
+            raise ModbusExceptionResponse(resp[0] & 0x7F, resp[1] if len(resp) > 1 else 0)
+        if resp[0] != pdu[0]:
+            self.frame_errors += 1
+            raise ModbusFrameError(f"função 0x{resp[0]:02X} na resposta a 0x{pdu[0]:02X}")
+        if expect_len is not None and len(resp) != expect_len:
+            # com pipeline, também é o sintoma de resposta entregue ao pedido errado
+            self.frame_errors += 1
+            raise ModbusFrameError(f"resposta com {len(resp)} bytes, esperado {expect_len}")
+        self.ok += 1
+        return resp
+
+    async def read_registers(self, addr, count, unit=None, function_code=3):
+        resp = await self.request(struct.pack(">BHH", function_code, addr, count), unit,
+                                  expect_len=2 + 2 * count)
+        return list(struct.unpack(f">{count}H", resp[2:]))
+
+    async def read_holding_registers(self, addr, count, unit=None):
+        return await self.read_registers(addr, count, unit, 3)
+
+    async def write_registers(self, addr, values, unit=None):
+        pdu = struct.pack(f">BHHB{len(values)}H", 16, addr, len(values), 2 * len(values),
+                          *[v & 0xFFFF for v in values])
+        await self.request(pdu, unit, idempotent=False)
+
+    async def read_blocks(self, plan, unit=None):
+        """Lê todos os blocos de um plano (read_plan.plan_reads) em paralelo. ({addr: regs}, err)"""
+        results = await asyncio.gather(*(self.read_holding_registers(a, n, unit) for a, n in plan),
+                                       return_exceptions=True)
+        for (addr, _), r in zip(plan, results):
+            if isinstance(r, Exception):
+                return None, f"Erro lendo 0x{addr:04X}: {r}"
+        return {addr: r for (addr, _), r in zip(plan, results)}, None
+
+    def stats(self):
+        line = (f"{self.requests} pedidos, {self.ok} ok, {self.timeouts} timeouts, "
+                f"{self.exceptions} exceções, {self.frame_errors} quadros inválidos, "
+                f"{self.stale} respostas atrasadas, {self.reconnects} reconexões, "
+                f"máx em voo {self.inflight_max}")
+        if self.rtts:
+            ms = sorted(x * 1000 for x in self.rtts)
+            line += f" | RTT ms: mediana {statistics.median(ms):.1f}  p95 {ms[int(0.95 * (len(ms) - 1))]:.1f}"
+        return line
+
+# --------------------- Benchmark ---------------------
+async def bench_depth(args, depth):
+    client = AsyncModbusClient(args.host, args.port, args.unit, depth=depth, timeout=args.timeout,
+                               framing=args.framing, connect_attempts=3)
+    try:
+        await client.connect()
+    except ModbusConnectionLost as e:
+        return None, str(e)
+
+    async def one(i):
+        count = args.count - i % 3 if args.count > 2 else args.count
+        try:
+            await client.read_registers(args.addr, count, function_code=args.fc)
+        except ModbusError:
+            pass
+
+    t0 = time.monotonic()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.monotonic() - t0
+    await client.close()
+    lat = sorted(client.rtts)      # do envio à resposta (sem a espera na fila do cliente)
+    return {
+        "depth": depth,
+        "ok": client.ok,
+        "rate": client.ok / elapsed if elapsed > 0 else 0.0,
+        "p50": statistics.median(lat) * 1000 if lat else float("nan"),
+        "p95": lat[int(0.95 * (len(lat) - 1))] * 1000 if lat else float("nan"),
+        "errors": client.requests - client.ok,
+        "timeouts": client.timeouts,
+        "invalid": client.frame_errors,
+        "stale": client.stale,
+        "reconnects": client.reconnects,
+    }, None
+
+async def benchmark(args):
+    rows = []
+    print(f"Benchmark {args.framing} {args.host}:{args.port} unidade {args.unit}: "
+          f"{args.requests} leituras FC{args.fc:02d} 0x{args.addr:04X} x{args.count} por profundidade")
+    print(f"{'prof':>4} {'ok':>5} {'leit/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'erros':>5} "
+          f"{'timeout':>7} {'inválidas':>9} {'atras.':>6} {'recon':>5}")
+    for depth in args.depths:
+        row, err = await bench_depth(args, depth)
+        if err:
+            print(f"{depth:>4} {err}")
+            break
+        rows.append(row)
+        print(f"{row['depth']:>4} {row['ok']:>5} {row['rate']:7.1f} {row['p50']:7.1f} {row['p95']:7.1f} "
+              f"{row['errors']:>5} {row['timeouts']:>7} {row['invalid']:>9} {row['stale']:>6} {row['reconnects']:>5}")
+        await asyncio.sleep(args.pause)
+
+    clean = [r for r in rows if r["errors"] == 0 and r["invalid"] == 0 and r["reconnects"] == 0]
+    if not clean:
+        print("Nenhuma profundidade sem erros: use depth=1 e verifique a ponte.")
+        return
+    best = max(r["rate"] for r in clean)
+    pick = min(r["depth"] for r in clean if r["rate"] >= 0.95 * best)
+    print(f"Recomendado: depth={pick} ({best:.1f} leituras/s no melhor caso sem erros)")
+
+def parse_depths(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+def main():
+    ap = argparse.ArgumentParser(description="Cliente Modbus TCP assíncrono com pipeline: benchmark de profundidade por ponte.")
+    ap.add_argument("host", help="IP da ponte (ex: 172.16.99.100)")
+    ap.add_argument("--port", type=int, default=None, help="Porta TCP (padrão: 502 mbap, 1502 tunnel)")
+    ap.add_argument("--framing", choices=sorted(FRAMINGS), default="mbap", help="Enquadramento da ponte")
+    ap.add_argument("--unit", type=lambda x: int(x, 0), default=1, help="Unidade/escravo Modbus")
+    ap.add_argument("--addr", type=lambda x: int(x, 0), default=0x150A, help="Registrador inicial lido")
+    ap.add_argument("--count", type=int, default=26, help="Registradores por leitura")
+    ap.add_argument("--fc", type=int, choices=[3, 4], default=3, help="Função de leitura")
+    ap.add_argument("--depths", type=parse_depths, default=[1, 2, 4, 8, 16], help="Profundidades testadas (ex: 1,2,4,8)")
+    ap.add_argument("--requests", type=int, default=200, help="Leituras por profundidade")
+    ap.add_argument("--timeout", type=float, default=TIMEOUT_S, help="Timeout por transação (s)")
+    ap.add_argument("--pause", type=float, default=1.0, help="Pausa entre profundidades (s)")
+    args = ap.parse_args()
+    if args.port is None:
+        args.port = 1502 if args.framing == "tunnel" else 502
+
+    try:
+        asyncio.run(benchmark(args))
+    except KeyboardInterrupt:
+        print("\nEncerrando...")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+log_sink.py
+
+Gravação de amostras de medidores/inversores em CSV sem abrir e fechar o arquivo a cada
+linha (o que domina o custo em taxas de leitura altas):
+
+ - arquivo aberto uma vez, com buffer; flush + fsync a cada fsync_s segundos (e no close)
+ - rotação diária (nome_AAAA-MM-DD.csv) e/ou por tamanho (nome.1.csv, nome.2.csv, ...);
+   o cabeçalho é escrito em cada arquivo novo
+ - CSV "do Excel" como visão: separador ";" e vírgula decimal por padrão; a linha é
+   formatada por um modelo montado uma vez (floats com float_fmt) e a vírgula é trocada
+   na linha inteira; colunas de texto com "." ou tipos inesperados (ex.: 'ERROR' numa
+   coluna float, None -> vazio) caem na formatação valor a valor, que põe entre aspas (como
+   o csv.writer) os valores com o separador, aspas ou quebra de linha
+ - saída colunar opcional (columnar='parquet' ou 'npz'), gravada em lotes de batch_rows
+   linhas num arquivo por lote (nome_AAAAMMDD_HHMMSS.parquet/.npz), com a coluna extra
+   't' (epoch). Parquet precisa do pyarrow; sem ele, grava .npz. Colunas numéricas viram
+   float64 (texto -> NaN), as demais ficam como texto
+
+Uso (em código):
+  with LogSink("logs/dtsu666_log.csv", CSV_FIELDS, rotate="daily", columnar="npz") as sink:
+      sink.write(row)
+"""
+
+import os
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:      # só a saída colunar precisa do numpy
+    np = None
+
+FSYNC_S = 30.0               # intervalo entre fsync
+BUFFER_BYTES = 64 * 1024     # buffer do arquivo
+BATCH_ROWS = 3600            # linhas por arquivo colunar
+
+class LogSink:
+    def __init__(self, path, fields, sep=";", decimal=",", float_fmt=".2f", rotate=None,
+                 max_bytes=None, fsync_s=FSYNC_S, buffer_bytes=BUFFER_BYTES, columnar=None,
+                 batch_rows=BATCH_ROWS):
+        if rotate not in (None, "daily"):
+            raise ValueError(f"rotação desconhecida: {rotate}")
+        if columnar not in (None, "parquet", "npz"):
+            raise ValueError(f"saída colunar desconhecida: {columnar}")
+        if columnar and np is None:
+            raise RuntimeError("saída colunar precisa do numpy (pip install numpy)")
+        self.base, self.ext = os.path.splitext(path)
+        self.fields = list(fields)
+        self.sep = sep
+        self.decimal = decimal
+        self.float_fmt = float_fmt
+        self.rotate = rotate
+        self.max_bytes = max_bytes
+        self.fsync_s = fsync_s
+        self.buffer_bytes = buffer_bytes
+        self.columnar = columnar
+        self.batch_rows = batch_rows
+        self.template = None          # modelo da linha, montado na primeira linha
+        self.kinds = []
+        self.text_cols = []
+        self.f = None
+        self.path = None
+        self.day = None
+        self.part = 0
+        self.size = 0
+        self.last_sync = time.monotonic()
+        self.batch = []
+        self.batch_t = []
+        self.rows = 0
+        self.files = 0
+        self.batches = 0
+
+    # --- CSV ---
+    def _file_path(self, day, part):
+        name = self.base + (f"_{day}" if day else "") + (f".{part}" if part else "")
+        return name + self.ext
+
+    def _open(self):
+        self.day = datetime.now().strftime("%Y-%m-%d") if self.rotate == "daily" else None
+        self.part = 0
+        while True:
+            self.path = self._file_path(self.day, self.part)
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if not self.max_bytes or size < self.max_bytes:
+                break
+            self.part += 1
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.f = open(self.path, "a", encoding="utf-8", newline="", buffering=self.buffer_bytes)
+        self.size = size
+        if size == 0:
+            self._write_line(self.sep.join(self._quote(str(name)) for name in self.fields))
+        self.files += 1
+
+    def _close_file(self):
+        if self.f is not None:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.f.close()
+            self.f = None
+
+    def _rollover_due(self):
+        if self.rotate == "daily" and datetime.now().strftime("%Y-%m-%d") != self.day:
+            return True
+        return bool(self.max_bytes) and self.size >= self.max_bytes
+
+    def _write_line(self, line):
+        line += "\n"
+        self.f.write(line)
+        self.size += len(line) if line.isascii() else len(line.encode("utf-8"))
+
+    def _build_template(self, row):
+        specs = []
+        self.text_cols = []
+        for i, v in enumerate(row):
+            if isinstance(v, float) and self.float_fmt:
+                specs.append("{:" + self.float_fmt + "}")
+            else:
+                specs.append("{}")
+                if not isinstance(v, (int, float)):
+                    self.text_cols.append(i)
+        self.template = self.sep.join(specs)
+        self.kinds = [type(v) for v in row]
+
+    def _needs_quote(self, s):
+        return self.sep in s or '"' in s or "\n" in s or "\r" in s
+
+    def _quote(self, s):
+        """Aspas no estilo csv.writer (QUOTE_MINIMAL) quando o valor quebraria as colunas."""
+        return '"' + s.replace('"', '""') + '"' if self._needs_quote(s) else s
+
+    def _fmt_value(self, v):
+        if v is None:
+            return ""
+        if isinstance(v, float):
+            s = format(v, self.float_fmt) if self.float_fmt else str(v)
+            return s.replace(".", self.decimal) if self.decimal != "." else s
+        return str(v)
+
+    def format_row(self, row):
+        """Linha CSV (sem o fim de linha) na visão configurada."""
+        if self.template is None:
+            self._build_template(row)
+        if len(row) == len(self.kinds) and None not in row and all(type(v) is k for v, k in zip(row, self.kinds)):
+            texts = [str(row[i]) for i in self.text_cols]
+            if not any(self._needs_quote(t) or (self.decimal != "." and "." in t) for t in texts):
+                line = self.template.format(*row)
+                return line.replace(".", self.decimal) if self.decimal != "." else line
+        return self.sep.join(self._quote(self._fmt_value(v)) for v in row)
+
+    # --- saída colunar ---
+    def _flush_batch(self):
+        if not self.columnar or not self.batch:
+            return
+        cols = {"t": np.array(self.batch_t, dtype=np.float64)}
+        for i, name in enumerate(self.fields):
+            values = [r[i] if i < len(r) else None for r in self.batch]
+            if any(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                cols[name] = np.array([float(v) if isinstance(v, (int, float)) else np.nan for v in values])
+            else:
+                cols[name] = np.array(["" if v is None else str(v) for v in values])
+        stamp = datetime.fromtimestamp(self.batch_t[0]).strftime("%Y%m%d_%H%M%S")
+        base = f"{self.base}_{stamp}"
+        n = 0
+        while any(os.path.exists(f"{base}{'_%d' % n if n else ''}.{ext}") for ext in ("npz", "parquet")):
+            n += 1
+        base += f"_{n}" if n else ""
+        folder = os.path.dirname(base)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if self.columnar == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                pq.write_table(pa.table(cols), base + ".parquet")
+            except ImportError:
+                print("Aviso: pyarrow não instalado; gravando lotes em .npz")
+                self.columnar = "npz"
+        if self.columnar == "npz":
+            np.savez_compressed(base + ".npz", **cols)
+        self.batches += 1
+        self.batch = []
+        self.batch_t = []
+
+    # --- interface ---
+    def write(self, row):
+        """Grava uma amostra (lista na ordem de fields)."""
+        if self.f is None:
+            self._open()
+        elif self._rollover_due():
+            new_day = self.rotate == "daily" and datetime.now().strftime("%Y-%m-%d") != self.day
+            self._close_file()
+            if new_day:
+                self._flush_batch()      # lotes colunares não atravessam o dia
+            self._open()
+        self._write_line(self.format_row(row))
+        self.rows += 1
+        if self.columnar:
+            self.batch.append(list(row))
+            self.batch_t.append(time.time())
+            if len(self.batch) >= self.batch_rows:
+                self._flush_batch()
+        now = time.monotonic()
+        if now - self.last_sync >= self.fsync_s:
+            self.sync()
+
+    def sync(self):
+        """Esvazia o buffer e força a gravação em disco."""
+        if self.f is not None:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self._flush_batch()
+        self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        line = f"{self.rows} linhas em {self.files} arquivo(s), atual {self.path}"
+        if self.columnar:
+            line += f", {self.batches} lotes {self.columnar}"
+        return line
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+read_plan.py
+
+Planejador de leituras Modbus: a partir dos campos necessários, monta o menor conjunto de
+leituras em bloco (holding registers) e decodifica cada campo dos blocos lidos.
+
+ - campos repetidos ou sobrepostos são lidos uma vez só
+ - campos próximos viram um bloco único se a lacuna entre eles for <= max_gap e o bloco
+   couber em max_regs (limite do dispositivo/ponte)
+ - faixas proibidas (forbidden) nunca são lidas: endereços que a ponte ESP não reserva
+   respondem com erro e derrubariam o bloco inteiro
+ - blocos maiores que max_regs são divididos
+
+Uso (em código):
+  plan = plan_reads(FIELDS, max_gap=8)
+  blocks, err = read_blocks(read_holding_fn, plan)
+  values = decode_fields(FIELDS, blocks)
+"""
+
+import struct
+from collections import namedtuple
+
+MAX_REGS = 125   # limite do Modbus para FC03
+MAX_GAP = 8      # registradores não usados tolerados entre dois campos do mesmo bloco
+
+# kind: 'f32' (float IEEE754, palavra alta primeiro), 'u16', 'i16', 'u32', 'raw' (lista de regs)
+Field = namedtuple("Field", "name addr count kind scale", defaults=(2, "f32", 1.0))
+
+def _crosses(lo, hi, forbidden):
+    """True se [lo, hi) toca alguma faixa proibida (início, fim exclusivo)."""
+    return any(lo < f_hi and f_lo < hi for f_lo, f_hi in forbidden)
+
+def plan_reads(fields, max_regs=MAX_REGS, max_gap=MAX_GAP, forbidden=()):
+    """Retorna [(addr, count), ...] em ordem de endereço, cobrindo todos os campos."""
+    spans = sorted({(f.addr, f.addr + f.count) for f in fields})
+    plan = []
+    cur_lo = cur_hi = None
+    for lo, hi in spans:
+        if cur_lo is not None and lo - cur_hi <= max_gap and max(hi, cur_hi) - cur_lo <= max_regs \
+                and not _crosses(cur_hi, lo, forbidden):
+            cur_hi = max(cur_hi, hi)
+            continue
+        if cur_lo is not None:
+            plan.append((cur_lo, cur_hi))
+        cur_lo, cur_hi = lo, hi
+    if cur_lo is not None:
+        plan.append((cur_lo, cur_hi))
+
+    out = []
+    for lo, hi in plan:
+        for a in range(lo, hi, max_regs):
+            out.append((a, min(max_regs, hi - a)))
+    return out
+
+def _read_block(read, addr, count):
+    regs, err = read(addr, count)
+    if err:
+        return None, f"Erro lendo 0x{addr:04X}: {err}"
+    if len(regs) != count:
+        return None, f"Leitura incompleta 0x{addr:04X}: {len(regs)} regs"
+    return regs, None
+
+def read_blocks(read, plan):
+    """
+    read(addr, count) -> (regs, err). Lê cada bloco do plano.
+    Retorna ({addr: regs}, None) ou (None, erro) na primeira falha.
+    """
+    blocks = {}
+    for addr, count in plan:
+        regs, err = _read_block(read, addr, count)
+        if err:
+            return None, err
+        blocks[addr] = regs
+    return blocks, None
+
+def read_available_blocks(read, plan):
+    """
+    Como read_blocks, mas segue depois de uma falha (para mostrar o que foi lido).
+    Retorna ({addr: regs} dos blocos lidos, [erros]).
+    """
+    blocks = {}
+    errors = []
+    for addr, count in plan:
+        regs, err = _read_block(read, addr, count)
+        if err:
+            errors.append(err)
+        else:
+            blocks[addr] = regs
+    return blocks, errors
+
+def field_regs(field, blocks):
+    """Registradores de um campo, recortados do bloco que o contém."""
+    for addr, regs in blocks.items():
+        if addr <= field.addr and field.addr + field.count <= addr + len(regs):
+            k = field.addr - addr
+            return regs[k:k + field.count]
+    raise KeyError(f"campo {field.name} (0x{field.addr:04X}) fora dos blocos lidos")
+
+def decode_field(field, regs):
+    if field.kind == "raw":
+        return list(regs)
+    if field.kind == "f32":
+        value = struct.unpack(">f", struct.pack(">HH", regs[0] & 0xFFFF, regs[1] & 0xFFFF))[0]
+    elif field.kind == "u16":
+        value = regs[0]
+    elif field.kind == "i16":
+        value = regs[0] - 0x10000 if regs[0] & 0x8000 else regs[0]
+    elif field.kind == "u32":
+        value = (regs[0] << 16) | regs[1]
+    else:
+        raise ValueError(f"tipo desconhecido: {field.kind}")
+    return value * field.scale if field.scale != 1.0 else value
+
+def decode_fields(fields, blocks):
+    """{nome: valor} de todos os campos."""
+    return {f.name: decode_field(f, field_regs(f, blocks)) for f in fields}
+
+def describe_plan(plan):
+    return ", ".join(f"0x{a:04X}x{n}" for a, n in plan)
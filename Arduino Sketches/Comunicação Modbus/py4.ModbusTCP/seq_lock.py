@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+seq_lock.py
+
+Agenda as leituras de um medidor pelo registrador de sequência (SEQ), que o medidor/ponte
+incrementa a cada atualização das grandezas:
+
+ - SEQ é lido primeiro; se não mudou, os blocos não são lidos (nada novo)
+ - o período de atualização é aprendido das transições de SEQ: durante o aprendizado o SEQ
+   é lido a cada probe segundos e cada mudança fica medida com precisão de +-probe/2. O
+   instante de cada leitura é o do envio da requisição, e a janela de uma borda é o
+   intervalo entre dois envios; com tempo de resposta (RTT) maior que probe as leituras
+   ficam encostadas, então a janela aceita como precisa é 2*probe + RTT (mediana)
+ - travado: a próxima leitura é marcada para logo depois da atualização prevista
+   (borda + período + margem). Se SEQ ainda não mudou, volta a ler a cada probe até mudar
+   (nova borda precisa, que também refina o período). Se mudou logo na primeira leitura,
+   a borda real pode estar antes: a previsão é antecipada em pull segundos (dobrando a cada
+   acerto de primeira seguido, para alcançar um período aprendido longo demais), até a
+   leitura cair antes da borda e ela ser medida de novo
+ - métricas: amostras, leituras de SEQ, repetidas (SEQ igual), perdidas (SEQ pulou mais de
+   1: atualizações que nunca foram lidas), atraso entre a atualização e a leitura e RTT
+
+Uso (em código):
+  lock = SeqLock(period=1.0)
+  while True:
+      time.sleep(max(0.0, lock.next_poll(time.monotonic()) - time.monotonic()))
+      t_envio = time.monotonic()
+      seq = ler_seq()
+      if lock.observe(seq, t_envio, time.monotonic()):
+          ler_blocos()
+"""
+
+import statistics
+from collections import deque
+
+PROBE_S = 0.05         # intervalo entre leituras de SEQ enquanto espera a atualização
+MARGIN_S = 0.05        # folga depois da atualização prevista
+PULL_S = 0.02          # antecipação da previsão a cada acerto de primeira
+PULL_DOUBLINGS = 4     # a antecipação dobra a cada acerto seguido, até pull * 2**4
+LEARN_EDGES = 3        # bordas precisas necessárias para travar
+STALL_PERIODS = 3      # sem mudança por mais que isso (em períodos): destrava e reaprende
+RESET_JUMP = 1000      # salto de SEQ maior que isso: medidor/ponte reiniciou
+SEQ_MOD = 0x10000
+
+class SeqLock:
+    def __init__(self, period=1.0, probe=PROBE_S, margin=MARGIN_S, pull=PULL_S):
+        self.period = period          # período de atualização (chute inicial até aprender)
+        self.probe = probe
+        self.margin = margin
+        self.pull = pull
+        self.locked = False
+        self.last_seq = None
+        self.last_poll = None         # instante (envio) da última leitura de SEQ
+        self.last_change = None       # instante da leitura que viu a última mudança
+        self.edge = None              # instante estimado da última atualização
+        self.precise = None           # (instante, nº de atualizações) da última borda precisa
+        self.count = 0                # atualizações desde o início (SEQ sem a volta pelo zero)
+        self.hits = 0                 # acertos de primeira seguidos (sem borda precisa)
+        self.periods = deque(maxlen=16)
+        self.lags = deque(maxlen=1000)
+        self.rtts = deque(maxlen=64)
+        self.seq_reads = 0
+        self.samples = 0
+        self.repeated = 0
+        self.dropped = 0
+        self.resets = 0
+
+    def _unlock(self):
+        self.locked = False
+        self.precise = None
+        self.periods.clear()
+
+    def observe(self, seq, t, t_recv=None):
+        """
+        Registra SEQ lido pela requisição enviada no instante t (resposta em t_recv, para o
+        RTT). True se é uma amostra nova (vale ler os blocos).
+        """
+        self.seq_reads += 1
+        if t_recv is not None:
+            self.rtts.append(t_recv - t)
+        prev_poll, self.last_poll = self.last_poll, t
+        if self.last_seq is None:
+            self.last_seq, self.edge, self.last_change = seq, t, t
+            self.samples += 1
+            return True
+        if seq == self.last_seq:
+            self.repeated += 1
+            if self.locked and t - self.last_change > STALL_PERIODS * self.period:
+                self._unlock()
+            return False
+
+        delta = (seq - self.last_seq) % SEQ_MOD
+        self.last_seq = seq
+        self.last_change = t
+        self.samples += 1
+        if delta > RESET_JUMP:
+            self.resets += 1
+            self._unlock()
+            self.edge = t
+            return True
+        self.dropped += delta - 1
+        self.count += delta
+
+        window = t - prev_poll
+        rtt = statistics.median(self.rtts) if self.rtts else 0.0
+        if window <= 2 * self.probe + rtt:
+            # mudou entre duas leituras próximas: borda medida com precisão
+            edge = t - window / 2
+            if self.precise is not None:
+                self.periods.append((edge - self.precise[0]) / (self.count - self.precise[1]))
+                self.period = statistics.median(self.periods)
+            self.precise = (edge, self.count)
+            self.hits = 0
+            if len(self.periods) >= LEARN_EDGES - 1:
+                self.locked = True
+        elif self.locked:
+            # mudou antes da primeira leitura: a borda está em (prev_poll, t], antecipa a previsão
+            pull = self.pull * (1 << min(self.hits, PULL_DOUBLINGS))
+            edge = max(prev_poll, self.edge + delta * self.period - pull)
+            self.hits += 1
+        else:
+            # janela longa (primeira leitura, volta de reconexão): meio da janela
+            edge = t - window / 2
+        self.edge = edge
+        self.lags.append(t - edge)
+        return True
+
+    def next_poll(self, now):
+        """Instante (mesmo relógio de observe) da próxima leitura de SEQ."""
+        if self.last_poll is None:
+            return now
+        if not self.locked:
+            return self.last_poll + self.probe
+        target = self.edge + self.period + self.margin
+        if self.last_poll >= target - self.margin:
+            # já lemos depois da atualização prevista e SEQ não mudou: espera a borda
+            return self.last_poll + self.probe
+        return target
+
+    def stats(self):
+        line = (f"{self.samples} amostras, {self.seq_reads} leituras de SEQ ({self.repeated} repetidas), "
+                f"{self.dropped} perdidas")
+        if self.resets:
+            line += f", {self.resets} reinícios de SEQ"
+        line += f" | período {self.period * 1000:.0f} ms" + ("" if self.locked else " (aprendendo)")
+        if self.lags:
+            line += f", atraso após atualização: mediana {statistics.median(self.lags) * 1000:.0f} ms"
+        if self.rtts:
+            line += f", RTT mediana {statistics.median(self.rtts) * 1000:.0f} ms"
+        return line
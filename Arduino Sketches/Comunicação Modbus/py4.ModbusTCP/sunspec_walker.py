@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+sunspec_walker.py
+
+Descoberta de modelos SunSpec a partir do próprio equipamento, em vez de mapas de
+registradores mantidos à mão.
+
+Um dispositivo SunSpec começa com "SunS" (0x5375 0x6E53) em 40000 (ou 0 / 50000) e, em
+seguida, uma cadeia de modelos: [ID][L][L registradores de dados], até ID 0xFFFF.
+O walker percorre essa cadeia lendo só os 2 registradores de cabeçalho de cada modelo,
+guarda o layout descoberto em cache (JSON, por dispositivo) e depois lê apenas os modelos
+pedidos, agrupando blocos vizinhos em poucas requisições.
+
+Fontes de registradores:
+  - Modbus TCP ao vivo (pymodbus, como tcpdata2.py)
+  - dump da API do Stick 400G (17.sunspec/sniff.json): cada "tbl" é uma ou mais respostas
+    RTU FC03 concatenadas (03 03 <bytes> <dados> <CRC>), a partir de "reg_addr"
+
+Uso:
+  python sunspec_walker.py --dump ../17.sunspec/sniff.json
+  python sunspec_walker.py --dump ../17.sunspec/sniff.json --models 1,701 --raw
+  python sunspec_walker.py --ip 192.168.7.1 --unit 1 --models 1,701
+  python sunspec_walker.py --ip 192.168.7.1 --unit 1 --rediscover
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+try:
+    from pymodbus.client import ModbusTcpClient
+except ImportError:
+    ModbusTcpClient = None
+
+# --------------------- Config ---------------------
+SUNS = (0x5375, 0x6E53)           # "SunS"
+BASE_ADDRS = (40000, 0, 50000)    # endereços base previstos pela especificação
+END_ID = 0xFFFF
+MAX_MODELS = 256                  # proteção contra cadeia corrompida
+
+MAX_REGS = 125                    # limite do FC03
+MAX_GAP = 8                       # registradores extras aceitos para unir dois blocos
+
+CACHE_PATH = "sunspec_cache.json"
+
+# Modelo 1 (Common): (nome, offset a partir do 1º registrador de dados, tamanho, tipo)
+MODEL_1_POINTS = [
+    ("Mn", 0, 16, "string"),
+    ("Md", 16, 16, "string"),
+    ("Opt", 32, 8, "string"),
+    ("Vr", 40, 8, "string"),
+    ("SN", 48, 16, "string"),
+    ("DA", 64, 1, "uint16"),
+]
+
+# --------------------- Helpers ---------------------
+def fmt_dt():
+    return datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+def crc16_modbus(data: bytes) -> int:
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+def parse_rtu_responses(raw: bytes):
+    """
+    Converte uma sequência de respostas RTU FC03 concatenadas em lista de registradores.
+    Retorna (regs, err).
+    """
+    regs = []
+    i = 0
+    while i < len(raw):
+        if len(raw) - i < 5:
+            return None, f"resposta truncada no byte {i}"
+        n = raw[i + 2]
+        frame = raw[i:i + 5 + n]
+        if len(frame) < 5 + n:
+            return None, f"resposta truncada no byte {i}"
+        if frame[1] != 0x03:
+            return None, f"função inesperada 0x{frame[1]:02X} no byte {i}"
+        if crc16_modbus(frame[:-2]) != int.from_bytes(frame[-2:], "little"):
+            return None, f"CRC inválido no byte {i}"
+        data = frame[3:-2]
+        regs += [(data[k] << 8) | data[k + 1] for k in range(0, n, 2)]
+        i += 5 + n
+    return regs, None
+
+def regs_to_string(regs) -> str:
+    raw = b"".join(r.to_bytes(2, "big") for r in regs)
+    return raw.split(b"\x00")[0].decode("ascii", errors="replace").strip()
+
+# --------------------- Fontes de registradores ---------------------
+# Uma fonte é qualquer função read(addr, count) -> (regs, err), como read_holding do tcpdata2.
+
+class DumpImage:
+    """Imagem de registradores montada a partir do sniff.json (somente leitura, com lacunas)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.regs = {}
+        self.requests = 0
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for e in entries:
+            if e.get("errno", 0) != 0:
+                continue
+            data = e["data"]
+            regs, err = parse_rtu_responses(bytes.fromhex(data["tbl"]))
+            if err:
+                print(f"[aviso] modelo {data.get('id')} @ {data['reg_addr']}: {err}")
+                continue
+            for k, v in enumerate(regs):
+                self.regs[data["reg_addr"] + k] = v
+
+    def read(self, addr, count):
+        self.requests += 1
+        try:
+            return [self.regs[a] for a in range(addr, addr + count)], None
+        except KeyError as e:
+            return None, f"registrador {e.args[0]} ausente no dump"
+
+class TcpSource:
+    """Leitura de holding registers via Modbus TCP (pymodbus 3.x, unit/slave opcional)."""
+
+    def __init__(self, ip, port=502, unit=1, timeout=2.0):
+        if ModbusTcpClient is None:
+            raise RuntimeError("pymodbus não instalado")
+        self.client = ModbusTcpClient(ip, port=port, timeout=timeout)
+        self.unit = unit
+        self.requests = 0
+
+    def connect(self):
+        return self.client.connect()
+
+    def close(self):
+        self.client.close()
+
+    def read(self, addr, count):
+        self.requests += 1
+        try:
+            rr = self.client.read_holding_registers(address=addr, count=count, unit=self.unit)
+        except TypeError:
+            rr = self.client.read_holding_registers(address=addr, count=count, slave=self.unit)
+        if rr.isError():
+            return None, str(rr)
+        return rr.registers, None
+
+# --------------------- Descoberta ---------------------
+def find_base(read):
+    """Procura o marcador "SunS" nos endereços base. Retorna (base, err)."""
+    for base in BASE_ADDRS:
+        regs, err = read(base, 2)
+        if not err and tuple(regs) == SUNS:
+            return base, None
+    return None, "marcador SunS não encontrado"
+
+def walk_models(read, base=None):
+    """
+    Percorre a cadeia de modelos lendo só os cabeçalhos [ID][L].
+    Retorna (layout, err); layout = {"base", "models": [{"id", "addr", "length"}], "complete"}.
+    Em caso de erro no meio da cadeia, devolve o que foi descoberto até ali (complete=False).
+    """
+    if base is None:
+        base, err = find_base(read)
+        if err:
+            return None, err
+    else:
+        regs, err = read(base, 2)
+        if err or tuple(regs) != SUNS:
+            return None, f"marcador SunS não encontrado em {base}"
+
+    models = []
+    addr = base + 2
+    for _ in range(MAX_MODELS):
+        hdr, err = read(addr, 2)
+        if err:
+            return {"base": base, "models": models, "complete": False}, f"cadeia interrompida em {addr}: {err}"
+        model_id, length = hdr
+        if model_id == END_ID:
+            return {"base": base, "models": models, "complete": True}, None
+        models.append({"id": model_id, "addr": addr, "length": length})
+        addr += 2 + length
+    return {"base": base, "models": models, "complete": False}, "cadeia longa demais (sem ID 0xFFFF)"
+
+# --------------------- Cache ---------------------
+def load_cache(path=CACHE_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, path=CACHE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, path)
+
+def get_layout(read, device_key, cache, rediscover=False):
+    """
+    Layout do cache ou, se ausente/incompleto/forçado, descoberto. Retorna (layout, err).
+    Só uma cadeia completa (terminada em 0xFFFF) vai para o cache: uma descoberta
+    interrompida (erro de leitura, timeout) é usada nesta execução e refeita na próxima.
+    """
+    cached = cache.get(device_key)
+    if not rediscover and cached and cached.get("complete"):
+        return cached, None
+    layout, err = walk_models(read)
+    if layout and layout["models"]:
+        layout["discovered"] = datetime.now().isoformat(timespec="seconds")
+        if layout["complete"]:
+            cache[device_key] = layout
+        else:
+            cache.pop(device_key, None)
+    return layout, err
+
+# --------------------- Leitura mínima ---------------------
+def plan_reads(models, max_regs=MAX_REGS, max_gap=MAX_GAP):
+    """
+    Agrupa os modelos pedidos em requisições (addr, count). Cada modelo é lido com o próprio
+    cabeçalho (para validar o cache); modelos próximos são unidos se a lacuna for <= max_gap
+    e o total couber em max_regs. Modelos maiores que max_regs são divididos.
+    """
+    spans = sorted((m["addr"], m["addr"] + 2 + m["length"]) for m in models)
+    reqs = []
+    for start, end in spans:
+        if reqs:
+            r_start, r_end = reqs[-1]
+            if start - r_end <= max_gap and end - r_start <= max_regs:
+                reqs[-1] = (r_start, max(r_end, end))
+                continue
+        while end - start > max_regs:
+            reqs.append((start, start + max_regs))
+            start += max_regs
+        reqs.append((start, end))
+    return [(s, e - s) for s, e in reqs]
+
+def read_models(read, models, max_regs=MAX_REGS, max_gap=MAX_GAP):
+    """
+    Lê só os modelos pedidos. Retorna ({id: [regs de dados]}, err).
+    err indica cabeçalho divergente (layout em cache desatualizado) ou falha de leitura.
+    """
+    image = {}
+    for addr, count in plan_reads(models, max_regs, max_gap):
+        regs, err = read(addr, count)
+        if err:
+            return None, f"Erro lendo {addr} x{count}: {err}"
+        for k, v in enumerate(regs):
+            image[addr + k] = v
+
+    out = {}
+    for m in models:
+        if image.get(m["addr"]) != m["id"] or image.get(m["addr"] + 1) != m["length"]:
+            return None, f"cabeçalho do modelo {m['id']} em {m['addr']} mudou (layout desatualizado)"
+        start = m["addr"] + 2
+        out[m["id"]] = [image[a] for a in range(start, start + m["length"])]
+    return out, None
+
+# --------------------- Decodificação ---------------------
+def decode_common(regs):
+    """Modelo 1 (Common): fabricante, modelo, versão, número de série, endereço."""
+    vals = {}
+    for name, off, size, kind in MODEL_1_POINTS:
+        chunk = regs[off:off + size]
+        vals[name] = regs_to_string(chunk) if kind == "string" else chunk[0]
+    return vals
+
+DECODERS = {1: decode_common}
+
+def print_layout(layout):
+    print(f"Base {layout['base']} | {len(layout['models'])} modelos"
+          + ("" if layout.get("complete") else " (cadeia incompleta)"))
+    for m in layout["models"]:
+        print(f"  modelo {m['id']:>5} @ {m['addr']} ({m['length']} regs)")
+
+def print_model(model_id, regs, raw=False):
+    decoder = DECODERS.get(model_id)
+    if decoder and not raw:
+        vals = decoder(regs)
+        print(f"--- Modelo {model_id} ---")
+        for k, v in vals.items():
+            print(f"  {k:<4} = {v}")
+        return
+    print(f"--- Modelo {model_id} ({len(regs)} regs) ---")
+    for i in range(0, len(regs), 8):
+        print(f"  +{i:03d}: " + " ".join(f"{r:04X}" for r in regs[i:i + 8]))
+
+# --------------------- Main ---------------------
+def main():
+    ap = argparse.ArgumentParser(description="Descoberta e leitura de modelos SunSpec (Modbus TCP ou dump sniff.json).")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--dump", help="Dump JSON da API do Stick (17.sunspec/sniff.json)")
+    src.add_argument("--ip", help="IP do dispositivo Modbus TCP")
+    ap.add_argument("--port", type=int, default=502)
+    ap.add_argument("--unit", type=int, default=1, help="Unit ID / endereço do escravo")
+    ap.add_argument("--models", default="1", help="IDs dos modelos a ler (ex: 1,701) ou 'all'")
+    ap.add_argument("--max-regs", type=int, default=MAX_REGS, help="Registradores por requisição")
+    ap.add_argument("--cache", default=CACHE_PATH, help="Arquivo de cache do layout")
+    ap.add_argument("--rediscover", action="store_true", help="Ignora o cache e percorre a cadeia de novo")
+    ap.add_argument("--raw", action="store_true", help="Mostra registradores brutos em vez de decodificar")
+    args = ap.parse_args()
+
+    if args.dump:
+        if not os.path.exists(args.dump):
+            print("Arquivo não encontrado:", args.dump)
+            sys.exit(1)
+        source = DumpImage(args.dump)
+        device_key = f"dump:{os.path.abspath(args.dump)}"
+    else:
+        try:
+            source = TcpSource(args.ip, args.port, args.unit)
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+        if not source.connect():
+            print(f"[{fmt_dt()}] TCP offline ({args.ip}:{args.port}).")
+            sys.exit(1)
+        device_key = f"{args.ip}:{args.port}/{args.unit}"
+
+    cache = load_cache(args.cache)
+    t0 = time.perf_counter()
+    layout, err = get_layout(source.read, device_key, cache, rediscover=args.rediscover)
+    if err:
+        print(f"[aviso] {err}")
+    if not layout or not layout["models"]:
+        sys.exit(1)
+    save_cache(cache, args.cache)
+    discovery_reqs = source.requests
+    print_layout(layout)
+
+    if args.models.strip().lower() == "all":
+        wanted = layout["models"]
+    else:
+        ids = {int(x, 0) for x in args.models.split(",") if x.strip()}
+        wanted = [m for m in layout["models"] if m["id"] in ids]
+        missing = ids - {m["id"] for m in wanted}
+        if missing:
+            print("Modelos não encontrados na cadeia:", ", ".join(map(str, sorted(missing))))
+
+    data, err = read_models(source.read, wanted, max_regs=args.max_regs)
+    if err and not args.dump and not args.rediscover:
+        # layout em cache não bate mais com o equipamento: redescobre uma vez
+        print(f"[aviso] {err}; redescobrindo")
+        layout, err = get_layout(source.read, device_key, cache, rediscover=True)
+        if layout and layout["models"]:
+            save_cache(cache, args.cache)
+            ids = {m["id"] for m in wanted}
+            wanted = [m for m in layout["models"] if m["id"] in ids]
+            data, err = read_models(source.read, wanted, max_regs=args.max_regs)
+    if err:
+        print(f"[{fmt_dt()}] {err}")
+        sys.exit(1)
+
+    for m in wanted:
+        print_model(m["id"], data[m["id"]], raw=args.raw)
+    print(f"\n{discovery_reqs} requisições de descoberta, {source.requests - discovery_reqs} de leitura "
+          f"({time.perf_counter() - t0:.3f} s)")
+
+    if not args.dump:
+        source.close()
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@
 import time
 from pymodbus.client import ModbusTcpClient
 
+from read_plan import Field, describe_plan, field_regs, plan_reads, read_available_blocks
+
 IP = "172.16.99.100"
 PORT = 502
 UNIT_ID = 1  # geralmente ignorado em TCP, mas deixe 1
@@ -19,6 +21,11 @@ BLOCKS = [
 ]
 
 PERIOD_S = 0.25
+MAX_GAP = 0   # a ponte só reserva os blocos acima: não lê lacunas entre eles
+
+# blocos repetidos ou sobrepostos (ex.: A e C) são lidos uma vez por ciclo
+FIELDS = [Field(name, start, count, "raw") for name, start, count in BLOCKS]
+READ_PLAN = plan_reads(FIELDS, max_gap=MAX_GAP)
 
 def read_holding(client, addr, count):
     """
@@ -44,6 +51,7 @@ def main():
         return
 
     print(f"Conectado em {IP}:{PORT}")
+    print(f"Plano de leitura: {len(READ_PLAN)} blocos para {len(BLOCKS)} pedidos ({describe_plan(READ_PLAN)})")
     try:
         while True:
             # 1) lê ID
@@ -62,13 +70,16 @@ def main():
                 time.sleep(1.0)
                 continue
 
-            # 2) lê blocos
-            for name, start, count in BLOCKS:
-                regs, err = read_holding(client, start, count)
-                if err:
-                    print(f"[{name}] ERRO:", err)
-                    break
-                print(f"[{name}] {start:04X}..{start+count-1:04X} : {fmt_regs(regs)}")
+            # 2) lê blocos (uma vez cada) e mostra cada pedido recortado deles; um bloco com
+            #    erro não esconde os outros
+            blocks, errors = read_available_blocks(lambda addr, count: read_holding(client, addr, count), READ_PLAN)
+            for err in errors:
+                print("[BLOCOS] ERRO:", err)
+            for f in FIELDS:
+                try:
+                    print(f"[{f.name}] {f.addr:04X}..{f.addr+f.count-1:04X} : {fmt_regs(field_regs(f, blocks))}")
+                except KeyError:
+                    print(f"[{f.name}] {f.addr:04X}..{f.addr+f.count-1:04X} : não lido")
 
             print("-" * 80)
             time.sleep(PERIOD_S)
@@ -4,26 +4,26 @@
 from http import client
 import os
 import time
-import struct
 from datetime import datetime
 from pymodbus.client import ModbusTcpClient
 
+from log_sink import LogSink
+from read_plan import Field, decode_fields, describe_plan, plan_reads, read_blocks
+from seq_lock import SeqLock
+
 # --------------------- Config ---------------------
-REG_SEQ = 0x3001
-last_seq = None
+REG_SEQ = 0x3001   # incrementado a cada atualização das grandezas
 
 IP = "172.16.99.100"
 PORT = 502
 UNIT_ID = 1  # no TCP geralmente não importa, mas ok manter
 
-POLL_S = 1.0  # leitura a cada 1 segundo
+POLL_S = 1.0       # período inicial; o real é aprendido pelas transições de SEQ
+STATS_EVERY = 60   # imprime as métricas de SEQ a cada N amostras
 
-# Registros base
+# Registros base (o tamanho de cada leitura vem de READ_PLAN, montado a partir de FIELDS)
 REG_150A = 0x150A
-LEN_150A = 26  # 13 floats
-
 REG_181E = 0x181E
-LEN_181E = 16  # 8 floats (mas vamos usar só 5 e ignorar os ?)
 
 REG_2044 = 0x2044
 LEN_2044 = 2   # você disse que é frequência e dividir por 100 (vamos usar regs[0])
@@ -32,6 +32,10 @@ LEN_2044 = 2   # você disse que é frequência e dividir por 100 (vamos usar re
 OUT_DIR = "logs"
 OUT_FILE = "dtsu666_log.csv"
 CSV_PATH = os.path.join(OUT_DIR, OUT_FILE)
+ROTATE = "daily"               # um CSV por dia (dtsu666_log_AAAA-MM-DD.csv); None = arquivo único
+MAX_BYTES = 50 * 1024 * 1024   # além disso, rotação por tamanho (.1, .2, ...)
+FSYNC_S = 30.0                 # grava em disco pelo menos a cada N segundos
+COLUMNAR = None                # "npz" ou "parquet": cópia colunar em lotes (análise)
 
 # Mapeamento (ordem sequencial de floats)
 FIELDS_150A = ["Uab", "Ubc", "Uca", "Ua", "Ub", "Uc", "Ia", "Ib", "Ic", "Pt", "Pa", "Pb", "Pc"]
@@ -49,24 +53,21 @@ FIELDS_181E = [
 # Cabeçalho final do CSV (sem as interrogações)
 CSV_FIELDS = ["DataHora"] + FIELDS_150A + [name for name, _ in FIELDS_181E] + ["Freq_Hz"]
 
-# --------------------- Helpers ---------------------
-def ensure_csv():
-    os.makedirs(OUT_DIR, exist_ok=True)
-    if not os.path.exists(CSV_PATH):
-        with open(CSV_PATH, "a", encoding="utf-8", newline="") as f:
-            f.write(";".join(CSV_FIELDS) + "\n")
+# Campos realmente usados; o plano de leitura junta os que estiverem próximos
+# (só os floats 0..5 de 0x181E são lidos, não os 8)
+FIELDS = [Field(name, REG_150A + 2 * i) for i, name in enumerate(FIELDS_150A)]
+FIELDS += [Field(name, REG_181E + 2 * idx) for name, idx in FIELDS_181E]
+FIELDS += [Field("Freq_Hz", REG_2044, LEN_2044)]
 
+MAX_REGS = 125       # máximo de registradores por requisição aceito pela ponte
+MAX_GAP = 8          # registradores não usados tolerados dentro de um bloco
+FORBIDDEN = []       # faixas (início, fim exclusivo) que a ponte não responde
+READ_PLAN = plan_reads(FIELDS, max_regs=MAX_REGS, max_gap=MAX_GAP, forbidden=FORBIDDEN)
+
+# --------------------- Helpers ---------------------
 def fmt_dt():
     return datetime.now().strftime("%d/%m/%Y %H:%M:%S")
 
-def regs_to_float_be(reg_hi: int, reg_lo: int) -> float:
-    """
-    Converte 2 registradores (big-endian por palavra) para float IEEE754.
-    Ex.: 0x42CA 0x999A => float
-    """
-    raw = struct.pack(">HH", reg_hi & 0xFFFF, reg_lo & 0xFFFF)  # 4 bytes BE
-    return struct.unpack(">f", raw)[0]
-
 def read_holding(client: ModbusTcpClient, addr: int, count: int):
     """
     Compatível com pymodbus 3.x: unit=...
@@ -92,73 +93,32 @@ def connect_with_retry():
         print(f"[{fmt_dt()}] TCP offline ({IP}:{PORT}). Aguardando...")
         time.sleep(2.0)
 
-def acquire_once(client: ModbusTcpClient):
-    seq_regs, err = read_holding(client, REG_SEQ, 1)
+def read_seq(client: ModbusTcpClient):
+    regs, err = read_holding(client, REG_SEQ, 1)
     if err:
         return None, f"Erro lendo SEQ: {err}"
-    seq = seq_regs[0]
-
-    # 1) bloco 150A (26 regs => 13 floats)
-    regs150a, err = read_holding(client, REG_150A, LEN_150A)
-    if err:
-        return None, f"Erro lendo 0x150A: {err}"
-
-    if len(regs150a) != LEN_150A:
-        return None, f"Leitura incompleta 0x150A: {len(regs150a)} regs"
-
-    vals_150a = {}
-    for i, name in enumerate(FIELDS_150A):
-        hi = regs150a[2*i]
-        lo = regs150a[2*i + 1]
-        vals_150a[name] = regs_to_float_be(hi, lo)
-
-    # 2) bloco 181E (16 regs => 8 floats)
-    regs181e, err = read_holding(client, REG_181E, LEN_181E)
-    if err:
-        return None, f"Erro lendo 0x181E: {err}"
-
-    if len(regs181e) != LEN_181E:
-        return None, f"Leitura incompleta 0x181E: {len(regs181e)} regs"
-
-    # decodifica todos os 8 floats, mas usa só os que interessam
-    floats181e = []
-    for i in range(8):
-        hi = regs181e[2*i]
-        lo = regs181e[2*i + 1]
-        floats181e.append(regs_to_float_be(hi, lo))
-
-    vals_181e = {name: floats181e[idx] for (name, idx) in FIELDS_181E}
+    return regs[0], None
 
-    # 3) frequência em 2044: float (2 regs)
-    regs2044, err = read_holding(client, REG_2044, 2)
+def acquire_once(client: ModbusTcpClient):
+    # blocos do plano de leitura (um read por bloco) e decodificação dos campos
+    blocks, err = read_blocks(lambda addr, count: read_holding(client, addr, count), READ_PLAN)
     if err:
-        return None, f"Erro lendo 0x2044: {err}"
-
-    if len(regs2044) != 2:
-        return None, f"Leitura incompleta 0x2044: {len(regs2044)} regs"
-
-    freq_hz = regs_to_float_be(regs2044[0], regs2044[1]) / 100.0
-
+        return None, err
+    vals = decode_fields(FIELDS, blocks)
 
     # Monta registro final (na ordem do CSV)
     row = [fmt_dt()]
-    row += [vals_150a[k] for k in FIELDS_150A]
-    row += [vals_181e[k] for (k, _) in FIELDS_181E]
-    row += [freq_hz]
-
-    return (seq, row), None
+    row += [vals[k] for k in FIELDS_150A]
+    row += [vals[k] for (k, _) in FIELDS_181E]
+    row += [vals["Freq_Hz"] / 100.0]   # frequência em 2044: float x100
 
+    return row, None
 
-def write_csv_row(row):
-    # separador ";" (bom no Excel PT-BR)    
-    def fmt(v):
-        if isinstance(v, float):
-            s = f"{v:.2f}"      # 2 casas decimais
-            return s.replace(".", ",")   # <<< troca ponto por vírgula
-        return str(v)
 
-    with open(CSV_PATH, "a", encoding="utf-8", newline="") as f:
-        f.write(";".join(fmt(v) for v in row) + "\n")
+def open_sink():
+    # separador ";" e vírgula decimal, 2 casas (bom no Excel PT-BR); arquivo fica aberto
+    return LogSink(CSV_PATH, CSV_FIELDS, sep=";", decimal=",", float_fmt=".2f", rotate=ROTATE,
+                   max_bytes=MAX_BYTES, fsync_s=FSYNC_S, columnar=COLUMNAR)
 
 POWER_FIELDS = {"Pt","Pa","Pb","Pc","Impt","Impa","Impb","Impc","Expt"}
 
@@ -183,63 +143,63 @@ def print_values(row):
     print(f"[{dt}] " + " | ".join(parts))
 
 # --------------------- Main ---------------------
+def drop_connection(client):
+    try:
+        client.close()
+    except Exception:
+        pass
+
 def main():
-    global last_seq
-    ensure_csv()
+    sink = open_sink()
+    print(f"Plano de leitura: SEQ 0x{REG_SEQ:04X} + {len(READ_PLAN)} blocos ({describe_plan(READ_PLAN)})")
 
     client = None
-    next_t = time.time()
+    lock = SeqLock(period=POLL_S)   # mantido entre reconexões
 
-    while True:
-        if client is None:
-            client = connect_with_retry()
-            print(f"[{fmt_dt()}] Conectado em {IP}:{PORT}")
-            next_t = time.time() + POLL_S   # << descarta backlog
-
-        # ritmo de 1s
-        now = time.time()
-        if now < next_t:
-            time.sleep(0.01)
-            continue
-
-        # se atrasou muito (ex.: ficou offline), pula pra frente
-        if now - next_t > 2 * POLL_S:
-            next_t = now + POLL_S
-        else:
-            next_t += POLL_S
-
-        try:
-            data, err = acquire_once(client)
-
-            seq, row = data
-
-            if last_seq is not None and seq == last_seq:
-                continue
-
-            last_seq = seq
-
-            if err:
-                print(f"[{fmt_dt()}] {err}")
-                # derruba conexão e volta standby
-                try:
-                    client.close()
-                except Exception:
-                    pass
-                client = None
-                continue
+    try:
+        while True:
+            if client is None:
+                client = connect_with_retry()
+                print(f"[{fmt_dt()}] Conectado em {IP}:{PORT}")
 
-            # ok: imprime grandezas + grava CSV
-            print_values(row)
-            write_csv_row(row)
+            # próxima leitura de SEQ: logo depois da atualização prevista do medidor
+            delay = lock.next_poll(time.monotonic()) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
 
-        except Exception as e:
-            print(f"[{fmt_dt()}] Exceção: {e}")
             try:
-                client.close()
-            except Exception:
-                pass
-            client = None
-            time.sleep(1.0)
+                # SEQ primeiro: se não mudou, não há dado novo e os blocos não são lidos.
+                # O instante da leitura é o do envio (o intervalo entre envios mede a borda)
+                t_send = time.monotonic()
+                seq, err = read_seq(client)
+                if err is None and not lock.observe(seq, t_send, time.monotonic()):
+                    continue
+                if err is None:
+                    row, err = acquire_once(client)
+
+                if err:
+                    print(f"[{fmt_dt()}] {err}")
+                    # derruba conexão e volta standby
+                    drop_connection(client)
+                    client = None
+                    continue
+
+                # ok: imprime grandezas + grava CSV
+                print_values(row)
+                sink.write(row)
+                if lock.samples % STATS_EVERY == 0:
+                    print(f"[{fmt_dt()}] SEQ: {lock.stats()}")
+
+            except Exception as e:
+                print(f"[{fmt_dt()}] Exceção: {e}")
+                drop_connection(client)
+                client = None
+                time.sleep(1.0)
+    except KeyboardInterrupt:
+        print(f"\nSEQ: {lock.stats()}")
+    finally:
+        sink.close()
+        print(f"Log: {sink.stats()}")
 
 if __name__ == "__main__":
     main()